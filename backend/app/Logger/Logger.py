@@ -1,8 +1,8 @@
-import base64
 import os
 
 import psycopg2
-from Crypto.Cipher import AES
+
+from app.core.crypto import encrypt_image
 
 # 人脸识别相关配置
 FACE_RECOGNITION_DB_NAME: str = "app"  # 人脸识别数据库名
@@ -12,24 +12,6 @@ FACE_RECOGNITION_DB_HOST: str = "113.47.146.57"  # 数据库主机地址
 FACE_RECOGNITION_DB_PORT: int = 5432  # 数据库端口
 
 
-def encrypt_data(data, key):
-    cipher = AES.new(key, AES.MODE_EAX)
-    nonce = cipher.nonce
-    ciphertext, tag = cipher.encrypt_and_digest(data)
-    return nonce + tag + ciphertext
-
-def decrypt_data(encrypted_data, key):
-    nonce = encrypted_data[:16]
-    tag = encrypted_data[16:32]
-    ciphertext = encrypted_data[32:]
-    cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
-    try:
-        decrypted_data = cipher.decrypt_and_verify(ciphertext, tag)
-        return decrypted_data
-    except ValueError:
-        print("解密失败：数据可能被篡改或密钥不正确。")
-        return None
-
 class Logger:
     def __init__(self, aes_key_path=None):
         self.conn = psycopg2.connect(
@@ -119,10 +101,9 @@ class Logger:
 
     # malicious_attacks 表操作
     def create_malicious_attack(self, attack_info, face_image):
-        """创建恶意攻击记录，人脸图片需先进行 Base64 编码再 AES 加密"""
+        """创建恶意攻击记录，人脸图片直接进行 AES 加密"""
         if isinstance(face_image, bytes):
-            base64_image = base64.b64encode(face_image)
-            encrypted_image = encrypt_data(base64_image, self.aes_key)
+            encrypted_image = encrypt_image(face_image, self.aes_key)
             query = "INSERT INTO malicious_attacks (attack_info, face_image) VALUES (%s, %s) RETURNING id"
             return self.execute_query(query, (attack_info, encrypted_image))
         else:
@@ -140,7 +121,7 @@ class Logger:
         return results
 
     def update_malicious_attack(self, id, attack_info=None, face_image=None):
-        """更新恶意攻击记录，人脸图片需先进行 Base64 编码再 AES 加密"""
+        """更新恶意攻击记录，人脸图片直接进行 AES 加密"""
         updates = []
         params = []
         if attack_info:
@@ -148,8 +129,7 @@ class Logger:
             params.append(attack_info)
         if face_image:
             if isinstance(face_image, bytes):
-                base64_image = base64.b64encode(face_image)
-                encrypted_image = encrypt_data(base64_image, self.aes_key)
+                encrypted_image = encrypt_image(face_image, self.aes_key)
                 updates.append("face_image = %s")
                 params.append(encrypted_image)
             else:
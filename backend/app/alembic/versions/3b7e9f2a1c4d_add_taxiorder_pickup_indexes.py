@@ -0,0 +1,67 @@
+"""Add taxiorder pickup time index and grid cell column
+
+Revision ID: 3b7e9f2a1c4d
+Revises: 1a31ce608336
+Create Date: 2026-10-19 10:12:31.502147
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e9f2a1c4d'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # gpsrecord / taxiorder 此前由外部脚本建表，这里补齐以便全新数据库也能迁移
+    if not inspector.has_table('gpsrecord'):
+        op.create_table(
+            'gpsrecord',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('commaddr', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+            sa.Column('utc', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+            sa.Column('lat', sa.Float(), nullable=False),
+            sa.Column('lon', sa.Float(), nullable=False),
+            sa.Column('head', sa.Float(), nullable=False),
+            sa.Column('speed', sa.Float(), nullable=False),
+            sa.Column('tflag', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if not inspector.has_table('taxiorder'):
+        op.create_table(
+            'taxiorder',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('commaddr', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+            sa.Column('onutc', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+            sa.Column('onlat', sa.Float(), nullable=False),
+            sa.Column('onlon', sa.Float(), nullable=False),
+            sa.Column('offutc', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+            sa.Column('offlat', sa.Float(), nullable=False),
+            sa.Column('offlon', sa.Float(), nullable=False),
+            sa.Column('distance', sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    # 上车点所在网格编号（0.01° 网格），由数据库自动计算
+    op.add_column(
+        'taxiorder',
+        sa.Column(
+            'oncell',
+            sa.BigInteger(),
+            sa.Computed('((floor(onlat * 100) + 9000)::bigint * 100000 + (floor(onlon * 100) + 18000)::bigint)', persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(op.f('ix_taxiorder_onutc'), 'taxiorder', ['onutc'], unique=False)
+    op.create_index(op.f('ix_taxiorder_oncell'), 'taxiorder', ['oncell', 'onutc'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_taxiorder_oncell'), table_name='taxiorder')
+    op.drop_index(op.f('ix_taxiorder_onutc'), table_name='taxiorder')
+    op.drop_column('taxiorder', 'oncell')
@@ -0,0 +1,38 @@
+"""Add hotspot_tile table for precomputed DBSCAN results
+
+Revision ID: 5c2d8e4f6a1b
+Revises: 3b7e9f2a1c4d
+Create Date: 2026-10-19 11:03:47.218634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2d8e4f6a1b'
+down_revision = '3b7e9f2a1c4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'hotspot_tile',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column('eps', sa.Float(), nullable=False),
+        sa.Column('min_samples', sa.Integer(), nullable=False),
+        sa.Column('total_points', sa.Integer(), nullable=False),
+        sa.Column('noise_points', sa.Integer(), nullable=False),
+        sa.Column('hot_spots', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('bucket_start', 'eps', 'min_samples'),
+    )
+
+
+def downgrade():
+    op.drop_table('hotspot_tile')
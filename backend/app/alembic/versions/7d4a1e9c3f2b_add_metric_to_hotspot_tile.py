@@ -0,0 +1,41 @@
+"""Add metric to hotspot_tile
+
+Revision ID: 7d4a1e9c3f2b
+Revises: 5c2d8e4f6a1b
+Create Date: 2026-10-19 11:48:05.913270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4a1e9c3f2b'
+down_revision = '5c2d8e4f6a1b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'hotspot_tile',
+        sa.Column('metric', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False, server_default='scaled'),
+    )
+    op.drop_constraint('hotspot_tile_bucket_start_eps_min_samples_key', 'hotspot_tile', type_='unique')
+    op.create_unique_constraint(
+        'hotspot_tile_bucket_start_metric_eps_min_samples_key',
+        'hotspot_tile',
+        ['bucket_start', 'metric', 'eps', 'min_samples'],
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM hotspot_tile WHERE metric <> 'scaled'")
+    op.drop_constraint('hotspot_tile_bucket_start_metric_eps_min_samples_key', 'hotspot_tile', type_='unique')
+    op.create_unique_constraint(
+        'hotspot_tile_bucket_start_eps_min_samples_key',
+        'hotspot_tile',
+        ['bucket_start', 'eps', 'min_samples'],
+    )
+    op.drop_column('hotspot_tile', 'metric')
@@ -0,0 +1,86 @@
+"""Add typed timestamp columns to taxiorder and gpsrecord
+
+Revision ID: 8e5b2c7d9a3f
+Revises: 7d4a1e9c3f2b
+Create Date: 2026-10-19 13:21:56.402718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e5b2c7d9a3f'
+down_revision = '7d4a1e9c3f2b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('taxiorder', sa.Column('ontime', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('taxiorder', sa.Column('offtime', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('gpsrecord', sa.Column('time', sa.DateTime(timezone=True), nullable=True))
+
+    # YYYYMMDDHHMMSS 字符串按 UTC 解析为 timestamptz
+    op.execute("""
+        UPDATE taxiorder SET
+            ontime = to_timestamp(onutc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC',
+            offtime = to_timestamp(offutc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC'
+    """)
+    op.execute("""
+        UPDATE gpsrecord SET
+            time = to_timestamp(utc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC'
+    """)
+
+    # 未显式提供时间列的写入（如外部 SQL 导入）由触发器补齐
+    op.execute("""
+        CREATE FUNCTION taxiorder_set_times() RETURNS trigger AS $$
+        BEGIN
+            IF (TG_OP = 'INSERT' AND NEW.ontime IS NULL) OR (TG_OP = 'UPDATE' AND NEW.onutc IS DISTINCT FROM OLD.onutc) THEN
+                NEW.ontime := to_timestamp(NEW.onutc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC';
+            END IF;
+            IF (TG_OP = 'INSERT' AND NEW.offtime IS NULL) OR (TG_OP = 'UPDATE' AND NEW.offutc IS DISTINCT FROM OLD.offutc) THEN
+                NEW.offtime := to_timestamp(NEW.offutc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC';
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER taxiorder_set_times BEFORE INSERT OR UPDATE ON taxiorder
+        FOR EACH ROW EXECUTE FUNCTION taxiorder_set_times()
+    """)
+    op.execute("""
+        CREATE FUNCTION gpsrecord_set_time() RETURNS trigger AS $$
+        BEGIN
+            IF (TG_OP = 'INSERT' AND NEW.time IS NULL) OR (TG_OP = 'UPDATE' AND NEW.utc IS DISTINCT FROM OLD.utc) THEN
+                NEW.time := to_timestamp(NEW.utc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC';
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER gpsrecord_set_time BEFORE INSERT OR UPDATE ON gpsrecord
+        FOR EACH ROW EXECUTE FUNCTION gpsrecord_set_time()
+    """)
+
+    # 时间范围查询改走 timestamptz 列
+    op.drop_index('ix_taxiorder_oncell', table_name='taxiorder')
+    op.drop_index('ix_taxiorder_onutc', table_name='taxiorder')
+    op.create_index(op.f('ix_taxiorder_ontime'), 'taxiorder', ['ontime'], unique=False)
+    op.create_index('ix_taxiorder_oncell', 'taxiorder', ['oncell', 'ontime'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_taxiorder_oncell', table_name='taxiorder')
+    op.drop_index(op.f('ix_taxiorder_ontime'), table_name='taxiorder')
+    op.create_index('ix_taxiorder_onutc', 'taxiorder', ['onutc'], unique=False)
+    op.create_index('ix_taxiorder_oncell', 'taxiorder', ['oncell', 'onutc'], unique=False)
+    op.execute("DROP TRIGGER gpsrecord_set_time ON gpsrecord")
+    op.execute("DROP FUNCTION gpsrecord_set_time()")
+    op.execute("DROP TRIGGER taxiorder_set_times ON taxiorder")
+    op.execute("DROP FUNCTION taxiorder_set_times()")
+    op.drop_column('gpsrecord', 'time')
+    op.drop_column('taxiorder', 'offtime')
+    op.drop_column('taxiorder', 'ontime')
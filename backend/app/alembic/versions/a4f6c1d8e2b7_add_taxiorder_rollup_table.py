@@ -0,0 +1,70 @@
+"""Add taxiorder_rollup table with 15-minute bucket statistics
+
+Revision ID: a4f6c1d8e2b7
+Revises: 8e5b2c7d9a3f
+Create Date: 2026-10-19 14:08:31.559204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f6c1d8e2b7'
+down_revision = '8e5b2c7d9a3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'taxiorder_rollup',
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('taxi_ids', sa.ARRAY(sa.String()), nullable=False),
+        sa.Column('distance_count', sa.Integer(), nullable=False),
+        sa.Column('short_count', sa.Integer(), nullable=False),
+        sa.Column('medium_count', sa.Integer(), nullable=False),
+        sa.Column('long_count', sa.Integer(), nullable=False),
+        sa.Column('trip_count', sa.Integer(), nullable=False),
+        sa.Column('speed_sum', sa.Float(), nullable=False),
+        sa.Column('speed_count', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('bucket_start'),
+    )
+    # 用现有订单一次性生成全部汇总行，之后由导入流程按时间桶增量刷新
+    op.execute("""
+        INSERT INTO taxiorder_rollup (
+            bucket_start, order_count, taxi_ids, distance_count, short_count, medium_count, long_count,
+            trip_count, speed_sum, speed_count, refreshed_at
+        )
+        SELECT bucket_start,
+               COUNT(*),
+               COALESCE(array_agg(DISTINCT commaddr) FILTER (WHERE commaddr IS NOT NULL), '{}'),
+               COUNT(distance),
+               COUNT(*) FILTER (WHERE distance < 4000),
+               COUNT(*) FILTER (WHERE distance >= 4000 AND distance <= 8000),
+               COUNT(*) FILTER (WHERE distance > 8000),
+               COUNT(*) FILTER (WHERE offtime IS NOT NULL AND distance IS NOT NULL),
+               COALESCE(SUM(speed), 0),
+               COUNT(speed),
+               now()
+        FROM (
+            SELECT date_bin(INTERVAL '15 minutes', ontime, TIMESTAMPTZ '2000-01-01 00:00:00+00') AS bucket_start,
+                   commaddr,
+                   distance,
+                   offtime,
+                   CASE
+                       WHEN EXTRACT(EPOCH FROM offtime - ontime) > 0
+                            AND distance / EXTRACT(EPOCH FROM offtime - ontime) <= 22.22
+                       THEN distance / EXTRACT(EPOCH FROM offtime - ontime)
+                   END AS speed
+            FROM taxiorder
+            WHERE ontime IS NOT NULL
+        ) AS orders
+        GROUP BY bucket_start
+    """)
+
+
+def downgrade():
+    op.drop_table('taxiorder_rollup')
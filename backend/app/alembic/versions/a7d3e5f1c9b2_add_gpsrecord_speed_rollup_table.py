@@ -0,0 +1,59 @@
+"""Add gpsrecord_speed_rollup table with per-segment speed distributions
+
+Revision ID: a7d3e5f1c9b2
+Revises: f3b8d2c6a9e1
+Create Date: 2026-10-19 19:42:13.804517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f1c9b2'
+down_revision = 'f3b8d2c6a9e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'gpsrecord_speed_rollup',
+        sa.Column('level', sa.String(length=8), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('segment', sa.BigInteger(), nullable=False),
+        sa.Column('point_count', sa.Integer(), nullable=False),
+        sa.Column('speed_sum', sa.Float(), nullable=False),
+        sa.Column('speed_histogram', sa.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('level', 'bucket_start', 'segment'),
+    )
+    # 用现有轨迹点一次性生成网格粒度的汇总行；道路粒度需要路网，由 /analysis/speed-rollups/refresh 生成
+    op.execute("""
+        INSERT INTO gpsrecord_speed_rollup (level, bucket_start, segment, point_count, speed_sum, speed_histogram, refreshed_at)
+        SELECT 'cell',
+               bucket_start,
+               cell,
+               COUNT(*),
+               SUM(speed_mps),
+               ARRAY[
+                   COUNT(*) FILTER (WHERE bin = 0), COUNT(*) FILTER (WHERE bin = 1),
+                   COUNT(*) FILTER (WHERE bin = 2), COUNT(*) FILTER (WHERE bin = 3),
+                   COUNT(*) FILTER (WHERE bin = 4), COUNT(*) FILTER (WHERE bin = 5),
+                   COUNT(*) FILTER (WHERE bin = 6), COUNT(*) FILTER (WHERE bin = 7)
+               ],
+               now()
+        FROM (
+            SELECT date_bin(INTERVAL '15 minutes', time, TIMESTAMPTZ '2000-01-01 00:00:00+00') AS bucket_start,
+                   cell,
+                   speed / 100.0 AS speed_mps,
+                   width_bucket(speed * 0.036, ARRAY[5, 10, 20, 30, 40, 60, 80]::double precision[]) AS bin
+            FROM gpsrecord
+            WHERE speed >= 0 AND speed / 100.0 <= 33.33
+        ) AS points
+        GROUP BY bucket_start, cell
+    """)
+
+
+def downgrade():
+    op.drop_table('gpsrecord_speed_rollup')
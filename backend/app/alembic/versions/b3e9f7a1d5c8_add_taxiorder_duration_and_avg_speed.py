@@ -0,0 +1,46 @@
+"""Add taxiorder duration and avg_speed generated columns
+
+Revision ID: b3e9f7a1d5c8
+Revises: a7d3e5f1c9b2
+Create Date: 2026-10-19 21:17:46.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9f7a1d5c8'
+down_revision = 'a7d3e5f1c9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'taxiorder',
+        sa.Column(
+            'duration',
+            sa.Float(),
+            sa.Computed("EXTRACT(EPOCH FROM offtime - ontime)::double precision", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        'taxiorder',
+        sa.Column(
+            'avg_speed',
+            sa.Float(),
+            sa.Computed(
+                "CASE WHEN offtime > ontime THEN distance / EXTRACT(EPOCH FROM offtime - ontime)::double precision END",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    # 已有订单的 distance 由 POST /analysis/trip-metrics/backfill 回填，生成列随之更新
+
+
+def downgrade():
+    op.drop_column('taxiorder', 'avg_speed')
+    op.drop_column('taxiorder', 'duration')
@@ -0,0 +1,31 @@
+"""Add analysis_data_version table for response cache invalidation
+
+Revision ID: b7e3d9f1a5c2
+Revises: a4f6c1d8e2b7
+Create Date: 2026-10-19 15:02:14.873120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3d9f1a5c2'
+down_revision = 'a4f6c1d8e2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'analysis_data_version',
+        sa.Column('dataset', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('dataset'),
+    )
+
+
+def downgrade():
+    op.drop_table('analysis_data_version')
@@ -0,0 +1,47 @@
+"""Add import_job table and unique (commaddr, ontime) index on taxiorder
+
+Revision ID: c2a8f4e6b9d1
+Revises: b7e3d9f1a5c2
+Create Date: 2026-10-19 15:47:09.316582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a8f4e6b9d1'
+down_revision = 'b7e3d9f1a5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'import_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dataset', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column('source_path', sqlmodel.sql.sqltypes.AutoString(length=512), nullable=False),
+        sa.Column('status', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column('rows_read', sa.Integer(), nullable=False),
+        sa.Column('rows_loaded', sa.Integer(), nullable=False),
+        sa.Column('rows_skipped', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    # 旧的逐行导入没有去重，建唯一索引前只保留每组重复订单中 id 最小的一条
+    # （如有删除，升级后调用 POST /analysis/taxi-rollups/refresh 重建统计汇总）
+    op.execute("""
+        DELETE FROM taxiorder a
+        USING taxiorder b
+        WHERE a.commaddr = b.commaddr AND a.ontime = b.ontime AND a.id > b.id
+    """)
+    op.create_index('uq_taxiorder_commaddr_ontime', 'taxiorder', ['commaddr', 'ontime'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_taxiorder_commaddr_ontime', table_name='taxiorder')
+    op.drop_table('import_job')
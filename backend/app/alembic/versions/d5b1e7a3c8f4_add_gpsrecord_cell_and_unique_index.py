@@ -0,0 +1,40 @@
+"""Add gpsrecord grid cell column and unique (commaddr, time) index
+
+Revision ID: d5b1e7a3c8f4
+Revises: c2a8f4e6b9d1
+Create Date: 2026-10-19 16:31:52.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b1e7a3c8f4'
+down_revision = 'c2a8f4e6b9d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'gpsrecord',
+        sa.Column(
+            'cell',
+            sa.BigInteger(),
+            sa.Computed("((floor(lat * 100) + 9000)::bigint * 100000 + (floor(lon * 100) + 18000)::bigint)", persisted=True),
+            nullable=True,
+        ),
+    )
+    # 建唯一索引前只保留每组重复轨迹点中 id 最小的一条
+    op.execute("""
+        DELETE FROM gpsrecord a
+        USING gpsrecord b
+        WHERE a.commaddr = b.commaddr AND a.time = b.time AND a.id > b.id
+    """)
+    op.create_index('uq_gpsrecord_commaddr_time', 'gpsrecord', ['commaddr', 'time'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_gpsrecord_commaddr_time', table_name='gpsrecord')
+    op.drop_column('gpsrecord', 'cell')
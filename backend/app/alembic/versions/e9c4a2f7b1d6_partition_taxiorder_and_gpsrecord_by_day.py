@@ -0,0 +1,200 @@
+"""Partition taxiorder and gpsrecord by day
+
+Revision ID: e9c4a2f7b1d6
+Revises: d5b1e7a3c8f4
+Create Date: 2026-10-19 17:12:40.981357
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c4a2f7b1d6'
+down_revision = 'd5b1e7a3c8f4'
+branch_labels = None
+depends_on = None
+
+
+TAXIORDER_COLUMNS = "id, commaddr, onutc, onlat, onlon, offutc, offlat, offlon, distance, ontime, offtime"
+GPSRECORD_COLUMNS = "id, commaddr, utc, lat, lon, head, speed, tflag, time"
+
+
+def create_day_partitions(table, column):
+    """按源表中出现过的 UTC 日期为新表建分区，分区命名与 app.data_analysis.partitions 一致"""
+    op.execute(f"""
+        DO $$
+        DECLARE
+            day date;
+        BEGIN
+            FOR day IN
+                SELECT DISTINCT ({column} AT TIME ZONE 'UTC')::date FROM {table}_heap WHERE {column} IS NOT NULL
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+                    '{table}_p' || to_char(day, 'YYYYMMDD'),
+                    day::timestamp AT TIME ZONE 'UTC',
+                    (day + 1)::timestamp AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END
+        $$
+    """)
+
+
+def upgrade():
+    # 分区表上的 BEFORE 触发器不能改变分区键，时间列改为由导入程序写入并设为非空
+    op.execute("DROP TRIGGER taxiorder_set_times ON taxiorder")
+    op.execute("DROP FUNCTION taxiorder_set_times()")
+    op.execute("DROP TRIGGER gpsrecord_set_time ON gpsrecord")
+    op.execute("DROP FUNCTION gpsrecord_set_time()")
+
+    # 原表改名保留到数据迁移完成，索引和约束一并改名以便新表使用原名称
+    for table in ('taxiorder', 'gpsrecord'):
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_heap")
+        op.execute(f"ALTER TABLE {table}_heap RENAME CONSTRAINT {table}_pkey TO {table}_heap_pkey")
+        op.execute(f"ALTER SEQUENCE IF EXISTS {table}_id_seq RENAME TO {table}_heap_id_seq")
+    op.execute("ALTER INDEX ix_taxiorder_ontime RENAME TO ix_taxiorder_heap_ontime")
+    op.execute("ALTER INDEX ix_taxiorder_oncell RENAME TO ix_taxiorder_heap_oncell")
+    op.execute("ALTER INDEX uq_taxiorder_commaddr_ontime RENAME TO uq_taxiorder_heap_commaddr_ontime")
+    op.execute("ALTER INDEX uq_gpsrecord_commaddr_time RENAME TO uq_gpsrecord_heap_commaddr_time")
+
+    op.execute("""
+        CREATE TABLE taxiorder (
+            id serial NOT NULL,
+            commaddr varchar(64) NOT NULL,
+            onutc varchar(32) NOT NULL,
+            onlat double precision NOT NULL,
+            onlon double precision NOT NULL,
+            offutc varchar(32) NOT NULL,
+            offlat double precision NOT NULL,
+            offlon double precision NOT NULL,
+            distance double precision,
+            ontime timestamptz NOT NULL,
+            offtime timestamptz,
+            oncell bigint GENERATED ALWAYS AS
+                (((floor(onlat * 100) + 9000)::bigint * 100000 + (floor(onlon * 100) + 18000)::bigint)) STORED
+        ) PARTITION BY RANGE (ontime)
+    """)
+    op.execute("""
+        CREATE TABLE gpsrecord (
+            id serial NOT NULL,
+            commaddr varchar(64) NOT NULL,
+            utc varchar(32) NOT NULL,
+            lat double precision NOT NULL,
+            lon double precision NOT NULL,
+            head double precision NOT NULL,
+            speed double precision NOT NULL,
+            tflag integer NOT NULL,
+            time timestamptz NOT NULL,
+            cell bigint GENERATED ALWAYS AS
+                (((floor(lat * 100) + 9000)::bigint * 100000 + (floor(lon * 100) + 18000)::bigint)) STORED
+        ) PARTITION BY RANGE (time)
+    """)
+    create_day_partitions('taxiorder', 'ontime')
+    create_day_partitions('gpsrecord', 'time')
+
+    # 时间无法解析的记录无法落入任何分区，随原表一起丢弃
+    op.execute(f"""
+        INSERT INTO taxiorder ({TAXIORDER_COLUMNS})
+        SELECT {TAXIORDER_COLUMNS} FROM taxiorder_heap WHERE ontime IS NOT NULL
+    """)
+    op.execute(f"""
+        INSERT INTO gpsrecord ({GPSRECORD_COLUMNS})
+        SELECT {GPSRECORD_COLUMNS} FROM gpsrecord_heap WHERE time IS NOT NULL
+    """)
+    for table in ('taxiorder', 'gpsrecord'):
+        op.execute(f"SELECT setval('{table}_id_seq', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+        op.execute(f"DROP TABLE {table}_heap")
+
+    # 分区表的主键和唯一索引必须包含分区键
+    op.execute("ALTER TABLE taxiorder ADD CONSTRAINT taxiorder_pkey PRIMARY KEY (id, ontime)")
+    op.execute("CREATE INDEX ix_taxiorder_ontime ON taxiorder (ontime)")
+    op.execute("CREATE INDEX ix_taxiorder_oncell ON taxiorder (oncell, ontime)")
+    op.execute("CREATE UNIQUE INDEX uq_taxiorder_commaddr_ontime ON taxiorder (commaddr, ontime)")
+    op.execute("ALTER TABLE gpsrecord ADD CONSTRAINT gpsrecord_pkey PRIMARY KEY (id, time)")
+    op.execute("CREATE UNIQUE INDEX uq_gpsrecord_commaddr_time ON gpsrecord (commaddr, time)")
+
+
+def downgrade():
+    for table in ('taxiorder', 'gpsrecord'):
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq RENAME TO {table}_partitioned_id_seq")
+    op.execute("ALTER INDEX ix_taxiorder_ontime RENAME TO ix_taxiorder_partitioned_ontime")
+    op.execute("ALTER INDEX ix_taxiorder_oncell RENAME TO ix_taxiorder_partitioned_oncell")
+    op.execute("ALTER INDEX uq_taxiorder_commaddr_ontime RENAME TO uq_taxiorder_partitioned_commaddr_ontime")
+    op.execute("ALTER INDEX uq_gpsrecord_commaddr_time RENAME TO uq_gpsrecord_partitioned_commaddr_time")
+
+    op.execute("""
+        CREATE TABLE taxiorder (
+            id serial PRIMARY KEY,
+            commaddr varchar(64) NOT NULL,
+            onutc varchar(32) NOT NULL,
+            onlat double precision NOT NULL,
+            onlon double precision NOT NULL,
+            offutc varchar(32) NOT NULL,
+            offlat double precision NOT NULL,
+            offlon double precision NOT NULL,
+            distance double precision,
+            ontime timestamptz,
+            offtime timestamptz,
+            oncell bigint GENERATED ALWAYS AS
+                (((floor(onlat * 100) + 9000)::bigint * 100000 + (floor(onlon * 100) + 18000)::bigint)) STORED
+        )
+    """)
+    op.execute("""
+        CREATE TABLE gpsrecord (
+            id serial PRIMARY KEY,
+            commaddr varchar(64) NOT NULL,
+            utc varchar(32) NOT NULL,
+            lat double precision NOT NULL,
+            lon double precision NOT NULL,
+            head double precision NOT NULL,
+            speed double precision NOT NULL,
+            tflag integer NOT NULL,
+            time timestamptz,
+            cell bigint GENERATED ALWAYS AS
+                (((floor(lat * 100) + 9000)::bigint * 100000 + (floor(lon * 100) + 18000)::bigint)) STORED
+        )
+    """)
+    op.execute(f"INSERT INTO taxiorder ({TAXIORDER_COLUMNS}) SELECT {TAXIORDER_COLUMNS} FROM taxiorder_partitioned")
+    op.execute(f"INSERT INTO gpsrecord ({GPSRECORD_COLUMNS}) SELECT {GPSRECORD_COLUMNS} FROM gpsrecord_partitioned")
+    for table in ('taxiorder', 'gpsrecord'):
+        op.execute(f"SELECT setval('{table}_id_seq', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+        op.execute(f"DROP TABLE {table}_partitioned")
+    op.execute("CREATE INDEX ix_taxiorder_ontime ON taxiorder (ontime)")
+    op.execute("CREATE INDEX ix_taxiorder_oncell ON taxiorder (oncell, ontime)")
+    op.execute("CREATE UNIQUE INDEX uq_taxiorder_commaddr_ontime ON taxiorder (commaddr, ontime)")
+    op.execute("CREATE UNIQUE INDEX uq_gpsrecord_commaddr_time ON gpsrecord (commaddr, time)")
+
+    op.execute("""
+        CREATE FUNCTION taxiorder_set_times() RETURNS trigger AS $$
+        BEGIN
+            IF (TG_OP = 'INSERT' AND NEW.ontime IS NULL) OR (TG_OP = 'UPDATE' AND NEW.onutc IS DISTINCT FROM OLD.onutc) THEN
+                NEW.ontime := to_timestamp(NEW.onutc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC';
+            END IF;
+            IF (TG_OP = 'INSERT' AND NEW.offtime IS NULL) OR (TG_OP = 'UPDATE' AND NEW.offutc IS DISTINCT FROM OLD.offutc) THEN
+                NEW.offtime := to_timestamp(NEW.offutc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC';
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER taxiorder_set_times BEFORE INSERT OR UPDATE ON taxiorder
+        FOR EACH ROW EXECUTE FUNCTION taxiorder_set_times()
+    """)
+    op.execute("""
+        CREATE FUNCTION gpsrecord_set_time() RETURNS trigger AS $$
+        BEGIN
+            IF (TG_OP = 'INSERT' AND NEW.time IS NULL) OR (TG_OP = 'UPDATE' AND NEW.utc IS DISTINCT FROM OLD.utc) THEN
+                NEW.time := to_timestamp(NEW.utc, 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC';
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER gpsrecord_set_time BEFORE INSERT OR UPDATE ON gpsrecord
+        FOR EACH ROW EXECUTE FUNCTION gpsrecord_set_time()
+    """)
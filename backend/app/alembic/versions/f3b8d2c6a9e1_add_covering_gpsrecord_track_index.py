@@ -0,0 +1,30 @@
+"""Make the gpsrecord (commaddr, time) index covering for trajectory lookups
+
+Revision ID: f3b8d2c6a9e1
+Revises: e9c4a2f7b1d6
+Create Date: 2026-10-19 18:05:27.316248
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2c6a9e1'
+down_revision = 'e9c4a2f7b1d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 轨迹查询按 (车牌号, 时间) 取点，INCLUDE 其余返回列后可走仅索引扫描，不再回表
+    op.execute("DROP INDEX uq_gpsrecord_commaddr_time")
+    op.execute("""
+        CREATE UNIQUE INDEX uq_gpsrecord_commaddr_time ON gpsrecord (commaddr, time)
+        INCLUDE (id, utc, lat, lon, head, speed, tflag)
+    """)
+    op.execute("ANALYZE gpsrecord")
+
+
+def downgrade():
+    op.execute("DROP INDEX uq_gpsrecord_commaddr_time")
+    op.execute("CREATE UNIQUE INDEX uq_gpsrecord_commaddr_time ON gpsrecord (commaddr, time)")
@@ -1,93 +1,261 @@
-from fastapi import APIRouter, Query
-import numpy as np
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
+from typing import Any
+
+from fastapi import APIRouter, BackgroundTasks, Body, Query, Request
 from fastapi.responses import JSONResponse
-from datetime import datetime, timedelta
-from sqlmodel import Session, select
+from datetime import datetime
+from app.core.config import settings
+from app.data_analysis.cache import bump_data_version, cached_json_response
+from app.data_analysis.coordinates import CoordinateSystem
+from app.data_analysis.hotspots import (
+    BUCKET_MINUTES,
+    HOTSPOT_PRESETS,
+    ClusteringMetric,
+    aligned_bucket,
+    compute_grid_hotspots,
+    compute_hotspots,
+    day_buckets,
+    get_hotspot_tile,
+    get_pickup_coordinates,
+    get_pickup_grid_counts,
+    refresh_hotspot_tiles,
+    save_hotspot_tile,
+)
+from app.data_analysis.od_matrix import GRID_ZONES, list_zone_sets, load_zone_set, query_od_matrix, save_zone_set
 from app.core.db import engine
-from app.models import TaxiOrder
+from sqlmodel import Session
 
 def parse_utc_timestamp(utc_str: str) -> datetime:
     return datetime.strptime(utc_str, "%Y%m%d%H%M%S")
 
-def get_time_range_data(start_utc: str, minutes: int = 15) -> list:
-    start_time = parse_utc_timestamp(start_utc)
-    end_time = start_time + timedelta(minutes=minutes)
-    start_utc_str = start_time.strftime("%Y%m%d%H%M%S")
-    end_utc_str = end_time.strftime("%Y%m%d%H%M%S")
-    results = []
-    with Session(engine) as session:
-        query = select(TaxiOrder).where(
-            TaxiOrder.onutc >= start_utc_str,
-            TaxiOrder.onutc <= end_utc_str
-        )
-        records = session.exec(query).all()
-        for row in records:
-            results.append({
-                "lat": row.onlat,
-                "lng": row.onlon,
-                "utc": row.onutc
-            })
-    return results
+# 通过 Accept 请求 arrow / packed 格式时 hot_spots 按列编码的字段
+HOTSPOT_COLUMNS = ["lng", "lat", "count"]
+GRID_HOTSPOT_COLUMNS = ["lng", "lat", "count", "cells"]
+OD_FLOW_COLUMNS = [
+    "origin", "destination", "count", "origin_lat", "origin_lon", "destination_lat", "destination_lon"
+]
 
 router = APIRouter(prefix="/analysis", tags=["analysis-clustering"])
 
 @router.get("/dbscan-clustering")
 def dbscan_clustering(
+    request: Request,
     start_utc: str = Query(..., description="起始时间戳，如20130912011417"),
-    eps: float = Query(0.01, description="DBSCAN的eps参数，控制聚类半径"),
-    min_samples: int = Query(3, description="DBSCAN的min_samples参数，最小样本数")
+    eps: float = Query(0.01, gt=0, description="DBSCAN的eps参数，控制聚类半径；metric为haversine时单位为米"),
+    min_samples: int = Query(3, ge=1, description="DBSCAN的min_samples参数，最小样本数"),
+    metric: ClusteringMetric = Query("scaled", description="距离度量：scaled（标准化经纬度）或 haversine（球面距离，eps单位为米）"),
+    minutes: int = Query(15, ge=1, le=1440, description="查询窗口长度（分钟），最长一天")
 ):
     """
-    使用DBSCAN算法对上车点进行聚类分析，提取热门上客点
+    使用DBSCAN算法对上车点进行聚类分析，提取热门上客点。
+    窗口为15分钟、起始时间对齐到时间桶且参数为预设组合（HOTSPOT_PRESETS）时优先返回预计算结果，
+    未命中则现场计算并写入预计算表；其他参数组合只现场计算，结果通过响应缓存复用。
+    Accept 为 application/vnd.apache.arrow.stream 或 application/x-packed-columns 时返回按列编码的二进制结果。
     """
-    try:
-        data = get_time_range_data(start_utc, 15)
-        if not data:
+    def compute():
+        preset = (metric, eps, min_samples) in HOTSPOT_PRESETS
+        bucket_start = aligned_bucket(start_utc) if preset and minutes == BUCKET_MINUTES else None
+        result = get_hotspot_tile(bucket_start, metric, eps, min_samples) if bucket_start else None
+        precomputed = result is not None
+        if result is None:
+            coordinates = get_pickup_coordinates(start_utc, minutes)
+            result = compute_hotspots(coordinates, eps, min_samples, metric)
+            if bucket_start:
+                with Session(engine) as session:
+                    save_hotspot_tile(session, bucket_start, metric, eps, min_samples, result)
+                    session.commit()
+        if result["total_points"] == 0:
             return JSONResponse(
-                status_code=404, 
-                content={"error": f"在时间戳 {start_utc} 后15分钟内没有找到数据"}
+                status_code=404,
+                content={"error": f"在时间戳 {start_utc} 后{minutes}分钟内没有找到数据"}
             )
-        coordinates = np.array([[point["lat"], point["lng"]] for point in data])
-        if len(coordinates) < min_samples:
+        if result["total_points"] < min_samples:
             return JSONResponse(
                 status_code=400,
-                content={"error": f"数据点数量({len(coordinates)})少于最小样本数({min_samples})"}
+                content={"error": f"数据点数量({result['total_points']})少于最小样本数({min_samples})"}
             )
-        scaler = StandardScaler()
-        coordinates_scaled = scaler.fit_transform(coordinates)
-        dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-        cluster_labels = dbscan.fit_predict(coordinates_scaled)
-        unique_labels = set(cluster_labels)
-        hot_spots = []
-        for label in unique_labels:
-            if label == -1:
-                continue
-            cluster_points = coordinates[cluster_labels == label]
-            center_lat = np.mean(cluster_points[:, 0])
-            center_lng = np.mean(cluster_points[:, 1])
-            count = len(cluster_points)
-            if count >= min_samples:
-                hot_spots.append({
-                    "lng": float(center_lng),
-                    "lat": float(center_lat),
-                    "count": count
-                })
-        hot_spots.sort(key=lambda x: x["count"], reverse=True)
         return {
             "start_utc": start_utc,
-            "total_points": len(data),
-            "hot_spots_found": len(hot_spots),
-            "noise_points": int(np.sum(cluster_labels == -1)),
+            "total_points": result["total_points"],
+            "hot_spots_found": result["hot_spots_found"],
+            "noise_points": result["noise_points"],
             "parameters": {
                 "eps": eps,
-                "min_samples": min_samples
+                "min_samples": min_samples,
+                "metric": metric,
+                "minutes": minutes
             },
-            "hot_spots": hot_spots
+            "precomputed": precomputed,
+            "hot_spots": result["hot_spots"]
+        }
+    try:
+        parse_utc_timestamp(start_utc)
+        params = {
+            "start_utc": start_utc, "eps": eps, "min_samples": min_samples,
+            "metric": metric, "minutes": minutes
         }
+        return cached_json_response(
+            request, "taxiorder", params, compute, columnar=("hot_spots", HOTSPOT_COLUMNS)
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": f"聚类分析失败: {str(e)}"}
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/hotspot-tiles/refresh")
+def refresh_hotspot_tiles_endpoint(
+    background_tasks: BackgroundTasks,
+    date: str = Query(..., description="需要重新预计算热点的日期，格式为YYYYMMDD")
+):
+    """
+    在后台重新预计算指定日期所有15分钟时间桶的热点结果
+    """
+    try:
+        buckets = day_buckets(date)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": f"日期格式错误: {date}"})
+    background_tasks.add_task(refresh_hotspot_tiles, buckets)
+    background_tasks.add_task(bump_data_version, "taxiorder")
+    return {"message": f"已提交 {date} 的热点预计算任务", "bucket_count": len(buckets)}
+
+@router.get("/grid-hotspots")
+def grid_hotspots(
+    request: Request,
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
+    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
+    cell_size_m: float = Query(500, gt=0, description="网格边长（米）"),
+    top_n: int = Query(20, ge=1, description="返回点数最多的热点个数"),
+    min_count: int = Query(1, ge=1, description="参与热点统计的网格最少上车点数"),
+    merge_adjacent: bool = Query(False, description="是否合并相邻的热点网格")
+):
+    """
+    网格热点模式：在数据库中把上车点按网格分箱计数，适用于一天到一周的大时间窗口。
+    支持与 /analysis/dbscan-clustering 相同的二进制响应格式。
+    """
+    def compute():
+        cells = get_pickup_grid_counts(start_utc, end_utc, cell_size_m)
+        if len(cells) == 0:
+            return JSONResponse(
+                status_code=404,
+                content={"error": f"在 {start_utc} 至 {end_utc} 内没有找到数据"}
+            )
+        result = compute_grid_hotspots(cells, top_n, min_count, merge_adjacent)
+        return {
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "total_points": result["total_points"],
+            "total_cells": result["total_cells"],
+            "hot_spots_found": result["hot_spots_found"],
+            "parameters": {
+                "cell_size_m": cell_size_m,
+                "top_n": top_n,
+                "min_count": min_count,
+                "merge_adjacent": merge_adjacent
+            },
+            "hot_spots": result["hot_spots"]
+        }
+    try:
+        if parse_utc_timestamp(end_utc) < parse_utc_timestamp(start_utc):
+            return JSONResponse(status_code=400, content={"error": "结束时间早于起始时间"})
+        params = {
+            "start_utc": start_utc, "end_utc": end_utc, "cell_size_m": cell_size_m,
+            "top_n": top_n, "min_count": min_count, "merge_adjacent": merge_adjacent
+        }
+        return cached_json_response(
+            request, "taxiorder", params, compute, columnar=("hot_spots", GRID_HOTSPOT_COLUMNS)
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"网格热点统计失败: {str(e)}"}
+        )
+
+@router.get("/od-zones")
+def od_zones():
+    """
+    列出 OD 矩阵可用的区域集合：grid（规则网格）以及 ANALYSIS_OD_ZONES_DIR 下的 GeoJSON 区域文件
+    """
+    try:
+        return {"zone_sets": list_zone_sets()}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"查询区域集合失败: {str(e)}"})
+
+@router.post("/od-zones")
+def upload_od_zones(
+    name: str = Query(..., description="区域集合名称（字母、数字、下划线、连字符），同名区域集合会被覆盖"),
+    coordinate_system: CoordinateSystem = Query(
+        settings.ANALYSIS_OD_ZONES_COORDINATE_SYSTEM, description="GeoJSON 坐标所用的坐标系：WGS84, GCJ02, BD09"
+    ),
+    geojson: dict[str, Any] = Body(..., description="GeoJSON FeatureCollection，每个 Polygon / MultiPolygon 要素为一个区域")
+):
+    """
+    上传 OD 矩阵使用的多边形区域（如行政区、交通小区），保存到 ANALYSIS_OD_ZONES_DIR。
+    区域 id 依次取 properties.adcode、要素 id、要素序号，名称取 properties.name。
+    """
+    try:
+        zones = save_zone_set(name, geojson, coordinate_system)
+        return {"message": f"已保存区域集合 {name}", "name": name, "zone_count": len(zones.ids)}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"保存区域集合失败: {str(e)}"})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"保存区域集合失败: {str(e)}"})
+
+@router.get("/od-matrix")
+def od_matrix(
+    request: Request,
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS，向下对齐到15分钟"),
+    end_utc: str = Query(..., description="结束时间戳（不含），格式YYYYMMDDHHMMSS"),
+    zone_set: str = Query(GRID_ZONES, description="区域集合：grid（规则网格）或已上传的区域集合名称，见 /analysis/od-zones"),
+    cell_size_m: float = Query(1000, ge=1, description="zone_set 为 grid 时的网格边长（米）"),
+    min_count: int = Query(1, ge=1, description="订单数少于该值的 OD 流不返回"),
+    top_n: int = Query(2000, ge=1, description="最多返回订单数最多的前 top_n 条 OD 流"),
+    coordinate_system: CoordinateSystem = Query("BD09", description="区域中心点的目标坐标系：WGS84, GCJ02, BD09")
+):
+    """
+    按上车时间统计时间窗口内区域之间的订单流量（OD 矩阵），用于绘制流向图。
+    返回 zones（出现在 flows 中的区域，含中心点和全部匹配订单的 outflow / inflow）和 flows（按订单数降序）；
+    上车点或下车点不在任何区域内的订单只计入 total_orders。OD 结果按15分钟时间桶缓存，跨窗口复用。
+    Accept 为 application/vnd.apache.arrow.stream 或 application/x-packed-columns 时 flows 按列编码。
+    """
+    try:
+        if parse_utc_timestamp(end_utc) <= parse_utc_timestamp(start_utc):
+            return JSONResponse(status_code=400, content={"error": "结束时间必须晚于起始时间"})
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "时间格式错误，应为YYYYMMDDHHMMSS"})
+
+    def compute():
+        result = query_od_matrix(zones, start_utc, end_utc, min_count, top_n, coordinate_system)
+        return {
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "zone_set": zone_set,
+            "coordinate_system": coordinate_system,
+            "total_orders": result["total_orders"],
+            "matched_orders": result["matched_orders"],
+            "zone_count": len(result["zones"]),
+            "flow_count": len(result["flows"]),
+            "parameters": {
+                "cell_size_m": cell_size_m if zone_set == GRID_ZONES else None,
+                "min_count": min_count,
+                "top_n": top_n
+            },
+            "zones": result["zones"],
+            "flows": result["flows"]
+        }
+    try:
+        zones = load_zone_set(zone_set, cell_size_m)
+        # 区域集合的 key 含文件修改时间，重新上传区域后旧的缓存不再命中
+        params = {
+            "start_utc": start_utc, "end_utc": end_utc, "zone_set": zones.key, "min_count": min_count,
+            "top_n": top_n, "coordinate_system": coordinate_system
+        }
+        return cached_json_response(
+            request, "taxiorder", params, compute, columnar=("flows", OD_FLOW_COLUMNS)
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"OD矩阵统计失败: {str(e)}"})
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"OD矩阵统计失败: {str(e)}"}
+        )
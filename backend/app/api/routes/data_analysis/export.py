@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.data_analysis.exports import (
+    EXPORT_MEDIA_TYPES,
+    GPS_RECORD_EXPORT_COLUMNS,
+    TAXI_ORDER_EXPORT_COLUMNS,
+    ExportFormat,
+    gps_record_export_query,
+    stream_query,
+    taxi_order_export_query,
+)
+
+router = APIRouter(prefix="/analysis", tags=["analysis-export"])
+
+def parse_bbox(min_lat, min_lon, max_lat, max_lon):
+    """四个边界都给出时返回经纬度范围，都不给时返回 None，只给出一部分时报错"""
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if all(value is None for value in bbox):
+        return None
+    if any(value is None for value in bbox):
+        raise ValueError("经纬度范围需要同时指定 min_lat, min_lon, max_lat, max_lon")
+    return bbox
+
+def export_response(query, params, names, export_format: ExportFormat, filename: str) -> StreamingResponse:
+    extension = "csv" if export_format == "csv" else "ndjson"
+    return StreamingResponse(
+        stream_query(query, params, names, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+@router.get("/export/gps-records")
+def export_gps_records(
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
+    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
+    commaddr: list[str] | None = Query(None, description="车牌号，可重复传入多个；不传时导出全部车辆"),
+    min_lat: float = Query(None, ge=-90, le=90, description="经纬度范围：最小纬度"),
+    min_lon: float = Query(None, ge=-180, le=180, description="经纬度范围：最小经度"),
+    max_lat: float = Query(None, ge=-90, le=90, description="经纬度范围：最大纬度"),
+    max_lon: float = Query(None, ge=-180, le=180, description="经纬度范围：最大经度"),
+    format: ExportFormat = Query("ndjson", description="导出格式：ndjson 或 csv")
+):
+    """
+    流式导出GPS轨迹点（按车牌号、时间排序，即逐车轨迹），
+    服务端游标分批读取、分块输出，内存占用与导出的时间范围无关
+    """
+    try:
+        bbox = parse_bbox(min_lat, min_lon, max_lat, max_lon)
+        query, params = gps_record_export_query(start_utc, end_utc, commaddr, bbox)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    # 查询在开始输出后才执行，此后的错误只能中断响应，记录在日志中
+    return export_response(query, params, GPS_RECORD_EXPORT_COLUMNS, format, f"gpsrecord_{start_utc}_{end_utc}")
+
+@router.get("/export/taxi-orders")
+def export_taxi_orders(
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
+    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
+    commaddr: list[str] | None = Query(None, description="车牌号，可重复传入多个；不传时导出全部车辆"),
+    min_lat: float = Query(None, ge=-90, le=90, description="上车点范围：最小纬度"),
+    min_lon: float = Query(None, ge=-180, le=180, description="上车点范围：最小经度"),
+    max_lat: float = Query(None, ge=-90, le=90, description="上车点范围：最大纬度"),
+    max_lon: float = Query(None, ge=-180, le=180, description="上车点范围：最大经度"),
+    format: ExportFormat = Query("ndjson", description="导出格式：ndjson 或 csv")
+):
+    """流式导出出租车订单（按上车时间排序），与 /analysis/export/gps-records 相同的分批输出方式"""
+    try:
+        bbox = parse_bbox(min_lat, min_lon, max_lat, max_lon)
+        query, params = taxi_order_export_query(start_utc, end_utc, commaddr, bbox)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    # 查询在开始输出后才执行，此后的错误只能中断响应，记录在日志中
+    return export_response(query, params, TAXI_ORDER_EXPORT_COLUMNS, format, f"taxiorder_{start_utc}_{end_utc}")
@@ -1,70 +1,133 @@
-from fastapi import APIRouter, Query
-from datetime import datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, Query, Request
+from datetime import datetime, timedelta, timezone
 from sqlmodel import Session, select
+from app.core.config import settings
 from app.core.db import engine
-from app.models import TaxiOrder, GPSRecord, Weather
+from app.models import ImportJob, Weather
 from typing import Literal
-import csv
+import os
 from fastapi.responses import JSONResponse
-from sqlalchemy import text
+from app.data_analysis.cache import bump_data_version, cached_json_response
+from app.data_analysis.importers import create_import_job, resolve_import_path, run_taxi_order_import
+from app.data_analysis.partitions import maintain_partitions
+from app.data_analysis.rollups import (
+    query_rollup_buckets,
+    query_taxiorder_buckets,
+    refresh_taxi_rollups_for_date,
+)
+from app.data_analysis.coordinates import CoordinateSystem
+from app.data_analysis.speed_rollups import SpeedLevel, query_speed_heatmap, refresh_speed_rollups_for_date
+from app.data_analysis.timeutils import day_range, parse_utc
+from app.data_analysis.trip_metrics import backfill_trip_distances
+
+# 统计间隔对应的 PostgreSQL interval 与时间跨度
+BUCKET_INTERVALS = {"15min": "15 minutes", "1h": "1 hour"}
+BUCKET_DELTAS = {"15min": timedelta(minutes=15), "1h": timedelta(hours=1)}
+# 统计数据来源：rollup 读取15分钟汇总表，raw 直接在订单表上做一次分组查询
+StatsSource = Literal["rollup", "raw"]
+# 通过 Accept 请求 arrow / packed 格式时 segments 按列编码的字段
+SPEED_HEATMAP_COLUMNS = [
+    "segment", "lat", "lon", "point_count", "avg_speed_kmh", "median_speed_kmh", "p85_speed_kmh", "congestion_level"
+]
 
 def parse_utc_timestamp(utc_str: str) -> datetime:
     return datetime.strptime(utc_str, "%Y%m%d%H%M%S")
 
+BEIJING_TZ = timezone(timedelta(hours=8))
+
 def utc_to_beijing(dt: datetime) -> datetime:
-    return dt + timedelta(hours=8)
+    """转换为北京时间；带时区的值（timestamptz 列）按其时区换算，不带时区的值视为 UTC"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(BEIJING_TZ)
+
+def load_stat_buckets(interval: str, date: str | None, source: StatsSource = "rollup") -> list[dict]:
+    """一次查询取出每个时间桶的全部统计指标，各统计接口和看板接口共用"""
+    with Session(engine) as session:
+        if source == "raw":
+            return query_taxiorder_buckets(session, BUCKET_INTERVALS[interval], date)
+        return query_rollup_buckets(session, BUCKET_INTERVALS[interval], date)
+
+def interval_bounds(bucket: dict, delta: timedelta) -> dict:
+    start_dt = utc_to_beijing(bucket["interval_start"])
+    end_dt = start_dt + delta
+    return {
+        "interval_start": start_dt.strftime("%Y%m%d%H%M%S"),
+        "interval_end": end_dt.strftime("%Y%m%d%H%M%S"),
+    }
+
+def passenger_count_rows(buckets: list[dict], interval: str) -> list[dict]:
+    delta = BUCKET_DELTAS[interval]
+    return [{**interval_bounds(bucket, delta), "count": bucket["order_count"]} for bucket in buckets]
+
+def occupied_taxi_count_rows(buckets: list[dict], interval: str) -> list[dict]:
+    delta = BUCKET_DELTAS[interval]
+    return [
+        {**interval_bounds(bucket, delta), "occupied_taxi_count": bucket["occupied_taxi_count"]}
+        for bucket in buckets
+        if bucket["occupied_taxi_count"] > 0
+    ]
+
+def average_speed_rows(buckets: list[dict], interval: str) -> list[dict]:
+    delta = BUCKET_DELTAS[interval]
+    result = []
+    for bucket in buckets:
+        # 只统计同时有下车时间和行驶距离的订单
+        if bucket["trip_count"] == 0:
+            continue
+        avg_speed_mps = bucket["avg_speed_mps"]
+        avg_speed_kmh = round(avg_speed_mps * 3.6, 2) if avg_speed_mps is not None else None
+        result.append({
+            **interval_bounds(bucket, delta),
+            "avg_speed_kmh": avg_speed_kmh,
+            "order_count": bucket["trip_count"]
+        })
+    return result
+
+def distance_summary(buckets: list[dict]) -> dict:
+    total_count = sum(bucket["distance_count"] for bucket in buckets)
+    counts = {
+        "short_distance": ("< 4000米", sum(bucket["short_count"] for bucket in buckets)),
+        "medium_distance": ("4000-8000米", sum(bucket["medium_count"] for bucket in buckets)),
+        "long_distance": ("> 8000米", sum(bucket["long_count"] for bucket in buckets)),
+    }
+    return {
+        "total_orders": total_count,
+        "distance_distribution": {
+            name: {
+                "range": label,
+                "count": count,
+                "percentage": round((count / total_count) * 100, 2) if total_count > 0 else 0
+            }
+            for name, (label, count) in counts.items()
+        }
+    }
 
 router = APIRouter(prefix="/analysis", tags=["analysis-statistics"])
 
 @router.get("/passenger-count-distribution")
 def passenger_count_distribution(
+    request: Request,
     interval: Literal["15min", "1h"] = Query("15min", description="统计间隔，可选15min或1h"),
-    date: str = Query(None, description="指定日期，格式为YYYYMMDD")
+    date: str = Query(None, description="指定日期，格式为YYYYMMDD"),
+    source: StatsSource = Query("rollup", description="数据来源：rollup（汇总表）或 raw（订单表实时统计）")
 ):
     """
-    用SQL分桶统计每个时间段的订单数（乘客数），大幅提升查询速度。
+    统计每个时间段的订单数（乘客数），默认读取15分钟汇总表，1小时粒度由汇总行相加得到。
     """
-    if interval == "15min":
-        bucket_sql = (
-            "SUBSTRING(onutc, 1, 8) || SUBSTRING(onutc, 9, 2) || "
-            "LPAD((FLOOR(CAST(SUBSTRING(onutc, 11, 2) AS INTEGER) / 15) * 15)::text, 2, '0') || '00'"
-        )
-        delta = timedelta(minutes=15)
-    else:
-        bucket_sql = "SUBSTRING(onutc, 1, 8) || SUBSTRING(onutc, 9, 2) || '0000'"
-        delta = timedelta(hours=1)
-    where_clause = "WHERE onutc IS NOT NULL"
-    params = {}
-    if date:
-        where_clause += " AND SUBSTRING(onutc, 1, 8) = :date"
-        params["date"] = date
-    sql = text(f"""
-        SELECT {bucket_sql} AS interval_start, COUNT(*) AS count
-        FROM taxiorder
-        {where_clause}
-        GROUP BY interval_start
-        ORDER BY interval_start
-    """)
-    result = []
     try:
-        with Session(engine) as session:
-            rows = session.execute(sql, params).fetchall()
-            for row in rows:
-                k = row[0]
-                start_dt = utc_to_beijing(parse_utc_timestamp(k))
-                end_dt = start_dt + delta
-                result.append({
-                    "interval_start": start_dt.strftime("%Y%m%d%H%M%S"),
-                    "interval_end": end_dt.strftime("%Y%m%d%H%M%S"),
-                    "count": row[1]
-                })
-        return result
+        return cached_json_response(
+            request, "taxiorder", {"interval": interval, "date": date, "source": source},
+            lambda: passenger_count_rows(load_stat_buckets(interval, date, source), interval),
+        )
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"统计乘客数量分布失败: {str(e)}"})
 
 @router.get("/distance-distribution")
 def distance_distribution(
-    date: str = Query(None, description="指定日期，格式为YYYYMMDD")
+    request: Request,
+    date: str = Query(None, description="指定日期，格式为YYYYMMDD"),
+    source: StatsSource = Query("rollup", description="数据来源：rollup（汇总表）或 raw（订单表实时统计）")
 ):
     """
     查询 TaxiOrder 表中不同距离运输的占比统计
@@ -73,62 +136,10 @@ def distance_distribution(
     长途：> 8000米
     """
     try:
-        with Session(engine) as session:
-            where_clause = "WHERE distance IS NOT NULL"
-            params = {}
-            if date:
-                where_clause += " AND SUBSTRING(onutc, 1, 8) = :date"
-                params["date"] = date
-            sql = text(
-                f"SELECT "
-                "COUNT(*) AS total, "
-                "SUM(CASE WHEN distance < 4000 THEN 1 ELSE 0 END) AS short_count, "
-                "SUM(CASE WHEN distance >= 4000 AND distance <= 8000 THEN 1 ELSE 0 END) AS medium_count, "
-                "SUM(CASE WHEN distance > 8000 THEN 1 ELSE 0 END) AS long_count "
-                "FROM taxiorder "
-                f"{where_clause}"
-            )
-            result = session.execute(sql, params).first()
-            if result:
-                total_count = result[0]
-                short_distance_count = result[1]
-                medium_distance_count = result[2]
-                long_distance_count = result[3]
-                if total_count > 0:
-                    short_percentage = round((short_distance_count / total_count) * 100, 2)
-                    medium_percentage = round((medium_distance_count / total_count) * 100, 2)
-                    long_percentage = round((long_distance_count / total_count) * 100, 2)
-                else:
-                    short_percentage = medium_percentage = long_percentage = 0
-                return {
-                    "total_orders": total_count,
-                    "distance_distribution": {
-                        "short_distance": {
-                            "range": "< 4000米",
-                            "count": short_distance_count,
-                            "percentage": short_percentage
-                        },
-                        "medium_distance": {
-                            "range": "4000-8000米",
-                            "count": medium_distance_count,
-                            "percentage": medium_percentage
-                        },
-                        "long_distance": {
-                            "range": "> 8000米",
-                            "count": long_distance_count,
-                            "percentage": long_percentage
-                        }
-                    }
-                }
-            else:
-                return {
-                    "total_orders": 0,
-                    "distance_distribution": {
-                        "short_distance": {"range": "< 4000米", "count": 0, "percentage": 0},
-                        "medium_distance": {"range": "4000-8000米", "count": 0, "percentage": 0},
-                        "long_distance": {"range": "> 8000米", "count": 0, "percentage": 0}
-                    }
-                }
+        return cached_json_response(
+            request, "taxiorder", {"date": date, "source": source},
+            lambda: distance_summary(load_stat_buckets("15min", date, source)),
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -137,121 +148,182 @@ def distance_distribution(
 
 @router.get("/occupied-taxi-count-distribution")
 def occupied_taxi_count_distribution(
+    request: Request,
     interval: Literal["15min", "1h"] = Query("15min", description="统计间隔，可选15min或1h"),
-    date: str = Query(None, description="指定日期，格式为YYYYMMDD")
+    date: str = Query(None, description="指定日期，格式为YYYYMMDD"),
+    source: StatsSource = Query("rollup", description="数据来源：rollup（汇总表）或 raw（订单表实时统计）")
 ):
     """
-    用SQL分桶统计每个时间段内有多少不同的出租车在载客。
+    统计每个时间段内有多少不同的出租车在载客，汇总表保存了每个15分钟桶的车辆集合，粗粒度时合并后去重。
     """
-    if interval == "15min":
-        bucket_sql = (
-            "SUBSTRING(onutc, 1, 8) || SUBSTRING(onutc, 9, 2) || "
-            "LPAD((FLOOR(CAST(SUBSTRING(onutc, 11, 2) AS INTEGER) / 15) * 15)::text, 2, '0') || '00'"
-        )
-        delta = timedelta(minutes=15)
-    else:
-        bucket_sql = "SUBSTRING(onutc, 1, 8) || SUBSTRING(onutc, 9, 2) || '0000'"
-        delta = timedelta(hours=1)
-    where_clause = "WHERE onutc IS NOT NULL AND commaddr IS NOT NULL"
-    params = {}
-    if date:
-        where_clause += " AND SUBSTRING(onutc, 1, 8) = :date"
-        params["date"] = date
-    sql = text(f"""
-        SELECT {bucket_sql} AS interval_start, COUNT(DISTINCT commaddr) AS occupied_taxi_count
-        FROM taxiorder
-        {where_clause}
-        GROUP BY interval_start
-        ORDER BY interval_start
-    """)
-    result = []
     try:
-        with Session(engine) as session:
-            rows = session.execute(sql, params).fetchall()
-            for row in rows:
-                k = row[0]
-                start_dt = utc_to_beijing(parse_utc_timestamp(k))
-                end_dt = start_dt + delta
-                result.append({
-                    "interval_start": start_dt.strftime("%Y%m%d%H%M%S"),
-                    "interval_end": end_dt.strftime("%Y%m%d%H%M%S"),
-                    "occupied_taxi_count": row[1]
-                })
-        return result
+        return cached_json_response(
+            request, "taxiorder", {"interval": interval, "date": date, "source": source},
+            lambda: occupied_taxi_count_rows(load_stat_buckets(interval, date, source), interval),
+        )
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"统计载客出租车数量分布失败: {str(e)}"})
 
-
 @router.post("/import-taxi-orders")
-def import_taxi_orders():
-    filepath = "/app/data/csv/pair_converted_jn0912.csv"
-    batch_size = 1000
-    total = 0
+def import_taxi_orders(
+    background_tasks: BackgroundTasks,
+    file: str = Query(None, description="IMPORT_DATA_DIR 下的订单CSV文件名，默认取配置 TAXI_ORDER_CSV_FILE"),
+    chunk_rows: int = Query(None, ge=1000, description="每批读取并COPY的行数，默认取配置")
+):
+    """
+    在后台以 COPY 流式导入出租车订单，返回导入任务编号，进度通过 /analysis/import-jobs/{job_id} 查询。
+    按 (车牌号, 上车时间) 去重，重复导入同一文件是安全的。
+    """
     try:
-        with Session(engine) as session:
-            with open(filepath, encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                batch = []
-                for row in reader:
-                    commaddr = row.get("COMMADDR", "")
-                    onutc = row.get("ONUTC", "")
-                    onlat = row.get("ONLAT", "")
-                    onlon = row.get("ONLON", "")
-                    offutc = row.get("OFFUTC", "")
-                    offlat = row.get("OFFLAT", "")
-                    offlon = row.get("OFFLON", "")
-                    if not all([commaddr, onutc, onlat, onlon, offutc, offlat, offlon]):
-                        continue
-                    try:
-                        onlat_float = float(onlat)
-                        onlon_float = float(onlon)
-                        offlat_float = float(offlat)
-                        offlon_float = float(offlon)
-                        record = TaxiOrder(
-                            commaddr=commaddr,
-                            onutc=onutc,
-                            onlat=onlat_float,
-                            onlon=onlon_float,
-                            offutc=offutc,
-                            offlat=offlat_float,
-                            offlon=offlon_float
-                        )
-                        batch.append(record)
-                        if len(batch) >= batch_size:
-                            session.add_all(batch)
-                            session.commit()
-                            total += len(batch)
-                            batch.clear()
-                    except (ValueError, TypeError) as e:
-                        print(f"跳过无效数据行: {e}")
-                        continue
-                if batch:
-                    session.add_all(batch)
-                    session.commit()
-                    total += len(batch)
-        return {
-            "message": f"成功导入{total}条出租车订单数据",
-            "imported_count": total
-        }
-    except FileNotFoundError:
+        filepath = resolve_import_path(file)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if not os.path.isfile(filepath):
         return JSONResponse(
             status_code=404,
             content={"error": f"文件 {filepath} 不存在"}
         )
+    try:
+        job_id = create_import_job("taxiorder", filepath)
+        background_tasks.add_task(run_taxi_order_import, job_id, filepath, chunk_rows)
+        return {
+            "message": f"已提交出租车订单导入任务: {filepath}",
+            "job_id": job_id
+        }
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": f"导入失败: {str(e)}"}
-        ) 
+        )
+
+@router.get("/import-jobs/{job_id}")
+def import_job_status(job_id: int):
+    """
+    查询批量导入任务的状态和进度
+    """
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        if job is None:
+            return JSONResponse(status_code=404, content={"error": f"导入任务 {job_id} 不存在"})
+        return job.model_dump()
+
+@router.post("/taxi-rollups/refresh")
+def refresh_taxi_rollups_endpoint(
+    background_tasks: BackgroundTasks,
+    date: str = Query(None, description="需要重新汇总的日期，格式为YYYYMMDD，不指定则全部重建")
+):
+    """
+    在后台重新计算订单统计汇总表
+    """
+    if date:
+        try:
+            day_range(date)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"error": f"日期格式错误: {date}"})
+    background_tasks.add_task(refresh_taxi_rollups_for_date, date)
+    background_tasks.add_task(bump_data_version, "taxiorder")
+    return {"message": f"已提交 {date or '全部日期'} 的统计汇总任务"}
+
+@router.post("/trip-metrics/backfill")
+def backfill_trip_metrics_endpoint(
+    background_tasks: BackgroundTasks,
+    date: str = Query(None, description="需要回填的日期，格式为YYYYMMDD，不指定则回填全部日期"),
+    use_tracks: bool = Query(True, description="有GPS轨迹的订单是否改用轨迹长度作为行驶距离"),
+    overwrite: bool = Query(False, description="是否用上下车点球面距离覆盖已有的行驶距离")
+):
+    """
+    在后台回填订单的行驶距离（上下车点球面距离，有轨迹时为轨迹长度），
+    行程时长和平均速度随之由数据库生成列更新，并重新计算对应日期的统计汇总
+    """
+    if date:
+        try:
+            day_range(date)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"error": f"日期格式错误: {date}"})
+    background_tasks.add_task(backfill_trip_distances, date, use_tracks, overwrite)
+    background_tasks.add_task(bump_data_version, "taxiorder")
+    return {"message": f"已提交 {date or '全部日期'} 的行驶距离回填任务"}
+
+@router.post("/speed-rollups/refresh")
+def refresh_speed_rollups_endpoint(
+    background_tasks: BackgroundTasks,
+    date: str = Query(None, description="需要重新汇总的日期，格式为YYYYMMDD，不指定则全部重建")
+):
+    """
+    在后台重新计算GPS速度汇总表，配置了路网文件时同时做地图匹配生成道路粒度的汇总
+    """
+    if date:
+        try:
+            day_range(date)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"error": f"日期格式错误: {date}"})
+    background_tasks.add_task(refresh_speed_rollups_for_date, date)
+    background_tasks.add_task(bump_data_version, "gpsrecord")
+    return {"message": f"已提交 {date or '全部日期'} 的速度汇总任务"}
+
+@router.get("/speed-heatmap")
+def speed_heatmap(
+    request: Request,
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS，向下对齐到15分钟"),
+    end_utc: str = Query(..., description="结束时间戳（不含），格式YYYYMMDDHHMMSS"),
+    level: SpeedLevel = Query("cell", description="汇总粒度：cell（0.01°网格）或 road（地图匹配到的道路，需配置路网）"),
+    min_points: int = Query(1, ge=1, description="点数少于该值的路段不返回"),
+    coordinate_system: CoordinateSystem = Query("BD09", description="目标坐标系：WGS84, GCJ02, BD09")
+):
+    """
+    从速度汇总表读取时间范围内各网格或道路的速度分布和拥堵等级，用于绘制路况热力图。
+    拥堵等级 congestion_level 按平均速度划分：0 畅通（≥30km/h）、1 缓行（≥20）、2 拥堵（≥10）、3 严重拥堵；
+    道路粒度额外返回道路名称和几何 path（二进制格式中不含）。
+    Accept 为 application/vnd.apache.arrow.stream 或 application/x-packed-columns 时 segments 按列编码。
+    """
+    try:
+        if parse_utc(end_utc) <= parse_utc(start_utc):
+            return JSONResponse(status_code=400, content={"error": "结束时间必须晚于起始时间"})
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "时间格式错误，应为YYYYMMDDHHMMSS"})
+
+    def compute():
+        with Session(engine) as session:
+            segments = query_speed_heatmap(session, level, start_utc, end_utc, min_points, coordinate_system)
+        return {
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "level": level,
+            "coordinate_system": coordinate_system,
+            "count": len(segments),
+            "segments": segments
+        }
+    try:
+        return cached_json_response(
+            request, "gpsrecord",
+            {"start_utc": start_utc, "end_utc": end_utc, "level": level,
+             "min_points": min_points, "coordinate_system": coordinate_system},
+            compute, columnar=("segments", SPEED_HEATMAP_COLUMNS),
+        )
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"查询路况热力图失败: {str(e)}"})
+
+@router.post("/partitions/maintain")
+def maintain_partitions_endpoint(background_tasks: BackgroundTasks):
+    """
+    在后台维护订单和轨迹表的按天分区：预建未来几天的分区，并按保留期限删除过期分区
+    """
+    background_tasks.add_task(maintain_partitions)
+    return {
+        "message": "已提交分区维护任务",
+        "precreate_days": settings.PARTITION_PRECREATE_DAYS,
+        "retention_days": settings.ANALYSIS_RETENTION_DAYS
+    }
 
 @router.get("/weather-info")
 def weather_info(
+    request: Request,
     date: str = Query(..., description="日期，格式为YYYY-MM-DD")
 ):
     """
     查询指定日期当天每一小时的天气信息
     """
-    try:
+    def compute():
         with Session(engine) as session:
             # 假设Time_new格式为YYYY-MM-DD HH:MM:SS，取date开头的所有记录
             results = session.exec(select(Weather).where(Weather.Time_new.startswith(date))).all()
@@ -269,86 +341,54 @@ def weather_info(
                 return {"weather": weather_list}
             else:
                 return JSONResponse(status_code=404, content={"error": "未找到该日期的天气信息"})
+    try:
+        return cached_json_response(request, "weather", {"date": date}, compute)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"查询天气信息失败: {str(e)}"}) 
 
 @router.get("/time-interval-stats")
 def time_interval_stats(
+    request: Request,
     interval: Literal["15min", "1h"] = Query("1h", description="统计间隔，可选15min或1h"),
-    date: str = Query(None, description="指定日期，格式为YYYYMMDD")
+    date: str = Query(None, description="指定日期，格式为YYYYMMDD"),
+    source: StatsSource = Query("rollup", description="数据来源：rollup（汇总表）或 raw（订单表实时统计）")
 ):
     """
-    统计每个时间段的平均距离和平均耗时
+    统计每个时间段的平均速度（行驶距离 / 上下车时间差），超过 80 km/h 的速度视为异常数据不参与平均
     """
-    if interval == "15min":
-        bucket_sql = (
-            "SUBSTRING(onutc, 1, 8) || SUBSTRING(onutc, 9, 2) || "
-            "LPAD((FLOOR(CAST(SUBSTRING(onutc, 11, 2) AS INTEGER) / 15) * 15)::text, 2, '0') || '00'"
+    try:
+        return cached_json_response(
+            request, "taxiorder", {"interval": interval, "date": date, "source": source},
+            lambda: average_speed_rows(load_stat_buckets(interval, date, source), interval),
         )
-        delta = timedelta(minutes=15)
-    else:
-        bucket_sql = "SUBSTRING(onutc, 1, 8) || SUBSTRING(onutc, 9, 2) || '0000'"
-        delta = timedelta(hours=1)
-    where_clause = "WHERE onutc IS NOT NULL AND offutc IS NOT NULL AND distance IS NOT NULL"
-    params = {}
-    if date:
-        where_clause += " AND SUBSTRING(onutc, 1, 8) = :date"
-        params["date"] = date
-    # 计算耗时（秒）：offutc - onutc
-    sql = text(f"""
-        SELECT {bucket_sql} AS interval_start,
-               AVG(
-                   CASE 
-                       WHEN 
-                           (CAST(SUBSTRING(offutc, 9, 2) AS INTEGER) * 3600 + 
-                            CAST(SUBSTRING(offutc, 11, 2) AS INTEGER) * 60 + 
-                            CAST(SUBSTRING(offutc, 13, 2) AS INTEGER)) - 
-                           (CAST(SUBSTRING(onutc, 9, 2) AS INTEGER) * 3600 + 
-                            CAST(SUBSTRING(onutc, 11, 2) AS INTEGER) * 60 + 
-                            CAST(SUBSTRING(onutc, 13, 2) AS INTEGER)) > 0
-                       THEN
-                           CASE
-                               WHEN distance /
-                                   ((CAST(SUBSTRING(offutc, 9, 2) AS INTEGER) * 3600 + 
-                                     CAST(SUBSTRING(offutc, 11, 2) AS INTEGER) * 60 + 
-                                     CAST(SUBSTRING(offutc, 13, 2) AS INTEGER)) - 
-                                    (CAST(SUBSTRING(onutc, 9, 2) AS INTEGER) * 3600 + 
-                                     CAST(SUBSTRING(onutc, 11, 2) AS INTEGER) * 60 + 
-                                     CAST(SUBSTRING(onutc, 13, 2) AS INTEGER))) <= 22.22
-                               THEN distance /
-                                   ((CAST(SUBSTRING(offutc, 9, 2) AS INTEGER) * 3600 + 
-                                     CAST(SUBSTRING(offutc, 11, 2) AS INTEGER) * 60 + 
-                                     CAST(SUBSTRING(offutc, 13, 2) AS INTEGER)) - 
-                                    (CAST(SUBSTRING(onutc, 9, 2) AS INTEGER) * 3600 + 
-                                     CAST(SUBSTRING(onutc, 11, 2) AS INTEGER) * 60 + 
-                                     CAST(SUBSTRING(onutc, 13, 2) AS INTEGER)))
-                               ELSE NULL
-                           END
-                       ELSE NULL
-                   END
-               ) AS avg_speed_mps,
-               COUNT(*) AS count
-        FROM taxiorder
-        {where_clause}
-        GROUP BY interval_start
-        ORDER BY interval_start
-    """)
-    result = []
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"统计时段平均速度失败: {str(e)}"})
+
+@router.get("/dashboard-stats")
+def dashboard_stats(
+    request: Request,
+    interval: Literal["15min", "1h"] = Query("15min", description="统计间隔，可选15min或1h"),
+    date: str = Query(None, description="指定日期，格式为YYYYMMDD"),
+    source: StatsSource = Query("rollup", description="数据来源：rollup（汇总表）或 raw（订单表实时统计）")
+):
+    """
+    看板统计：一次查询同时返回订单数、载客车辆数、平均速度和距离分布，
+    各部分与对应的单项统计接口结构相同。
+    """
+    def compute():
+        buckets = load_stat_buckets(interval, date, source)
+        return {
+            "interval": interval,
+            "date": date,
+            "source": source,
+            "passenger_count_distribution": passenger_count_rows(buckets, interval),
+            "occupied_taxi_count_distribution": occupied_taxi_count_rows(buckets, interval),
+            "time_interval_stats": average_speed_rows(buckets, interval),
+            "distance_distribution": distance_summary(buckets)
+        }
     try:
-        with Session(engine) as session:
-            rows = session.execute(sql, params).fetchall()
-            for row in rows:
-                k = row[0]
-                start_dt = utc_to_beijing(parse_utc_timestamp(k))
-                end_dt = start_dt + delta
-                avg_speed_mps = float(row[1]) if row[1] is not None else None
-                avg_speed_kmh = round(avg_speed_mps * 3.6, 2) if avg_speed_mps is not None else None
-                result.append({
-                    "interval_start": start_dt.strftime("%Y%m%d%H%M%S"),
-                    "interval_end": end_dt.strftime("%Y%m%d%H%M%S"),
-                    "avg_speed_kmh": avg_speed_kmh,
-                    "order_count": row[2]
-                })
-        return result
+        return cached_json_response(
+            request, "taxiorder", {"interval": interval, "date": date, "source": source}, compute
+        )
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"统计时段平均速度失败: {str(e)}"}) 
+        return JSONResponse(status_code=500, content={"error": f"看板统计失败: {str(e)}"})
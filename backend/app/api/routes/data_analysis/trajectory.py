@@ -1,209 +1,284 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, BackgroundTasks, Query, Request, Response
+from fastapi.responses import JSONResponse
 from datetime import datetime
-from sqlmodel import Session, select
-from app.core.db import engine
-from app.models import GPSRecord
+from app.core.config import settings
+from app.data_analysis.coordinates import CoordinateSystem, transform_coordinates
+from app.data_analysis.encoding import columnar_response, negotiate_format
+from app.data_analysis.importers import create_import_job, resolve_import_path, run_gps_record_import
+from app.data_analysis.map_matching import load_road_network, match_track_points
+from app.data_analysis.trajectories import (
+    FLEET_MAX_VEHICLES,
+    SimplifyMethod,
+    SmoothMethod,
+    clean_track,
+    get_fleet_tracks,
+    get_vehicle_track,
+    simplify_tolerance_m,
+    track_columns,
+    transform_points,
+)
+import numpy as np
 from typing import List, Tuple
-import math
+import os
 
 def parse_utc_timestamp(utc_str: str) -> datetime:
     return datetime.strptime(utc_str, "%Y%m%d%H%M%S")
 
 def coordinate_transform(lat: float, lon: float, from_system: str = "WGS84", to_system: str = "BD09") -> Tuple[float, float]:
-    if from_system == to_system:
-        return lat, lon
-    def wgs84_to_gcj02(lat: float, lon: float) -> Tuple[float, float]:
-        a = 6378245.0
-        ee = 0.00669342162296594323
-        def transform_lat(x: float, y: float) -> float:
-            ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
-            ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
-            ret += (20.0 * math.sin(y * math.pi) + 40.0 * math.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
-            ret += (160.0 * math.sin(y / 12.0 * math.pi) + 320 * math.sin(y * math.pi / 30.0)) * 2.0 / 3.0
-            return ret
-        def transform_lon(x: float, y: float) -> float:
-            ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
-            ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
-            ret += (20.0 * math.sin(x * math.pi) + 40.0 * math.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
-            ret += (150.0 * math.sin(x / 12.0 * math.pi) + 300.0 * math.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
-            return ret
-        dlat = transform_lat(lon - 105.0, lat - 35.0)
-        dlon = transform_lon(lon - 105.0, lat - 35.0)
-        radlat = lat / 180.0 * math.pi
-        magic = math.sin(radlat)
-        magic = 1 - ee * magic * magic
-        sqrtmagic = math.sqrt(magic)
-        dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * math.pi)
-        dlon = (dlon * 180.0) / (a / sqrtmagic * math.cos(radlat) * math.pi)
-        mglat = lat + dlat
-        mglon = lon + dlon
-        return mglat, mglon
-    def gcj02_to_bd09(lat: float, lon: float) -> Tuple[float, float]:
-        z = math.sqrt(lon * lon + lat * lat) + 0.00002 * math.sin(lat * math.pi)
-        theta = math.atan2(lat, lon) + 0.000003 * math.cos(lon * math.pi)
-        bd_lon = z * math.cos(theta) + 0.0065
-        bd_lat = z * math.sin(theta) + 0.006
-        return bd_lat, bd_lon
-    def wgs84_to_bd09(lat: float, lon: float) -> Tuple[float, float]:
-        gcj_lat, gcj_lon = wgs84_to_gcj02(lat, lon)
-        return gcj02_to_bd09(gcj_lat, gcj_lon)
-    if from_system == "WGS84" and to_system == "BD09":
-        return wgs84_to_bd09(lat, lon)
-    elif from_system == "WGS84" and to_system == "GCJ02":
-        return wgs84_to_gcj02(lat, lon)
-    elif from_system == "GCJ02" and to_system == "BD09":
-        return gcj02_to_bd09(lat, lon)
-    else:
-        return lat, lon
-
-def filter_gps_noise(points: List[dict], max_speed: float = 50.0, max_acceleration: float = 10.0) -> List[dict]:
-    if len(points) < 2:
-        return points
-    filtered_points = [points[0]]
-    for i in range(1, len(points)):
-        current = points[i]
-        previous = points[i-1]
-        try:
-            current_time = datetime.strptime(current['utc'], "%Y%m%d%H%M%S")
-            previous_time = datetime.strptime(previous['utc'], "%Y%m%d%H%M%S")
-            time_diff = (current_time - previous_time).total_seconds()
-        except:
-            time_diff = 1.0
-        if time_diff <= 0:
-            continue
-        lat1, lon1 = previous['lat'], previous['lon']
-        lat2, lon2 = current['lat'], current['lon']
-        R = 6371000
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        actual_speed = distance / time_diff if time_diff > 0 else 0
-        speed_kmh = actual_speed * 3.6
-        if speed_kmh > max_speed:
-            print(f"过滤异常速度点: {speed_kmh:.1f} km/h")
-            continue
-        if len(filtered_points) > 1:
-            prev_speed = float(previous.get('speed', 0)) / 100
-            acceleration = abs(actual_speed - prev_speed) / time_diff if time_diff > 0 else 0
-            if acceleration > max_acceleration:
-                print(f"过滤异常加速度点: {acceleration:.1f} m/s²")
-                continue
-        filtered_points.append(current)
-    return filtered_points
-
-def smooth_trajectory(points: List[dict], window_size: int = 3) -> List[dict]:
-    if len(points) < window_size:
-        return points
-    smoothed_points = []
-    for i in range(len(points)):
-        start_idx = max(0, i - window_size // 2)
-        end_idx = min(len(points), i + window_size // 2 + 1)
-        window_lats = [points[j]['lat'] for j in range(start_idx, end_idx)]
-        window_lons = [points[j]['lon'] for j in range(start_idx, end_idx)]
-        avg_lat = sum(window_lats) / len(window_lats)
-        avg_lon = sum(window_lons) / len(window_lons)
-        smoothed_point = points[i].copy()
-        smoothed_point['lat'] = avg_lat
-        smoothed_point['lon'] = avg_lon
-        smoothed_points.append(smoothed_point)
-    return smoothed_points
+    """单点坐标转换，整条轨迹请直接用 app.data_analysis.coordinates.transform_coordinates"""
+    new_lat, new_lon = transform_coordinates(lat, lon, from_system, to_system)
+    return float(new_lat), float(new_lon)
 
 router = APIRouter(prefix="/analysis", tags=["analysis-trajectory"])
 
+@router.post("/import-gps-records")
+def import_gps_records(
+    background_tasks: BackgroundTasks,
+    file: str = Query(None, description="IMPORT_DATA_DIR 下的GPS文件名（.csv 或 .parquet），默认取配置 GPS_RECORD_FILE"),
+    chunk_rows: int = Query(None, ge=1000, description="每批读取并COPY的行数，默认取配置")
+):
+    """
+    在后台以 COPY 流式导入GPS轨迹点，按天拆分写入并按 (车牌号, 时间) 去重，
+    返回导入任务编号，进度通过 /analysis/import-jobs/{job_id} 查询。
+    """
+    try:
+        filepath = resolve_import_path(file, settings.GPS_RECORD_FILE)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if not os.path.isfile(filepath):
+        return JSONResponse(status_code=404, content={"error": f"文件 {filepath} 不存在"})
+    try:
+        job_id = create_import_job("gpsrecord", filepath)
+        background_tasks.add_task(run_gps_record_import, job_id, filepath, chunk_rows)
+        return {"message": f"已提交GPS轨迹导入任务: {filepath}", "job_id": job_id}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"导入失败: {str(e)}"})
+
 @router.get("/gps-records")
 def get_gps_records(
+    request: Request,
+    response: Response,
     commaddr: str = Query(..., description="车牌号"),
     start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
-    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS")
+    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
+    denoise: bool = Query(False, description="是否剔除时间倒退、速度或加速度异常的轨迹点"),
+    max_speed: float = Query(50.0, gt=0, description="去噪时允许的最大速度（km/h）"),
+    max_acceleration: float = Query(10.0, gt=0, description="去噪时允许的最大加速度（m/s²）"),
+    smooth: SmoothMethod = Query("none", description="平滑方式：none, moving_average, kalman"),
+    window_size: int = Query(3, ge=1, le=101, description="滑动平均窗口大小（点数）"),
+    simplify: SimplifyMethod = Query("none", description="抽稀算法：none, douglas_peucker, visvalingam（保留首末点和停留点）"),
+    tolerance_m: float = Query(None, gt=0, description="抽稀容差（米），visvalingam 以其平方作为三角形面积阈值"),
+    zoom: int = Query(None, ge=3, le=19, description="百度地图缩放级别，指定时按级别换算抽稀容差")
 ):
+    """
+    查询车辆轨迹点。Accept 为 application/vnd.apache.arrow.stream 或 application/x-packed-columns 时
+    以列式二进制返回（utc 换为 epoch 秒 time 列，其余字段作为元数据）
+    """
     try:
-        with Session(engine) as session:
-            query = select(GPSRecord).where(
-                GPSRecord.commaddr == commaddr,
-                GPSRecord.utc >= start_utc,
-                GPSRecord.utc <= end_utc
-            )
-            records = session.exec(query).all()
-            result = []
-            for record in records:
-                result.append({
-                    "id": record.id,
-                    "commaddr": record.commaddr,
-                    "utc": record.utc,
-                    "lat": record.lat,
-                    "lon": record.lon,
-                    "head": record.head,
-                    "speed": record.speed,
-                    "tflag": record.tflag
-                })
-            return {
-                "commaddr": commaddr,
-                "start_utc": start_utc,
-                "end_utc": end_utc,
-                "count": len(result),
-                "records": result
-            }
+        result = clean_track(
+            get_vehicle_track(commaddr, start_utc, end_utc),
+            denoise, max_speed, max_acceleration, smooth, window_size,
+            simplify, simplify_tolerance_m(tolerance_m, zoom)
+        )
+        metadata = {
+            "commaddr": commaddr,
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "count": len(result)
+        }
+        response_format = negotiate_format(request)
+        if response_format != "json":
+            return columnar_response(response_format, track_columns(result), metadata)
+        response.headers["Vary"] = "Accept"
+        return {**metadata, "records": result}
     except Exception as e:
         return {"error": str(e)} 
 
 @router.get("/gps-records-corrected")
 def get_gps_records_corrected(
+    request: Request,
+    response: Response,
     commaddr: str = Query(..., description="车牌号"),
     start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
     end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
-    coordinate_system: str = Query("BD09", description="目标坐标系：WGS84, GCJ02, BD09")
+    denoise: bool = Query(False, description="是否剔除时间倒退、速度或加速度异常的轨迹点"),
+    max_speed: float = Query(50.0, gt=0, description="去噪时允许的最大速度（km/h）"),
+    max_acceleration: float = Query(10.0, gt=0, description="去噪时允许的最大加速度（m/s²）"),
+    smooth: SmoothMethod = Query("none", description="平滑方式：none, moving_average, kalman"),
+    window_size: int = Query(3, ge=1, le=101, description="滑动平均窗口大小（点数）"),
+    simplify: SimplifyMethod = Query("none", description="抽稀算法：none, douglas_peucker, visvalingam（保留首末点和停留点）"),
+    tolerance_m: float = Query(None, gt=0, description="抽稀容差（米），visvalingam 以其平方作为三角形面积阈值"),
+    zoom: int = Query(None, ge=3, le=19, description="百度地图缩放级别，指定时按级别换算抽稀容差"),
+    coordinate_system: CoordinateSystem = Query("BD09", description="目标坐标系：WGS84, GCJ02, BD09")
 ):
+    """查询车辆轨迹点并转换坐标系，支持与 /analysis/gps-records 相同的二进制响应格式"""
     try:
-        with Session(engine) as session:
-            query = select(GPSRecord).where(
-                GPSRecord.commaddr == commaddr,
-                GPSRecord.utc >= start_utc,
-                GPSRecord.utc <= end_utc
-            ).order_by(GPSRecord.utc)
-            records = session.exec(query).all()
-            if not records:
-                return {
-                    "commaddr": commaddr,
-                    "start_utc": start_utc,
-                    "end_utc": end_utc,
-                    "count": 0,
-                    "records": [],
-                    "correction_info": {
-                        "original_count": 0,
-                        "coordinate_system": coordinate_system
-                    }
-                }
-            corrected_points = []
-            for record in records:
-                point = {
-                    "id": record.id,
-                    "commaddr": record.commaddr,
-                    "utc": record.utc,
-                    "lat": record.lat,
-                    "lon": record.lon,
-                    "head": record.head,
-                    "speed": record.speed,
-                    "tflag": record.tflag
-                }
-                if coordinate_system != "WGS84":
-                    point['lat'], point['lon'] = coordinate_transform(
-                        point['lat'], point['lon'], 
-                        from_system="WGS84", 
-                        to_system=coordinate_system
-                    )
-                corrected_points.append(point)
-            return {
-                "commaddr": commaddr,
-                "start_utc": start_utc,
-                "end_utc": end_utc,
-                "count": len(corrected_points),
-                "records": corrected_points,
-                "correction_info": {
-                    "original_count": len(records),
-                    "coordinate_system": coordinate_system
-                }
+        records = get_vehicle_track(commaddr, start_utc, end_utc)
+        # 先在 WGS84 下去噪、平滑、抽稀，再转换坐标系
+        tolerance = simplify_tolerance_m(tolerance_m, zoom)
+        corrected_points = clean_track(
+            records, denoise, max_speed, max_acceleration, smooth, window_size, simplify, tolerance
+        )
+        transform_points(corrected_points, coordinate_system)
+        metadata = {
+            "commaddr": commaddr,
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "count": len(corrected_points),
+            "correction_info": {
+                "original_count": len(records),
+                "coordinate_system": coordinate_system,
+                "denoise": denoise,
+                "smooth": smooth,
+                "simplify": simplify,
+                "tolerance_m": tolerance if simplify != "none" else None
+            }
+        }
+        response_format = negotiate_format(request)
+        if response_format != "json":
+            return columnar_response(response_format, track_columns(corrected_points), metadata)
+        response.headers["Vary"] = "Accept"
+        return {**metadata, "records": corrected_points}
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.get("/map-matched-track")
+def get_map_matched_track(
+    request: Request,
+    response: Response,
+    commaddr: str = Query(..., description="车牌号"),
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
+    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
+    denoise: bool = Query(False, description="是否剔除时间倒退、速度或加速度异常的轨迹点"),
+    max_speed: float = Query(50.0, gt=0, description="去噪时允许的最大速度（km/h）"),
+    max_acceleration: float = Query(10.0, gt=0, description="去噪时允许的最大加速度（m/s²）"),
+    coordinate_system: CoordinateSystem = Query("BD09", description="目标坐标系：WGS84, GCJ02, BD09")
+):
+    """
+    查询车辆轨迹并用 HMM 匹配到路网（配置 ANALYSIS_ROAD_NETWORK_FILE），每个点增加
+    matched_lat/matched_lon（吸附到道路上的坐标）、way_id（OSM way 编号）、road_name、distance_m（偏离道路的距离），
+    搜索半径内没有道路的点这些字段为空。
+    二进制格式下未匹配的点坐标和距离为 NaN、way_id 为 -1，道路名称放在元数据 roads 中。
+    """
+    try:
+        network = load_road_network()
+        points = clean_track(get_vehicle_track(commaddr, start_utc, end_utc), denoise, max_speed, max_acceleration)
+        # 在 WGS84 下匹配，再把原始坐标和吸附坐标一起转换到目标坐标系
+        matches = match_track_points(points, network)
+        matched_lat, matched_lon = transform_coordinates(matches["lat"], matches["lon"], "WGS84", coordinate_system)
+        transform_points(points, coordinate_system)
+        matched = matches["edge"] >= 0
+        roads = {way: network.way_names.get(way) for way in np.unique(matches["way_id"][matched]).tolist()}
+        metadata = {
+            "commaddr": commaddr,
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "count": len(points),
+            "matched_count": int(matched.sum()),
+            "coordinate_system": coordinate_system
+        }
+        response_format = negotiate_format(request)
+        if response_format != "json":
+            columns = track_columns(points)
+            columns.update(
+                matched_lat=matched_lat, matched_lon=matched_lon,
+                way_id=matches["way_id"], distance_m=matches["distance_m"]
+            )
+            metadata["roads"] = {str(way): name for way, name in roads.items()}
+            return columnar_response(response_format, columns, metadata)
+        for point, is_matched, lat, lon, way, distance in zip(
+            points, matched.tolist(), matched_lat.tolist(), matched_lon.tolist(),
+            matches["way_id"].tolist(), matches["distance_m"].tolist()
+        ):
+            point.update(
+                matched_lat=lat if is_matched else None,
+                matched_lon=lon if is_matched else None,
+                way_id=way if is_matched else None,
+                road_name=roads.get(way),
+                distance_m=distance if is_matched else None
+            )
+        response.headers["Vary"] = "Accept"
+        return {**metadata, "records": points}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"地图匹配失败: {str(e)}"})
+
+@router.get("/fleet-tracks")
+def get_fleet_tracks_endpoint(
+    request: Request,
+    response: Response,
+    start_utc: str = Query(..., description="起始时间戳，格式YYYYMMDDHHMMSS"),
+    end_utc: str = Query(..., description="结束时间戳，格式YYYYMMDDHHMMSS"),
+    commaddr: List[str] = Query(None, description="车牌号，可重复传入多个；不传时按经纬度范围选车"),
+    min_lat: float = Query(None, ge=-90, le=90, description="经纬度范围：最小纬度"),
+    min_lon: float = Query(None, ge=-180, le=180, description="经纬度范围：最小经度"),
+    max_lat: float = Query(None, ge=-90, le=90, description="经纬度范围：最大纬度"),
+    max_lon: float = Query(None, ge=-180, le=180, description="经纬度范围：最大经度"),
+    max_vehicles: int = Query(FLEET_MAX_VEHICLES, ge=1, le=FLEET_MAX_VEHICLES, description="最多返回的车辆数"),
+    denoise: bool = Query(False, description="是否剔除时间倒退、速度或加速度异常的轨迹点"),
+    max_speed: float = Query(50.0, gt=0, description="去噪时允许的最大速度（km/h）"),
+    max_acceleration: float = Query(10.0, gt=0, description="去噪时允许的最大加速度（m/s²）"),
+    smooth: SmoothMethod = Query("none", description="平滑方式：none, moving_average, kalman"),
+    window_size: int = Query(3, ge=1, le=101, description="滑动平均窗口大小（点数）"),
+    simplify: SimplifyMethod = Query("none", description="抽稀算法：none, douglas_peucker, visvalingam（保留首末点和停留点）"),
+    tolerance_m: float = Query(None, gt=0, description="抽稀容差（米），visvalingam 以其平方作为三角形面积阈值"),
+    zoom: int = Query(None, ge=3, le=19, description="百度地图缩放级别，指定时按级别换算抽稀容差"),
+    coordinate_system: CoordinateSystem = Query("BD09", description="目标坐标系：WGS84, GCJ02, BD09")
+):
+    """
+    批量查询多辆车的轨迹：一次数据库查询取回全部车辆的轨迹点并按车分组，
+    逐车去噪、平滑、抽稀后统一做坐标转换。
+    二进制格式下所有车辆的点拼接为一组列，vehicle 列为车辆在元数据 vehicles 中的下标。
+    """
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if not commaddr and any(value is None for value in bbox):
+        return JSONResponse(status_code=400, content={"error": "需要指定车牌号 commaddr 或完整的经纬度范围"})
+    try:
+        tracks = get_fleet_tracks(
+            start_utc, end_utc, commaddrs=commaddr or None,
+            bbox=None if commaddr else bbox, max_vehicles=max_vehicles
+        )
+        tolerance = simplify_tolerance_m(tolerance_m, zoom)
+        original_count = sum(len(points) for points in tracks.values())
+        for vehicle, points in tracks.items():
+            tracks[vehicle] = clean_track(
+                points, denoise, max_speed, max_acceleration, smooth, window_size, simplify, tolerance
+            )
+        all_points = [point for points in tracks.values() for point in points]
+        transform_points(all_points, coordinate_system)
+        metadata = {
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "vehicle_count": len(tracks),
+            "count": len(all_points),
+            "correction_info": {
+                "original_count": original_count,
+                "coordinate_system": coordinate_system,
+                "denoise": denoise,
+                "smooth": smooth,
+                "simplify": simplify,
+                "tolerance_m": tolerance if simplify != "none" else None
             }
+        }
+        response_format = negotiate_format(request)
+        if response_format != "json":
+            columns = track_columns(all_points)
+            counts = [len(points) for points in tracks.values()]
+            columns["vehicle"] = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+            metadata["vehicles"] = [
+                {"commaddr": vehicle, "count": count} for vehicle, count in zip(tracks, counts)
+            ]
+            return columnar_response(response_format, columns, metadata)
+        response.headers["Vary"] = "Accept"
+        return {
+            **metadata,
+            "vehicles": [
+                {"commaddr": vehicle, "count": len(points), "records": points}
+                for vehicle, points in tracks.items()
+            ]
+        }
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": f"批量轨迹查询失败: {str(e)}"})
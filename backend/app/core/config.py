@@ -69,6 +69,26 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # 数据分析
+    ANALYSIS_DBSCAN_N_JOBS: int = 1  # haversine DBSCAN 使用的 CPU 核数，-1 表示全部
+    ANALYSIS_CACHE_ENABLED: bool = True  # 是否缓存统计、聚类等分析接口的响应
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 512  # 进程内 LRU 缓存的最大条目数
+    ANALYSIS_CACHE_REDIS_URL: str | None = None  # 配置后改用 Redis 在多个 worker 间共享缓存和数据版本
+    ANALYSIS_CACHE_TTL_SECONDS: int = 3600  # 缓存条目的过期时间（Redis 和进程内 LRU），兜底外部写入、不递增版本号的数据
+    ANALYSIS_DATA_VERSION_TTL_SECONDS: float = 5.0  # 未使用 Redis 时，从数据库读取的数据版本号在进程内的复用时间
+    IMPORT_DATA_DIR: str = "/app/data/csv"  # 批量导入只允许读取该目录下的文件
+    TAXI_ORDER_CSV_FILE: str = "pair_converted_jn0912.csv"  # 默认导入的出租车订单文件
+    GPS_RECORD_FILE: str = "gps_jn0912.csv"  # 默认导入的 GPS 轨迹文件（CSV 或 Parquet）
+    IMPORT_CHUNK_ROWS: int = 200_000  # 流式导入时每批读取并 COPY 的行数
+    PARTITION_PRECREATE_DAYS: int = 3  # 订单和轨迹表按天分区，分区维护时从今天起预建的天数
+    ANALYSIS_RETENTION_DAYS: int | None = None  # 订单和轨迹数据的保留天数，超期分区直接删除；None 表示永久保留
+    ANALYSIS_EXPORT_BATCH_ROWS: int = 5000  # 流式导出时服务端游标每批读取并输出的行数
+    ANALYSIS_ROAD_NETWORK_FILE: str | None = None  # 地图匹配使用的 OSM XML 路网文件（.osm 或 .osm.gz）
+    ANALYSIS_MAP_MATCH_WORKERS: int = -1  # 批量地图匹配的进程数，-1 表示全部 CPU 核
+    ANALYSIS_MAP_MATCH_IMPORT_WORKERS: int = 1  # 导入后刷新道路速度汇总时的地图匹配进程数，默认在导入任务进程内串行匹配，不占满 Web 服务所在机器的 CPU
+    ANALYSIS_OD_ZONES_DIR: str = "/app/data/json"  # OD 矩阵使用的 GeoJSON 区域文件目录，上传的区域文件也保存在这里
+    ANALYSIS_OD_ZONES_COORDINATE_SYSTEM: Literal["WGS84", "GCJ02", "BD09"] = "GCJ02"  # 区域文件未声明 coordinate_system 时的坐标系（DataV 行政区划为 GCJ02）
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -0,0 +1,107 @@
+import base64
+import binascii
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+
+# 密文格式：nonce(16) + tag(16) + ciphertext
+NONCE_SIZE = 16
+TAG_SIZE = 16
+HEADER_SIZE = NONCE_SIZE + TAG_SIZE
+
+# 批量解密时少于该条数直接串行处理，线程池的调度开销不划算
+PARALLEL_DECRYPT_MIN_ITEMS = 8
+
+# 图片明文的格式标记：encrypt_image 在原始图片字节前加上该字节再加密。
+# 旧记录是先 base64 再加密的 ASCII 文本，不会以该字节开头
+IMAGE_PAYLOAD_RAW = b"\x01"
+
+Buffer = bytes | bytearray | memoryview
+
+
+def generate_aes_key() -> bytes:
+    return get_random_bytes(16)  # AES-128 使用 16 字节密钥
+
+
+def encrypt_data(data: Buffer, key: bytes, prefix: bytes = b"") -> bytearray:
+    """AES-EAX 加密，密文直接写入预分配的输出缓冲区，不产生中间副本
+
+    data 可以是 bytes、bytearray、memoryview 或任意 C 连续的缓冲区（如 cv2.imencode 的结果）。
+    prefix 与 data 拼接后作为明文加密，分两段写入输出缓冲区，不拼接 data。
+    """
+    view = memoryview(data).cast("B")
+    cipher = AES.new(key, AES.MODE_EAX)
+    output = bytearray(HEADER_SIZE + len(prefix) + view.nbytes)
+    output_view = memoryview(output)
+    body = HEADER_SIZE + len(prefix)
+    if prefix:
+        cipher.encrypt(prefix, output=output_view[HEADER_SIZE:body])
+    cipher.encrypt(view, output=output_view[body:])
+    output_view[:NONCE_SIZE] = cipher.nonce
+    output_view[NONCE_SIZE:HEADER_SIZE] = cipher.digest()
+    return output
+
+
+def encrypt_image(data: Buffer, key: bytes) -> bytearray:
+    """加密原始图片字节，明文带 IMAGE_PAYLOAD_RAW 标记，解密后用 image_payload_bytes / image_payload_base64 还原"""
+    return encrypt_data(data, key, prefix=IMAGE_PAYLOAD_RAW)
+
+
+def decrypt_data(encrypted_data: Buffer, key: bytes) -> bytearray | None:
+    """AES-EAX 解密并校验，支持直接传入数据库返回的 memoryview，失败时返回 None"""
+    view = memoryview(encrypted_data).cast("B")
+    if view.nbytes < HEADER_SIZE:
+        print("解密失败：密文长度不足。")
+        return None
+    cipher = AES.new(key, AES.MODE_EAX, nonce=view[:NONCE_SIZE])
+    output = bytearray(view.nbytes - HEADER_SIZE)
+    try:
+        cipher.decrypt_and_verify(view[HEADER_SIZE:], view[NONCE_SIZE:HEADER_SIZE], output=output)
+        return output
+    except ValueError:
+        print("解密失败：数据可能被篡改或密钥不正确。")
+        return None
+
+
+def decrypt_many(
+    encrypted_items: Iterable[Buffer], key: bytes, max_workers: int | None = None
+) -> list[bytearray | None]:
+    """批量解密，条数较多时在线程池中并行执行（底层 AES 运算会释放 GIL），结果顺序与输入一致
+
+    EAX 模式下每条记录都有各自的 nonce，因此每条记录仍需独立的 cipher 对象。
+    """
+    items: Sequence[Buffer] = list(encrypted_items)
+    if len(items) < PARALLEL_DECRYPT_MIN_ITEMS or max_workers == 1:
+        return [decrypt_data(item, key) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda item: decrypt_data(item, key), items))
+
+
+def _legacy_base64_image(payload: Buffer) -> bytes | None:
+    """未带格式标记的内容按旧记录（先 base64 再加密）严格解码，不是合法 base64 时返回 None"""
+    try:
+        return base64.b64decode(bytes(payload), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def image_payload_bytes(payload: Buffer) -> Buffer:
+    """
+    把解密后的图片内容还原为原始图片字节：带 IMAGE_PAYLOAD_RAW 标记的去掉标记，
+    未标记的按旧记录 base64 解码；都不是时（加标记之前直接加密的原始字节）原样返回
+    """
+    view = memoryview(payload).cast("B")
+    if view[:1] == IMAGE_PAYLOAD_RAW:
+        return view[1:]
+    legacy = _legacy_base64_image(view)
+    return payload if legacy is None else legacy
+
+
+def image_payload_base64(payload: Buffer) -> str:
+    """把解密后的图片内容转换为 base64 字符串用于接口返回，旧记录本身已是 base64 无需重复编码"""
+    view = memoryview(payload).cast("B")
+    if view[:1] != IMAGE_PAYLOAD_RAW and _legacy_base64_image(view) is not None:
+        return bytes(view).decode("ascii")
+    return base64.b64encode(image_payload_bytes(view)).decode("ascii")
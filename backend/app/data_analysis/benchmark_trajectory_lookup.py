@@ -0,0 +1,186 @@
+"""
+轨迹查询基准测试：在与 gpsrecord 结构相同的按天分区测试表中生成合成轨迹点，
+比较单车轨迹查询在不同索引方案下的耗时：
+    scan      按 utc 字符串过滤、无索引（改造前的查询方式）
+    btree     按分区键 time 过滤，(commaddr, time) 普通索引
+    covering  按分区键 time 过滤，(commaddr, time) INCLUDE 返回列的覆盖索引（当前方案）
+
+测试表 gpsrecord_bench 建在 settings 配置的数据库中，结束后删除（--keep 保留）。
+用法（在 backend 目录下）：
+    python -m app.data_analysis.benchmark_trajectory_lookup --rows 100000000 --repeat 50
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.core.db import engine
+from app.data_analysis.partitions import day_start, partition_name
+from app.data_analysis.timeutils import format_utc
+
+BENCH_TABLE = "gpsrecord_bench"
+BENCH_START = datetime(2013, 9, 1, tzinfo=timezone.utc)
+TRACK_SELECT = f"SELECT id, commaddr, utc, lat, lon, head, speed, tflag FROM {BENCH_TABLE} "
+# 各方案的查询语句与建索引语句
+VARIANTS = {
+    "scan": (
+        TRACK_SELECT + "WHERE commaddr = %(commaddr)s AND utc >= %(start_utc)s AND utc <= %(end_utc)s",
+        None,
+    ),
+    "btree": (
+        TRACK_SELECT + "WHERE commaddr = %(commaddr)s AND time >= %(start)s AND time <= %(end)s ORDER BY time",
+        f"CREATE INDEX {BENCH_TABLE}_track ON {BENCH_TABLE} (commaddr, time)",
+    ),
+    "covering": (
+        TRACK_SELECT + "WHERE commaddr = %(commaddr)s AND time >= %(start)s AND time <= %(end)s ORDER BY time",
+        f"CREATE INDEX {BENCH_TABLE}_track ON {BENCH_TABLE} (commaddr, time) "
+        "INCLUDE (id, utc, lat, lon, head, speed, tflag)",
+    ),
+}
+
+
+def create_bench_table(cursor, rows: int, vehicles: int, days: int) -> None:
+    """生成 rows 个轨迹点：vehicles 辆车在 days 天内等间隔上报，每天一个分区"""
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {BENCH_TABLE} (
+            id bigint NOT NULL,
+            commaddr varchar(64) NOT NULL,
+            utc varchar(32) NOT NULL,
+            lat double precision NOT NULL,
+            lon double precision NOT NULL,
+            head double precision NOT NULL,
+            speed double precision NOT NULL,
+            tflag integer NOT NULL,
+            time timestamptz NOT NULL
+        ) PARTITION BY RANGE (time)
+    """)
+    for i in range(days):
+        day = (BENCH_START + timedelta(days=i)).date()
+        cursor.execute(
+            f"CREATE TABLE {partition_name(BENCH_TABLE, day)} PARTITION OF {BENCH_TABLE} "
+            f"FOR VALUES FROM ('{day_start(day).isoformat()}') TO ('{day_start(day + timedelta(days=1)).isoformat()}')"
+        )
+    # 第 n 个点属于第 n % vehicles 辆车，同一辆车相邻两点间隔 step 秒
+    step = days * 86400 / max(rows // vehicles, 1)
+    cursor.execute(
+        f"""
+        INSERT INTO {BENCH_TABLE} (id, commaddr, utc, lat, lon, head, speed, tflag, time)
+        SELECT n, 'bench' || (n %% %(vehicles)s), to_char(t AT TIME ZONE 'UTC', 'YYYYMMDDHH24MISS'),
+               36.5 + random() * 0.4, 116.8 + random() * 0.5, random() * 360, random() * 20,
+               (random() < 0.5)::int, t
+        FROM (
+            SELECT n, %(start)s::timestamptz + make_interval(secs => floor((n / %(vehicles)s) * %(step)s)) AS t
+            FROM generate_series(0, %(rows)s - 1) AS n
+        ) points
+        """,
+        {"rows": rows, "vehicles": vehicles, "step": step, "start": BENCH_START},
+    )
+
+
+def scan_nodes(plan: dict) -> set[str]:
+    """EXPLAIN JSON 计划树中出现的扫描节点类型"""
+    nodes = {plan["Node Type"]} if "Scan" in plan["Node Type"] else set()
+    for child in plan.get("Plans", []):
+        nodes |= scan_nodes(child)
+    return nodes
+
+
+def benchmark_lookup(cursor, query: str, params_list: list[dict]) -> tuple[float, float, int, set[str]]:
+    """返回 (平均耗时ms, P95耗时ms, 平均返回点数, 扫描节点类型)"""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params_list[0])
+    nodes = scan_nodes(cursor.fetchone()[0][0]["Plan"])
+    # 预热一次，排除计划缓存和首次读盘的开销
+    cursor.execute(query, params_list[0])
+    cursor.fetchall()
+    timings = []
+    counts = []
+    for params in params_list:
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        counts.append(len(cursor.fetchall()))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.asarray(timings)
+    return float(timings.mean()), float(np.percentile(timings, 95)), int(np.mean(counts)), nodes
+
+
+def random_windows(count: int, vehicles: int, days: int, window_minutes: int) -> list[dict]:
+    """随机抽取车辆和查询时间窗口"""
+    rng = random.Random(0)
+    windows = []
+    for _ in range(count):
+        start = BENCH_START + timedelta(seconds=rng.randrange(days * 86400 - window_minutes * 60))
+        end = start + timedelta(minutes=window_minutes)
+        windows.append({
+            "commaddr": f"bench{rng.randrange(vehicles)}",
+            "start": start,
+            "end": end,
+            "start_utc": format_utc(start),
+            "end_utc": format_utc(end),
+        })
+    return windows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单车轨迹查询基准测试")
+    parser.add_argument("--rows", type=int, default=100_000_000, help="生成的轨迹点数")
+    parser.add_argument("--vehicles", type=int, default=10_000, help="车辆数")
+    parser.add_argument("--days", type=int, default=7, help="数据覆盖的天数（每天一个分区）")
+    parser.add_argument("--window-minutes", type=int, default=60, help="每次查询的时间窗口（分钟）")
+    parser.add_argument("--repeat", type=int, default=50, help="每个索引方案的查询次数")
+    parser.add_argument("--scan-repeat", type=int, default=3, help="无索引方案的查询次数（全表扫描较慢）")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS), help="要测试的方案")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试表")
+    args = parser.parse_args()
+
+    windows = random_windows(args.repeat, args.vehicles, args.days, args.window_minutes)
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            start = time.perf_counter()
+            create_bench_table(cursor, args.rows, args.vehicles, args.days)
+            connection.commit()
+            print(f"生成 {args.rows} 个轨迹点耗时 {time.perf_counter() - start:.1f}s")
+
+            print(f"{'variant':<12}{'index(s)':>10}{'size(MB)':>10}{'mean(ms)':>10}{'p95(ms)':>10}{'points':>8}  plan")
+            for variant in args.variants:
+                query, create_index = VARIANTS[variant]
+                cursor.execute(f"DROP INDEX IF EXISTS {BENCH_TABLE}_track")
+                build_seconds = 0.0
+                if create_index:
+                    start = time.perf_counter()
+                    cursor.execute(create_index)
+                    build_seconds = time.perf_counter() - start
+                # VACUUM 更新可见性映射，仅索引扫描才不必回表
+                connection.commit()
+                connection.driver_connection.autocommit = True
+                cursor.execute(f"VACUUM ANALYZE {BENCH_TABLE}")
+                connection.driver_connection.autocommit = False
+                cursor.execute(
+                    "SELECT COALESCE(sum(pg_relation_size(indexrelid)), 0) FROM pg_index "
+                    "JOIN pg_inherits ON pg_inherits.inhrelid = pg_index.indrelid "
+                    "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                    "WHERE parent.relname = %(table)s",
+                    {"table": BENCH_TABLE},
+                )
+                index_mb = cursor.fetchone()[0] / 1024 / 1024
+                params_list = windows[: args.scan_repeat] if variant == "scan" else windows
+                mean_ms, p95_ms, points, nodes = benchmark_lookup(cursor, query, params_list)
+                print(
+                    f"{variant:<12}{build_seconds:>10.1f}{index_mb:>10.1f}{mean_ms:>10.2f}{p95_ms:>10.2f}"
+                    f"{points:>8}  {', '.join(sorted(nodes))}"
+                )
+                connection.rollback()
+    finally:
+        if not args.keep:
+            connection.rollback()
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            connection.commit()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any, Literal
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.data_analysis.encoding import (
+    MEDIA_TYPES,
+    encode_columns,
+    negotiate_format,
+    records_to_columns,
+)
+from app.models import AnalysisDataVersion
+
+# 分析接口依赖的数据集，导入数据后递增对应的版本号，旧版本的缓存自然失效
+DataSet = Literal["taxiorder", "gpsrecord", "weather"]
+# 由外部脚本写入、不会递增版本号的数据集：缓存键和 ETag 按 ANALYSIS_CACHE_TTL_SECONDS 分时间窗轮换
+UNVERSIONED_DATASETS: set[str] = {"weather"}
+
+_REDIS_PREFIX = "analysis:"
+
+
+class LRUCache:
+    """
+    线程安全的进程内 LRU 缓存，条目写入 ttl_seconds 秒后过期。
+    过期时间兜底不经本服务写入的数据（如外部脚本导入的天气数据），这类数据不会递增版本号
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (过期时刻, 值)
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """基于 Redis 的缓存，多个 worker 共享同一份缓存"""
+
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("未安装 redis，无法使用 ANALYSIS_CACHE_REDIS_URL")
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(_REDIS_PREFIX + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(_REDIS_PREFIX + key, value, ex=self.ttl_seconds)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=_REDIS_PREFIX + "*"):
+            self.client.delete(key)
+
+
+_store: LRUCache | RedisCache | None = None
+_store_lock = threading.Lock()
+# 未使用 Redis 时在进程内复用数据库中的版本号：dataset -> (version, 读取时刻)
+_local_versions: dict[str, tuple[int, float]] = {}
+
+
+def get_cache_store() -> LRUCache | RedisCache:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.ANALYSIS_CACHE_REDIS_URL:
+                    _store = RedisCache(settings.ANALYSIS_CACHE_REDIS_URL, settings.ANALYSIS_CACHE_TTL_SECONDS)
+                else:
+                    _store = LRUCache(settings.ANALYSIS_CACHE_MAX_ENTRIES, settings.ANALYSIS_CACHE_TTL_SECONDS)
+    return _store
+
+
+def get_data_version(dataset: DataSet) -> int:
+    """
+    读取数据集的当前版本号。使用 Redis 时版本号保存在 Redis 中；
+    否则保存在 analysis_data_version 表，进程内最多复用 ANALYSIS_DATA_VERSION_TTL_SECONDS 秒。
+    """
+    store = get_cache_store()
+    if isinstance(store, RedisCache):
+        return int(store.client.get(f"{_REDIS_PREFIX}version:{dataset}") or 0)
+    cached = _local_versions.get(dataset)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < settings.ANALYSIS_DATA_VERSION_TTL_SECONDS:
+        return cached[0]
+    with Session(engine) as session:
+        version = session.exec(
+            select(AnalysisDataVersion.version).where(AnalysisDataVersion.dataset == dataset)
+        ).first()
+    version = int(version or 0)
+    _local_versions[dataset] = (version, now)
+    return version
+
+
+def bump_data_version(dataset: DataSet) -> int:
+    """数据集发生变化（导入、重新汇总）后调用，递增版本号并返回新版本"""
+    store = get_cache_store()
+    if isinstance(store, RedisCache):
+        return int(store.client.incr(f"{_REDIS_PREFIX}version:{dataset}"))
+    statement = insert(AnalysisDataVersion).values(dataset=dataset, version=1, updated_at=datetime.utcnow())
+    statement = statement.on_conflict_do_update(
+        index_elements=["dataset"],
+        set_={
+            "version": AnalysisDataVersion.version + 1,
+            "updated_at": statement.excluded.updated_at,
+        },
+    ).returning(AnalysisDataVersion.version)
+    with Session(engine) as session:
+        version = int(session.execute(statement).scalar_one())
+        session.commit()
+    _local_versions.pop(dataset, None)
+    return version
+
+
+def cache_key(path: str, params: dict[str, Any]) -> str:
+    """接口路径 + 排序后的参数，值为 None 的参数视为未传"""
+    query = urlencode(sorted((name, str(value)) for name, value in params.items() if value is not None))
+    return f"{path}?{query}"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip() for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def cached_json_response(
+    request: Request,
+    dataset: DataSet,
+    params: dict[str, Any],
+    compute: Callable[[], Any],
+    columnar: tuple[str, list[str]] | None = None,
+) -> Response:
+    """
+    按 接口路径 + 规范化参数 + 数据版本号 缓存 JSON 响应，并支持 ETag / If-None-Match。
+    compute 返回 Response（如错误响应）时原样返回且不缓存。
+    columnar 为 (列表字段名, 列名) 时，客户端可通过 Accept 协商 arrow / packed 格式，
+    该字段按列编码，其余字段作为元数据；不同格式分别缓存。
+    """
+    response_format = negotiate_format(request) if columnar else "json"
+    headers = {"Vary": "Accept"} if columnar else {}
+
+    def render() -> Response | bytes:
+        result = compute()
+        if isinstance(result, Response):
+            return result
+        if response_format == "json":
+            return JSONResponse(content=jsonable_encoder(result)).body
+        field, names = columnar
+        metadata = {name: value for name, value in result.items() if name != field}
+        return encode_columns(response_format, records_to_columns(result[field], names), metadata)
+
+    if not settings.ANALYSIS_CACHE_ENABLED:
+        body = render()
+        if isinstance(body, Response):
+            return body
+        return Response(content=body, media_type=MEDIA_TYPES[response_format], headers=headers)
+    version = get_data_version(dataset)
+    key = f"{cache_key(request.url.path, params)}#{dataset}={version}"
+    if dataset in UNVERSIONED_DATASETS:
+        key += f"#window={int(time.time()) // settings.ANALYSIS_CACHE_TTL_SECONDS}"
+    if response_format != "json":
+        key += f"#format={response_format}"
+    etag = 'W/"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+    headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    store = get_cache_store()
+    body = store.get(key)
+    if body is None:
+        body = render()
+        if isinstance(body, Response):
+            return body
+        store.set(key, body)
+    return Response(content=body, media_type=MEDIA_TYPES[response_format], headers=headers)
@@ -0,0 +1,45 @@
+from itertools import chain
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.db import engine
+
+
+def fetch_float_array(query: str, params: dict[str, Any] | None = None, width: int = 2) -> np.ndarray:
+    """
+    执行只返回数值列（且不含NULL）的查询，把结果逐行从数据库游标流式写入 (n, width) 的 float64 数组，
+    不构造 ORM 对象和中间字典。查询参数使用驱动的 %(name)s 占位符。
+    使用服务端游标每次取回 ANALYSIS_EXPORT_BATCH_ROWS 行，客户端除结果数组外只缓存一批行；
+    使用二进制传输格式，float8 直接按字节解码，省去逐个解析文本数值的开销（大结果集约快一倍）。
+    """
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor(name="float_array", binary=True) as cursor:
+            cursor.itersize = settings.ANALYSIS_EXPORT_BATCH_ROWS
+            cursor.execute(query, params)
+            # 服务端游标的总行数未知，数组随读取按需扩容
+            values = np.fromiter(chain.from_iterable(cursor), dtype=np.float64, count=-1)
+        connection.rollback()
+    finally:
+        connection.close()
+    return values.reshape(-1, width)
+
+
+def fetch_packed_float_array(query: str, params: dict[str, Any] | None = None, width: int = 2) -> np.ndarray:
+    """
+    与 fetch_float_array 相同，适用于几十万行以上的结果集：在数据库中用 float8send 把每行的数值列
+    打包为大端 float8 字节串，再用 string_agg 拼成单个 bytea 返回，客户端直接按字节解码为数组，
+    不再逐行构造 Python 元组（单个 bytea 最大 1GB，即 width=5 时约两千五百万行）。
+    """
+    columns = [f"c{i}" for i in range(width)]
+    packed = " || ".join(f"float8send({column}::float8)" for column in columns)
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor(binary=True) as cursor:
+            cursor.execute(f"SELECT string_agg({packed}, '') FROM ({query}) AS rows ({', '.join(columns)})", params)
+            data = cursor.fetchone()[0] or b""
+    finally:
+        connection.close()
+    return np.frombuffer(data, dtype=">f8").astype(np.float64).reshape(-1, width)
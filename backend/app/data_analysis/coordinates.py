@@ -0,0 +1,112 @@
+from typing import Literal
+
+import numpy as np
+
+# 支持的坐标系：WGS84 为 GPS 原始坐标，GCJ02 为国测局坐标（高德、腾讯），BD09 为百度坐标
+CoordinateSystem = Literal["WGS84", "GCJ02", "BD09"]
+
+# 克拉索夫斯基椭球长半轴与偏心率平方，GCJ02 偏移公式使用
+_KRASOVSKY_A = 6378245.0
+_KRASOVSKY_EE = 0.00669342162296594323
+# 反算的迭代收敛阈值（度），约 0.01 毫米
+_INVERSE_TOLERANCE = 1e-10
+_INVERSE_MAX_ITERATIONS = 10
+
+
+def _as_arrays(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    return np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+
+
+def _transform_lat(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x))
+    ret += (20.0 * np.sin(6.0 * x * np.pi) + 20.0 * np.sin(2.0 * x * np.pi)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(y * np.pi) + 40.0 * np.sin(y / 3.0 * np.pi)) * 2.0 / 3.0
+    ret += (160.0 * np.sin(y / 12.0 * np.pi) + 320 * np.sin(y * np.pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transform_lon(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x))
+    ret += (20.0 * np.sin(6.0 * x * np.pi) + 20.0 * np.sin(2.0 * x * np.pi)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(x * np.pi) + 40.0 * np.sin(x / 3.0 * np.pi)) * 2.0 / 3.0
+    ret += (150.0 * np.sin(x / 12.0 * np.pi) + 300.0 * np.sin(x / 30.0 * np.pi)) * 2.0 / 3.0
+    return ret
+
+
+def wgs84_to_gcj02(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    lat, lon = _as_arrays(lat, lon)
+    dlat = _transform_lat(lon - 105.0, lat - 35.0)
+    dlon = _transform_lon(lon - 105.0, lat - 35.0)
+    radlat = lat / 180.0 * np.pi
+    magic = 1 - _KRASOVSKY_EE * np.sin(radlat) ** 2
+    sqrtmagic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((_KRASOVSKY_A * (1 - _KRASOVSKY_EE)) / (magic * sqrtmagic) * np.pi)
+    dlon = (dlon * 180.0) / (_KRASOVSKY_A / sqrtmagic * np.cos(radlat) * np.pi)
+    return lat + dlat, lon + dlon
+
+
+def _refine_inverse(forward, lat: np.ndarray, lon: np.ndarray, guess_lat: np.ndarray, guess_lon: np.ndarray):
+    """用正向转换做不动点迭代修正反算结果，误差收敛到 _INVERSE_TOLERANCE 以内"""
+    for _ in range(_INVERSE_MAX_ITERATIONS):
+        forward_lat, forward_lon = forward(guess_lat, guess_lon)
+        err_lat, err_lon = forward_lat - lat, forward_lon - lon
+        guess_lat = guess_lat - err_lat
+        guess_lon = guess_lon - err_lon
+        if max(np.max(np.abs(err_lat), initial=0.0), np.max(np.abs(err_lon), initial=0.0)) < _INVERSE_TOLERANCE:
+            break
+    return guess_lat, guess_lon
+
+
+def gcj02_to_wgs84(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    """GCJ02 偏移没有解析逆，以 GCJ02 坐标为初值迭代求解"""
+    lat, lon = _as_arrays(lat, lon)
+    return _refine_inverse(wgs84_to_gcj02, lat, lon, lat, lon)
+
+
+def gcj02_to_bd09(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    lat, lon = _as_arrays(lat, lon)
+    z = np.sqrt(lon * lon + lat * lat) + 0.00002 * np.sin(lat * np.pi)
+    theta = np.arctan2(lat, lon) + 0.000003 * np.cos(lon * np.pi)
+    return z * np.sin(theta) + 0.006, z * np.cos(theta) + 0.0065
+
+
+def bd09_to_gcj02(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    lat, lon = _as_arrays(lat, lon)
+    x, y = lon - 0.0065, lat - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * np.pi)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * np.pi)
+    # 近似公式误差约 1e-7 度，再迭代修正到与 gcj02_to_bd09 严格互逆
+    return _refine_inverse(gcj02_to_bd09, lat, lon, z * np.sin(theta), z * np.cos(theta))
+
+
+def wgs84_to_bd09(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    return gcj02_to_bd09(*wgs84_to_gcj02(lat, lon))
+
+
+def bd09_to_wgs84(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    return gcj02_to_wgs84(*bd09_to_gcj02(lat, lon))
+
+
+_TRANSFORMS = {
+    ("WGS84", "GCJ02"): wgs84_to_gcj02,
+    ("WGS84", "BD09"): wgs84_to_bd09,
+    ("GCJ02", "BD09"): gcj02_to_bd09,
+    ("GCJ02", "WGS84"): gcj02_to_wgs84,
+    ("BD09", "GCJ02"): bd09_to_gcj02,
+    ("BD09", "WGS84"): bd09_to_wgs84,
+}
+
+
+def transform_coordinates(
+    lat, lon, from_system: CoordinateSystem = "WGS84", to_system: CoordinateSystem = "BD09"
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    对整条轨迹的纬度、经度数组一次性做坐标系转换，返回 (纬度数组, 经度数组)。
+    标量输入返回 0 维数组。
+    """
+    if from_system == to_system:
+        return _as_arrays(lat, lon)
+    transform = _TRANSFORMS.get((from_system, to_system))
+    if transform is None:
+        raise ValueError(f"不支持的坐标系转换: {from_system} -> {to_system}")
+    return transform(lat, lon)
@@ -0,0 +1,129 @@
+import importlib.util
+import json
+import struct
+from typing import Any, Literal
+
+import numpy as np
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# 按 Accept 协商的响应格式：json 为默认格式；arrow 为 Arrow IPC 流（需安装 pyarrow）；
+# packed 为按列连续存放的小端数值数组，浏览器可直接用 Float64Array 等视图读取
+ResponseFormat = Literal["json", "arrow", "packed"]
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PACKED_MEDIA_TYPE = "application/x-packed-columns"
+MEDIA_TYPES: dict[ResponseFormat, str] = {
+    "json": "application/json",
+    "arrow": ARROW_MEDIA_TYPE,
+    "packed": PACKED_MEDIA_TYPE,
+}
+# packed 格式中每列的起始偏移按 8 字节对齐，便于前端零拷贝构造 TypedArray
+_PACKED_ALIGNMENT = 8
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def negotiate_format(request: Request) -> ResponseFormat:
+    """
+    按 Accept 头（含 q 值）选择响应格式，未声明二进制格式或 pyarrow 未安装时退回 json
+    """
+    header = request.headers.get("accept", "")
+    candidates = []
+    for position, part in enumerate(header.split(",")):
+        media_type, *params = (value.strip() for value in part.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(candidates):
+        if media_type == ARROW_MEDIA_TYPE and arrow_available():
+            return "arrow"
+        if media_type == PACKED_MEDIA_TYPE:
+            return "packed"
+        if media_type in ("application/json", "application/*", "*/*"):
+            return "json"
+    return "json"
+
+
+def records_to_columns(records: list[dict[str, Any]], names: list[str]) -> dict[str, np.ndarray]:
+    """把字典列表转换为按列存放的数组，整数列为 int64、浮点列为 float64，空列表时为 float64"""
+    dtype = None if records else np.float64
+    return {name: np.asarray([record[name] for record in records], dtype=dtype) for name in names}
+
+
+def encode_arrow(columns: dict[str, np.ndarray], metadata: dict[str, Any]) -> bytes:
+    """编码为 Arrow IPC 流，metadata 以 JSON 存放在 schema 元数据的 "metadata" 键中"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("未安装 pyarrow，无法返回 Arrow 格式")
+    table = pa.table({name: pa.array(values) for name, values in columns.items()})
+    table = table.replace_schema_metadata({"metadata": json.dumps(jsonable_encoder(metadata), ensure_ascii=False)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_packed(columns: dict[str, np.ndarray], metadata: dict[str, Any]) -> bytes:
+    """
+    编码为 packed 格式：
+        [头部长度 uint32 小端][头部 JSON（UTF-8）][按 8 字节对齐的各列数据]
+    头部为 {"columns": [{"name", "dtype", "offset", "length"}], "metadata": {...}}，
+    dtype 为 numpy 风格的小端类型（<f8、<i8），offset 为相对整个响应体起点的字节偏移。
+    """
+    arrays = []
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if values.dtype.kind not in "biuf":
+            raise ValueError(f"packed 格式只支持数值列: {name}")
+        arrays.append((name, values.astype(values.dtype.newbyteorder("<"), copy=False)))
+
+    def build_header(data_start: int) -> bytes:
+        descriptors, offset = [], data_start
+        for name, values in arrays:
+            descriptors.append({"name": name, "dtype": values.dtype.str, "offset": offset, "length": len(values)})
+            offset += -(-values.nbytes // _PACKED_ALIGNMENT) * _PACKED_ALIGNMENT
+        header = {"columns": descriptors, "metadata": jsonable_encoder(metadata)}
+        return json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    # 偏移写在头部里，头部长度又决定数据起点，先估算一次再按实际长度重建，直到二者一致
+    data_start = 0
+    while True:
+        header = build_header(data_start)
+        aligned = -(-(4 + len(header)) // _PACKED_ALIGNMENT) * _PACKED_ALIGNMENT
+        if aligned == data_start:
+            break
+        data_start = aligned
+    parts = [struct.pack("<I", len(header)), header, b"\0" * (data_start - 4 - len(header))]
+    for _, values in arrays:
+        data = values.tobytes()
+        parts.append(data)
+        parts.append(b"\0" * (-len(data) % _PACKED_ALIGNMENT))
+    return b"".join(parts)
+
+
+def encode_columns(response_format: ResponseFormat, columns: dict[str, np.ndarray], metadata: dict[str, Any]) -> bytes:
+    if response_format == "arrow":
+        return encode_arrow(columns, metadata)
+    return encode_packed(columns, metadata)
+
+
+def columnar_response(
+    response_format: ResponseFormat, columns: dict[str, np.ndarray], metadata: dict[str, Any]
+) -> Response:
+    """返回 arrow 或 packed 格式的二进制响应"""
+    return Response(
+        content=encode_columns(response_format, columns, metadata),
+        media_type=MEDIA_TYPES[response_format],
+        headers={"Vary": "Accept"},
+    )
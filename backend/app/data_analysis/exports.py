@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import logging
+from collections.abc import Iterator
+from typing import Any, Literal
+
+from app.core.config import settings
+from app.core.db import engine
+from app.data_analysis.timeutils import parse_utc
+
+logger = logging.getLogger(__name__)
+
+# 导出格式：每行一个 JSON 对象（NDJSON）或带表头的 CSV
+ExportFormat = Literal["ndjson", "csv"]
+EXPORT_MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+GPS_RECORD_EXPORT_COLUMNS = ["id", "commaddr", "utc", "lat", "lon", "head", "speed", "tflag"]
+TAXI_ORDER_EXPORT_COLUMNS = ["id", "commaddr", "onutc", "onlat", "onlon", "offutc", "offlat", "offlon", "distance"]
+
+
+def encode_rows(rows: list[tuple], names: list[str], export_format: ExportFormat) -> str:
+    """把一批结果行编码为 NDJSON 或 CSV 文本（CSV 不含表头）"""
+    if export_format == "ndjson":
+        return "".join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def stream_query(
+    query: str, params: dict[str, Any], names: list[str], export_format: ExportFormat, batch_rows: int | None = None
+) -> Iterator[str]:
+    """
+    用服务端游标分批读取查询结果并逐批编码输出，内存占用只与批大小有关，与结果总行数无关。
+    客户端断开时生成器被关闭，连接随之归还连接池。
+    """
+    batch_rows = batch_rows or settings.ANALYSIS_EXPORT_BATCH_ROWS
+    connection = engine.raw_connection()
+    try:
+        # 具名游标即 PostgreSQL 服务端游标，结果留在数据库端按批取回
+        with connection.cursor(name="analysis_export") as cursor:
+            cursor.itersize = batch_rows
+            cursor.execute(query, params)
+            if export_format == "csv":
+                yield ",".join(names) + "\n"
+            exported = 0
+            while rows := cursor.fetchmany(batch_rows):
+                exported += len(rows)
+                yield encode_rows(rows, names, export_format)
+        connection.rollback()
+        logger.info("导出完成，共 %d 行", exported)
+    finally:
+        connection.close()
+
+
+def _filters(
+    time_column: str,
+    lat_column: str,
+    lon_column: str,
+    start_utc: str,
+    end_utc: str,
+    commaddrs: list[str] | None,
+    bbox: tuple[float, float, float, float] | None,
+) -> tuple[str, dict[str, Any]]:
+    conditions = [f"{time_column} >= %(start)s", f"{time_column} <= %(end)s"]
+    params: dict[str, Any] = {"start": parse_utc(start_utc), "end": parse_utc(end_utc)}
+    if commaddrs:
+        conditions.append("commaddr = ANY(%(commaddrs)s::varchar[])")
+        params["commaddrs"] = sorted(set(commaddrs))
+    if bbox is not None:
+        conditions.append(f"{lat_column} BETWEEN %(min_lat)s AND %(max_lat)s")
+        conditions.append(f"{lon_column} BETWEEN %(min_lon)s AND %(max_lon)s")
+        params.update(zip(("min_lat", "min_lon", "max_lat", "max_lon"), bbox))
+    return " AND ".join(conditions), params
+
+
+def gps_record_export_query(
+    start_utc: str,
+    end_utc: str,
+    commaddrs: list[str] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """
+    GPS 轨迹点导出查询，按 (车牌号, 时间) 排序，即逐车的完整轨迹。
+    各天分区按 (commaddr, time) 覆盖索引顺序扫描后归并，不需要在数据库端整体排序。
+    """
+    where, params = _filters("time", "lat", "lon", start_utc, end_utc, commaddrs, bbox)
+    query = (
+        f"SELECT {', '.join(GPS_RECORD_EXPORT_COLUMNS)} FROM gpsrecord "
+        f"WHERE {where} ORDER BY commaddr, time"
+    )
+    return query, params
+
+
+def taxi_order_export_query(
+    start_utc: str,
+    end_utc: str,
+    commaddrs: list[str] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """出租车订单导出查询，按上车时间排序，bbox 作用于上车点"""
+    where, params = _filters("ontime", "onlat", "onlon", start_utc, end_utc, commaddrs, bbox)
+    query = (
+        f"SELECT {', '.join(TAXI_ORDER_EXPORT_COLUMNS)} FROM taxiorder "
+        f"WHERE {where} ORDER BY ontime"
+    )
+    return query, params
@@ -0,0 +1,56 @@
+import numpy as np
+
+# 地球平均半径（米）
+EARTH_RADIUS_M = 6371008.8
+# 每度纬度对应的距离（米）
+METRES_PER_DEGREE_LAT = 111320.0
+# 默认参考纬度（济南），用于把米换算为经度跨度
+DEFAULT_REFERENCE_LAT = 36.67
+# 网格单元边长（度），约 1.1km × 0.9km（济南纬度）
+GRID_CELL_DEGREES = 0.01
+# 网格编号：(floor(lat*100)+9000)*100000 + (floor(lon*100)+18000)，与 taxiorder.oncell 生成列一致
+GRID_CELL_SQL = "((floor({lat} * 100) + 9000)::bigint * 100000 + (floor({lon} * 100) + 18000)::bigint)"
+# 两点球面距离（米）的 SQL 表达式，与 haversine_m 的公式和默认地球半径一致
+HAVERSINE_SQL = (
+    "(2 * {radius} * asin(least(1.0, sqrt("
+    "power(sin(radians({lat2} - {lat1}) / 2), 2) "
+    "+ cos(radians({lat1})) * cos(radians({lat2})) * power(sin(radians({lon2} - {lon1}) / 2), 2)))))"
+)
+
+
+def grid_cell_id(lat, lon):
+    """计算经纬度所在的网格编号，支持标量或数组"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return (np.floor(lat * 100).astype(np.int64) + 9000) * 100000 + (np.floor(lon * 100).astype(np.int64) + 18000)
+
+
+def grid_cell_center(cell) -> tuple[np.ndarray, np.ndarray]:
+    """网格编号对应的网格中心 (纬度, 经度)，grid_cell_id 的逆运算"""
+    cell = np.asarray(cell, dtype=np.int64)
+    lat_index, lon_index = cell // 100000 - 9000, cell % 100000 - 18000
+    return (lat_index + 0.5) * GRID_CELL_DEGREES, (lon_index + 0.5) * GRID_CELL_DEGREES
+
+
+def grid_cell_sql(lat_column: str, lon_column: str) -> str:
+    """生成计算网格编号的 SQL 表达式"""
+    return GRID_CELL_SQL.format(lat=lat_column, lon=lon_column)
+
+
+def haversine_m(lat1, lon1, lat2, lon2, radius_m: float = EARTH_RADIUS_M) -> np.ndarray:
+    """逐元素计算两组经纬度之间的球面距离（米）"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * radius_m * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_sql(lat1: str, lon1: str, lat2: str, lon2: str) -> str:
+    """生成计算两点球面距离（米）的 SQL 表达式"""
+    return HAVERSINE_SQL.format(radius=EARTH_RADIUS_M, lat1=lat1, lon1=lon1, lat2=lat2, lon2=lon2)
+
+
+def cell_size_degrees(cell_size_m: float, reference_lat: float = DEFAULT_REFERENCE_LAT) -> tuple[float, float]:
+    """把以米为单位的网格边长换算为 (纬度跨度, 经度跨度)"""
+    dlat = cell_size_m / METRES_PER_DEGREE_LAT
+    dlon = cell_size_m / (METRES_PER_DEGREE_LAT * np.cos(np.radians(reference_lat)))
+    return dlat, float(dlon)
@@ -0,0 +1,271 @@
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import Any, Literal
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.preprocessing import StandardScaler
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.data_analysis.columnar import fetch_float_array
+from app.data_analysis.geo import EARTH_RADIUS_M, cell_size_degrees
+from app.data_analysis.timeutils import UTC_FORMAT, bucket_floor, parse_utc
+from app.models import HotspotTile
+
+# 热点预计算的时间桶长度（分钟），与 /analysis/dbscan-clustering 的查询窗口一致
+BUCKET_MINUTES = 15
+# 聚类距离度量：scaled 为标准化经纬度上的欧氏距离（eps 无量纲），haversine 为球面距离（eps 单位为米）
+ClusteringMetric = Literal["scaled", "haversine"]
+# 大屏常用的 (metric, eps, min_samples) 组合，每个时间桶都会预计算
+HOTSPOT_PRESETS: list[tuple[str, float, int]] = [
+    ("scaled", 0.01, 3),
+    ("scaled", 0.02, 5),
+    ("scaled", 0.05, 10),
+    ("haversine", 200.0, 5),
+    ("haversine", 500.0, 10),
+]
+
+
+def aligned_bucket(start_utc: str) -> str | None:
+    """start_utc 恰好落在时间桶起点时返回桶编号，否则返回 None"""
+    start_time = datetime.strptime(start_utc, UTC_FORMAT)
+    if bucket_floor(start_time, BUCKET_MINUTES) != start_time:
+        return None
+    return start_utc
+
+
+def touched_buckets(utc_values: Iterable[str]) -> set[str]:
+    """
+    计算一批上车时间影响到的时间桶。
+    查询窗口两端都是闭区间，恰好落在桶边界上的订单同时属于前一个桶。
+    """
+    buckets = set()
+    for utc in utc_values:
+        dt = datetime.strptime(utc, UTC_FORMAT)
+        start = bucket_floor(dt, BUCKET_MINUTES)
+        buckets.add(start.strftime(UTC_FORMAT))
+        if start == dt:
+            buckets.add((start - timedelta(minutes=BUCKET_MINUTES)).strftime(UTC_FORMAT))
+    return buckets
+
+
+def day_buckets(date: str) -> list[str]:
+    """返回某天（YYYYMMDD）的全部时间桶"""
+    day = datetime.strptime(date, "%Y%m%d")
+    count = 24 * 60 // BUCKET_MINUTES
+    return [(day + timedelta(minutes=BUCKET_MINUTES * i)).strftime(UTC_FORMAT) for i in range(count)]
+
+
+def get_pickup_coordinates(start_utc: str, minutes: int = BUCKET_MINUTES) -> np.ndarray:
+    """
+    查询时间窗口内所有上车点，返回 (n, 2) 的 [lat, lng] float64 数组。
+    走 taxiorder.ontime 索引，经游标直接流式写入数组，不构造 ORM 对象。
+    """
+    start_time = parse_utc(start_utc)
+    end_time = start_time + timedelta(minutes=minutes)
+    return fetch_float_array(
+        "SELECT onlat, onlon FROM taxiorder "
+        "WHERE ontime >= %(start)s AND ontime <= %(end)s "
+        "AND onlat IS NOT NULL AND onlon IS NOT NULL",
+        {"start": start_time, "end": end_time},
+    )
+
+
+def cluster_labels_for(
+    coordinates: np.ndarray, eps: float, min_samples: int, metric: ClusteringMetric = "scaled", n_jobs: int | None = None
+) -> np.ndarray:
+    """
+    返回每个点的 DBSCAN 簇标签（-1 为噪声）。
+    haversine 模式在弧度坐标上使用球面距离和 ball-tree 索引，eps 以米为单位，结果不随窗口内数据分布变化。
+    """
+    if metric == "haversine":
+        dbscan = DBSCAN(
+            eps=eps / EARTH_RADIUS_M,
+            min_samples=min_samples,
+            metric="haversine",
+            algorithm="ball_tree",
+            n_jobs=n_jobs if n_jobs is not None else settings.ANALYSIS_DBSCAN_N_JOBS,
+        )
+        return dbscan.fit_predict(np.radians(coordinates))
+    coordinates_scaled = StandardScaler().fit_transform(coordinates)
+    return DBSCAN(eps=eps, min_samples=min_samples, n_jobs=n_jobs).fit_predict(coordinates_scaled)
+
+
+def compute_hotspots(
+    coordinates: np.ndarray,
+    eps: float,
+    min_samples: int,
+    metric: ClusteringMetric = "scaled",
+    n_jobs: int | None = None,
+) -> dict[str, Any]:
+    """对上车点做 DBSCAN 聚类，返回热点列表（按点数降序）及统计信息"""
+    result: dict[str, Any] = {
+        "total_points": len(coordinates),
+        "hot_spots_found": 0,
+        "noise_points": 0,
+        "hot_spots": [],
+    }
+    if len(coordinates) < min_samples:
+        return result
+    cluster_labels = cluster_labels_for(coordinates, eps, min_samples, metric, n_jobs)
+    hot_spots = []
+    for label in set(cluster_labels):
+        if label == -1:
+            continue
+        cluster_points = coordinates[cluster_labels == label]
+        count = len(cluster_points)
+        if count >= min_samples:
+            hot_spots.append({
+                "lng": float(np.mean(cluster_points[:, 1])),
+                "lat": float(np.mean(cluster_points[:, 0])),
+                "count": count
+            })
+    hot_spots.sort(key=lambda x: x["count"], reverse=True)
+    result["hot_spots_found"] = len(hot_spots)
+    result["noise_points"] = int(np.sum(cluster_labels == -1))
+    result["hot_spots"] = hot_spots
+    return result
+
+
+def save_hotspot_tile(
+    session: Session, bucket_start: str, metric: str, eps: float, min_samples: int, result: dict[str, Any]
+) -> None:
+    values = {
+        "bucket_start": bucket_start,
+        "metric": metric,
+        "eps": eps,
+        "min_samples": min_samples,
+        "total_points": result["total_points"],
+        "noise_points": result["noise_points"],
+        "hot_spots": result["hot_spots"],
+        "computed_at": datetime.utcnow(),
+    }
+    statement = insert(HotspotTile).values(**values)
+    statement = statement.on_conflict_do_update(
+        index_elements=["bucket_start", "metric", "eps", "min_samples"],
+        set_={key: statement.excluded[key] for key in ("total_points", "noise_points", "hot_spots", "computed_at")},
+    )
+    session.execute(statement)
+
+
+def get_hotspot_tile(bucket_start: str, metric: str, eps: float, min_samples: int) -> dict[str, Any] | None:
+    """读取预计算结果，返回与 compute_hotspots 相同结构的字典"""
+    with Session(engine) as session:
+        tile = session.exec(
+            select(HotspotTile).where(
+                HotspotTile.bucket_start == bucket_start,
+                HotspotTile.metric == metric,
+                HotspotTile.eps == eps,
+                HotspotTile.min_samples == min_samples,
+            )
+        ).first()
+        if tile is None:
+            return None
+        return {
+            "total_points": tile.total_points,
+            "hot_spots_found": len(tile.hot_spots),
+            "noise_points": tile.noise_points,
+            "hot_spots": tile.hot_spots,
+        }
+
+
+def refresh_hotspot_tiles(bucket_starts: Iterable[str]) -> int:
+    """
+    重新计算指定时间桶的预设参数组合（HOTSPOT_PRESETS）的热点结果，每个时间桶只查询一次上车点。
+    其他参数组合不落表，只通过接口的响应缓存复用，表中遗留的非预设结果顺带删除。返回写入的结果条数。
+    """
+    written = 0
+    presets = tuple_(HotspotTile.metric, HotspotTile.eps, HotspotTile.min_samples).in_(HOTSPOT_PRESETS)
+    with Session(engine) as session:
+        for bucket_start in sorted(set(bucket_starts)):
+            session.execute(delete(HotspotTile).where(HotspotTile.bucket_start == bucket_start, ~presets))
+            coordinates = get_pickup_coordinates(bucket_start)
+            for metric, eps, min_samples in HOTSPOT_PRESETS:
+                result = compute_hotspots(coordinates, eps, min_samples, metric)
+                save_hotspot_tile(session, bucket_start, metric, eps, min_samples, result)
+                written += 1
+            session.commit()
+    return written
+
+
+def get_pickup_grid_counts(start_utc: str, end_utc: str, cell_size_m: float) -> np.ndarray:
+    """
+    在数据库中把时间范围内的上车点按网格分箱聚合，
+    返回 (n, 5) 数组：[网格行号, 网格列号, 点数, 纬度之和, 经度之和]
+    """
+    dlat, dlon = cell_size_degrees(cell_size_m)
+    return fetch_float_array(
+        "SELECT floor(onlat / %(dlat)s) AS cell_row, floor(onlon / %(dlon)s) AS cell_col, "
+        "count(*), sum(onlat), sum(onlon) "
+        "FROM taxiorder "
+        "WHERE ontime >= %(start)s AND ontime <= %(end)s "
+        "AND onlat IS NOT NULL AND onlon IS NOT NULL "
+        "GROUP BY cell_row, cell_col",
+        {"dlat": dlat, "dlon": dlon, "start": parse_utc(start_utc), "end": parse_utc(end_utc)},
+        width=5,
+    )
+
+
+def merge_adjacent_cells(cells: np.ndarray) -> list[np.ndarray]:
+    """把八邻域相连的网格合并为一组，返回每组网格在 cells 中的下标"""
+    index = {(int(row), int(col)): i for i, (row, col) in enumerate(cells[:, :2])}
+    visited = np.zeros(len(cells), dtype=bool)
+    groups = []
+    for start in range(len(cells)):
+        if visited[start]:
+            continue
+        visited[start] = True
+        stack = [start]
+        members = []
+        while stack:
+            i = stack.pop()
+            members.append(i)
+            row, col = int(cells[i, 0]), int(cells[i, 1])
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    j = index.get((row + d_row, col + d_col))
+                    if j is not None and not visited[j]:
+                        visited[j] = True
+                        stack.append(j)
+        groups.append(np.asarray(members))
+    return groups
+
+
+def compute_grid_hotspots(
+    cells: np.ndarray, top_n: int = 20, min_count: int = 1, merge_adjacent: bool = False
+) -> dict[str, Any]:
+    """
+    根据网格聚合结果取点数最多的 top_n 个热点（质心为网格内上车点的平均位置）。
+    merge_adjacent 为真时先把点数不少于 min_count 的相邻网格合并为一个热点。
+    """
+    total_points = int(cells[:, 2].sum()) if len(cells) else 0
+    hot = cells[cells[:, 2] >= min_count] if len(cells) else cells
+    if merge_adjacent and len(hot):
+        groups = merge_adjacent_cells(hot)
+        counts = np.array([hot[g, 2].sum() for g in groups])
+        lat_sums = np.array([hot[g, 3].sum() for g in groups])
+        lon_sums = np.array([hot[g, 4].sum() for g in groups])
+        cell_counts = np.array([len(g) for g in groups])
+    else:
+        counts, lat_sums, lon_sums = hot[:, 2], hot[:, 3], hot[:, 4]
+        cell_counts = np.ones(len(hot), dtype=int)
+    order = np.argsort(-counts, kind="stable")[:top_n]
+    hot_spots = [
+        {
+            "lng": float(lon_sums[i] / counts[i]),
+            "lat": float(lat_sums[i] / counts[i]),
+            "count": int(counts[i]),
+            "cells": int(cell_counts[i]),
+        }
+        for i in order
+    ]
+    return {
+        "total_points": total_points,
+        "total_cells": len(cells),
+        "hot_spots_found": len(hot_spots),
+        "hot_spots": hot_spots,
+    }
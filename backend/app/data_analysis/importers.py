@@ -0,0 +1,351 @@
+import io
+import logging
+import os
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.data_analysis.cache import bump_data_version
+from app.data_analysis.geo import haversine_m
+from app.data_analysis.hotspots import BUCKET_MINUTES, refresh_hotspot_tiles
+from app.data_analysis.partitions import ensure_partitions
+from app.data_analysis.rollups import refresh_taxi_rollups_for_buckets
+from app.data_analysis.speed_rollups import refresh_speed_rollups_for_buckets
+from app.data_analysis.timeutils import UTC_FORMAT
+from app.data_analysis.trip_metrics import fill_track_distances_for_buckets
+from app.models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# 订单文件列名 -> taxiorder 列名
+TAXI_ORDER_CSV_COLUMNS = {
+    "COMMADDR": "commaddr",
+    "ONUTC": "onutc",
+    "ONLAT": "onlat",
+    "ONLON": "onlon",
+    "OFFUTC": "offutc",
+    "OFFLAT": "offlat",
+    "OFFLON": "offlon",
+}
+# 清洗后订单数据的列，ontime/offtime 在导入时解析好，不再依赖触发器；
+# distance 为上下车点的球面距离，duration/avg_speed 是数据库生成列，写入时由数据库计算
+TAXI_ORDER_COLUMNS = [
+    "commaddr", "onutc", "onlat", "onlon", "offutc", "offlat", "offlon", "ontime", "offtime", "distance",
+]
+# COPY 到临时表的列：时间以 Unix 秒传输，避免逐行格式化时间字符串，合并时再转换为 timestamptz
+TAXI_ORDER_COPY_COLUMNS = [
+    "commaddr", "onutc", "onlat", "onlon", "offutc", "offlat", "offlon", "distance", "onepoch", "offepoch",
+]
+
+_CREATE_TAXI_ORDER_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS taxiorder_staging (
+        commaddr varchar(64),
+        onutc varchar(32),
+        onlat double precision,
+        onlon double precision,
+        offutc varchar(32),
+        offlat double precision,
+        offlon double precision,
+        distance double precision,
+        onepoch bigint,
+        offepoch bigint
+    ) ON COMMIT DELETE ROWS
+"""
+
+_MERGE_TAXI_ORDER_STAGING_SQL = f"""
+    INSERT INTO taxiorder ({", ".join(TAXI_ORDER_COLUMNS)})
+    SELECT commaddr, onutc, onlat, onlon, offutc, offlat, offlon, to_timestamp(onepoch), to_timestamp(offepoch), distance
+    FROM taxiorder_staging
+    ON CONFLICT (commaddr, ontime) DO NOTHING
+"""
+
+# GPS 文件列名 -> gpsrecord 列名
+GPS_RECORD_COLUMNS_MAP = {
+    "COMMADDR": "commaddr",
+    "UTC": "utc",
+    "LAT": "lat",
+    "LON": "lon",
+    "HEAD": "head",
+    "SPEED": "speed",
+    "TFLAG": "tflag",
+}
+GPS_RECORD_COLUMNS = ["commaddr", "utc", "lat", "lon", "head", "speed", "tflag", "time"]
+GPS_RECORD_COPY_COLUMNS = ["commaddr", "utc", "lat", "lon", "head", "speed", "tflag", "epoch"]
+
+_CREATE_GPS_RECORD_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS gpsrecord_staging (
+        commaddr varchar(64),
+        utc varchar(32),
+        lat double precision,
+        lon double precision,
+        head double precision,
+        speed double precision,
+        tflag integer,
+        epoch bigint
+    ) ON COMMIT DELETE ROWS
+"""
+
+# 网格编号 cell 是 gpsrecord 的生成列，写入时由数据库计算
+_MERGE_GPS_RECORD_STAGING_SQL = f"""
+    INSERT INTO gpsrecord ({", ".join(GPS_RECORD_COLUMNS)})
+    SELECT commaddr, utc, lat, lon, head, speed, tflag, to_timestamp(epoch)
+    FROM gpsrecord_staging
+    ON CONFLICT (commaddr, time) DO NOTHING
+"""
+
+
+def resolve_import_path(file_name: str | None = None, default_file: str | None = None) -> str:
+    """把文件名解析为 IMPORT_DATA_DIR 下的绝对路径（默认为订单文件），拒绝目录之外的路径"""
+    base_dir = os.path.realpath(settings.IMPORT_DATA_DIR)
+    path = os.path.realpath(os.path.join(base_dir, file_name or default_file or settings.TAXI_ORDER_CSV_FILE))
+    if os.path.commonpath([base_dir, path]) != base_dir:
+        raise ValueError(f"只能导入 {settings.IMPORT_DATA_DIR} 目录下的文件")
+    return path
+
+
+def read_taxi_order_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """按块流式读取订单 CSV，只解析需要的列且全部按字符串读入，类型转换留给 clean_taxi_orders"""
+    yield from pd.read_csv(
+        path,
+        usecols=list(TAXI_ORDER_CSV_COLUMNS),
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_rows,
+        encoding="utf-8",
+    )
+
+
+def clean_taxi_orders(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    向量化校验和转换一块订单数据：去除空值、坐标无法解析或越界、时间无法解析的行，
+    并解析出 UTC 的 ontime/offtime、整块一次性计算上下车点的球面距离。返回列顺序与 TAXI_ORDER_COLUMNS 一致。
+    """
+    df = raw.rename(columns=TAXI_ORDER_CSV_COLUMNS)
+    for column in ("commaddr", "onutc", "offutc"):
+        df[column] = df[column].str.strip().replace("", None)
+    for column in ("onlat", "offlat", "onlon", "offlon"):
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    df["ontime"] = pd.to_datetime(df["onutc"], format=UTC_FORMAT, utc=True, errors="coerce")
+    df["offtime"] = pd.to_datetime(df["offutc"], format=UTC_FORMAT, utc=True, errors="coerce")
+    # 坐标无法解析时距离为 NaN，随该行一起被去掉
+    df["distance"] = haversine_m(df["onlat"], df["onlon"], df["offlat"], df["offlon"])
+    df = df.dropna(subset=TAXI_ORDER_COLUMNS)
+    valid = (
+        df["onlat"].between(-90, 90) & df["offlat"].between(-90, 90)
+        & df["onlon"].between(-180, 180) & df["offlon"].between(-180, 180)
+    )
+    return df.loc[valid, TAXI_ORDER_COLUMNS]
+
+
+def chunk_buckets(ontime: pd.Series) -> tuple[set[datetime], set[str]]:
+    """
+    返回一批上车时间涉及的汇总时间桶（datetime）和热点时间桶（YYYYMMDDHHMMSS）。
+    热点查询窗口两端闭合，恰好落在桶边界上的订单同时属于前一个桶，与 hotspots.touched_buckets 一致。
+    """
+    floors = ontime.dt.floor(f"{BUCKET_MINUTES}min")
+    rollup_buckets = set(pd.DatetimeIndex(floors.unique()).to_pydatetime())
+    boundary = floors[floors == ontime] - timedelta(minutes=BUCKET_MINUTES)
+    hotspot_times = pd.concat([floors, boundary]).drop_duplicates()
+    return rollup_buckets, set(hotspot_times.dt.strftime(UTC_FORMAT))
+
+
+def epoch_seconds(times: pd.Series) -> pd.Series:
+    return times.astype("int64") // 10**9
+
+
+def copy_dataframe(cursor, table: str, df: pd.DataFrame) -> None:
+    """把 DataFrame 以 CSV 文本的形式通过 COPY FROM STDIN 写入表"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False)
+    with cursor.copy(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN (FORMAT csv)") as copy:
+        copy.write(buffer.getvalue())
+
+
+def create_import_job(dataset: str, source_path: str) -> int:
+    with Session(engine) as session:
+        job = ImportJob(dataset=dataset, source_path=source_path)
+        session.add(job)
+        session.commit()
+        return job.id
+
+
+def update_import_job(job_id: int, **fields) -> None:
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        for name, value in fields.items():
+            setattr(job, name, value)
+        session.add(job)
+        session.commit()
+
+
+def load_taxi_orders(path: str, chunk_rows: int | None = None, job_id: int | None = None) -> dict:
+    """
+    流式导入订单文件：每块数据向量化清洗后 COPY 进临时表，再按 (commaddr, ontime) 去重合并进 taxiorder，
+    每块单独提交，中断后重新导入同一文件只会补齐缺失的订单。
+    返回读取/写入/跳过的行数以及受影响的时间桶。
+    """
+    chunk_rows = chunk_rows or settings.IMPORT_CHUNK_ROWS
+    stats = {"rows_read": 0, "rows_loaded": 0, "rows_skipped": 0}
+    rollup_buckets: set[datetime] = set()
+    hotspot_buckets: set[str] = set()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(_CREATE_TAXI_ORDER_STAGING_SQL)
+            for raw in read_taxi_order_chunks(path, chunk_rows):
+                orders = clean_taxi_orders(raw)
+                if len(orders):
+                    # 先建好缺少的按天分区并立即提交，缩短对父表的锁定时间
+                    ensure_partitions(cursor, "taxiorder", orders["ontime"].dt.date.unique())
+                    connection.commit()
+                    staging = orders.drop(columns=["ontime", "offtime"]).assign(
+                        onepoch=epoch_seconds(orders["ontime"]), offepoch=epoch_seconds(orders["offtime"])
+                    )
+                    copy_dataframe(cursor, "taxiorder_staging", staging)
+                    cursor.execute(_MERGE_TAXI_ORDER_STAGING_SQL)
+                    loaded = cursor.rowcount
+                    connection.commit()
+                    chunk_rollup, chunk_hotspot = chunk_buckets(orders["ontime"])
+                    rollup_buckets |= chunk_rollup
+                    hotspot_buckets |= chunk_hotspot
+                else:
+                    loaded = 0
+                stats["rows_read"] += len(raw)
+                stats["rows_loaded"] += loaded
+                stats["rows_skipped"] += len(raw) - loaded
+                logger.info(
+                    "导入 %s：已读取 %d 行，写入 %d 行，跳过 %d 行",
+                    path, stats["rows_read"], stats["rows_loaded"], stats["rows_skipped"],
+                )
+                if job_id is not None:
+                    update_import_job(job_id, **stats)
+    finally:
+        connection.close()
+    return {**stats, "rollup_buckets": rollup_buckets, "hotspot_buckets": hotspot_buckets}
+
+
+def run_taxi_order_import(job_id: int, path: str, chunk_rows: int | None = None) -> None:
+    """
+    后台导入任务：导入订单后对有 GPS 轨迹的订单改用轨迹长度作为行驶距离，
+    只刷新受影响的热点和统计汇总时间桶，并使分析接口缓存失效
+    """
+    update_import_job(job_id, status="running")
+    try:
+        result = load_taxi_orders(path, chunk_rows, job_id)
+        bump_data_version("taxiorder")
+        fill_track_distances_for_buckets(result["rollup_buckets"])
+        refresh_hotspot_tiles(result["hotspot_buckets"])
+        refresh_taxi_rollups_for_buckets(result["rollup_buckets"])
+        bump_data_version("taxiorder")
+        update_import_job(job_id, status="succeeded", finished_at=datetime.utcnow())
+    except Exception as e:
+        logger.exception("导入 %s 失败", path)
+        update_import_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+
+
+
+def read_gps_record_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """按块流式读取 GPS 文件，支持 CSV 和 Parquet（需安装 pyarrow），列名不区分大小写"""
+    if path.lower().endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("未安装 pyarrow，无法导入 Parquet 文件")
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in parquet_file.schema_arrow.names if name.upper() in GPS_RECORD_COLUMNS_MAP]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas().rename(columns=str.upper)
+        return
+    chunks = pd.read_csv(
+        path,
+        usecols=lambda name: name.upper() in GPS_RECORD_COLUMNS_MAP,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_rows,
+        encoding="utf-8",
+    )
+    for chunk in chunks:
+        yield chunk.rename(columns=str.upper)
+
+
+def clean_gps_records(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    向量化校验和转换一块 GPS 数据（CSV 读入的字符串或 Parquet 的原生类型均可），
+    去除缺列、无法解析或坐标越界的点，并解析出 UTC 的 time。返回列顺序与 GPS_RECORD_COLUMNS 一致。
+    """
+    missing = set(GPS_RECORD_COLUMNS_MAP) - set(raw.columns)
+    if missing:
+        raise ValueError(f"GPS 文件缺少列: {', '.join(sorted(missing))}")
+    df = raw.rename(columns=GPS_RECORD_COLUMNS_MAP)
+    for column in ("commaddr", "utc"):
+        df[column] = df[column].astype("string").str.strip().replace("", pd.NA)
+    for column in ("lat", "lon", "head", "speed", "tflag"):
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    df["time"] = pd.to_datetime(df["utc"], format=UTC_FORMAT, utc=True, errors="coerce")
+    df = df.dropna(subset=GPS_RECORD_COLUMNS)
+    valid = df["lat"].between(-90, 90) & df["lon"].between(-180, 180)
+    df = df.loc[valid, GPS_RECORD_COLUMNS]
+    return df.astype({"tflag": "int64"})
+
+
+def load_gps_records(path: str, chunk_rows: int | None = None, job_id: int | None = None) -> dict:
+    """
+    流式导入 GPS 轨迹文件：每块数据按天拆分，逐天 COPY 进临时表后按 (commaddr, time) 去重合并进 gpsrecord，
+    每次合并只写入一个按天分区。返回读取/写入/跳过的行数、每天写入的点数以及有写入的汇总时间桶。
+    """
+    chunk_rows = chunk_rows or settings.IMPORT_CHUNK_ROWS
+    stats = {"rows_read": 0, "rows_loaded": 0, "rows_skipped": 0}
+    days: dict[str, int] = {}
+    rollup_buckets: set[datetime] = set()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(_CREATE_GPS_RECORD_STAGING_SQL)
+            for raw in read_gps_record_chunks(path, chunk_rows):
+                records = clean_gps_records(raw)
+                loaded = 0
+                for day, group in records.groupby(records["time"].dt.floor("D"), sort=True):
+                    ensure_partitions(cursor, "gpsrecord", [day.date()])
+                    connection.commit()
+                    staging = group.drop(columns=["time"]).assign(epoch=epoch_seconds(group["time"]))
+                    copy_dataframe(cursor, "gpsrecord_staging", staging)
+                    cursor.execute(_MERGE_GPS_RECORD_STAGING_SQL)
+                    day_loaded = cursor.rowcount
+                    connection.commit()
+                    day_key = day.strftime("%Y%m%d")
+                    days[day_key] = days.get(day_key, 0) + day_loaded
+                    loaded += day_loaded
+                    if day_loaded:
+                        floors = group["time"].dt.floor(f"{BUCKET_MINUTES}min").unique()
+                        rollup_buckets |= set(pd.DatetimeIndex(floors).to_pydatetime())
+                stats["rows_read"] += len(raw)
+                stats["rows_loaded"] += loaded
+                stats["rows_skipped"] += len(raw) - loaded
+                logger.info(
+                    "导入 %s：已读取 %d 行，写入 %d 行，跳过 %d 行",
+                    path, stats["rows_read"], stats["rows_loaded"], stats["rows_skipped"],
+                )
+                if job_id is not None:
+                    update_import_job(job_id, **stats)
+    finally:
+        connection.close()
+    return {**stats, "days": days, "rollup_buckets": rollup_buckets}
+
+
+def run_gps_record_import(job_id: int, path: str, chunk_rows: int | None = None) -> None:
+    """后台 GPS 导入任务：导入后只刷新有写入的速度汇总时间桶，并使轨迹相关接口的缓存失效"""
+    update_import_job(job_id, status="running")
+    try:
+        result = load_gps_records(path, chunk_rows, job_id)
+        logger.info("导入 %s 完成，各天写入点数: %s", path, result["days"])
+        bump_data_version("gpsrecord")
+        refresh_speed_rollups_for_buckets(result["rollup_buckets"], settings.ANALYSIS_MAP_MATCH_IMPORT_WORKERS)
+        bump_data_version("gpsrecord")
+        update_import_job(job_id, status="succeeded", finished_at=datetime.utcnow())
+    except Exception as e:
+        logger.exception("导入 %s 失败", path)
+        update_import_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
@@ -0,0 +1,619 @@
+"""
+基于隐马尔可夫模型（HMM）的地图匹配：把带噪声的 GPS 轨迹点吸附到路网的路段上。
+
+路网从本地 OSM XML 文件（.osm 或 .osm.gz）加载为有向图，每条有向边是 OSM way 中相邻两个节点之间的
+直线段，双向道路拆为两条方向相反的边。所有坐标投影到以路网中心为原点的局部平面（米）上计算。
+
+匹配过程：
+    候选    在边长为搜索半径的网格索引中查找每个点周围 3×3 网格内的路段，按投影距离保留最近的若干条
+    发射    候选点与 GPS 点的距离服从零均值高斯分布
+    转移    相邻两点候选之间的路网最短路长度与两点直线距离之差服从指数分布，
+            最短路用限定搜索半径的 Dijkstra 计算
+    解码    Viterbi 求最可能的候选序列；相邻两点相距过远或候选之间均不可达时在此处断开，分段解码
+
+批量匹配时按车辆分发到进程池，路网在各工作进程初始化时传入一次。
+用法（在 backend 目录下，匹配时间范围内所有车辆的轨迹并输出吞吐量）：
+    python -m app.data_analysis.map_matching --start-utc 20130912000000 --end-utc 20130912010000
+"""
+import argparse
+import gzip
+import heapq
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.data_analysis.geo import METRES_PER_DEGREE_LAT
+
+logger = logging.getLogger(__name__)
+
+# 参与匹配的 OSM 道路类型（机动车可通行）
+DRIVABLE_HIGHWAYS = frozenset({
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link",
+    "unclassified", "residential", "living_street", "service", "road",
+})
+# 候选路段的搜索半径（米），同时作为路段网格索引的网格边长
+MAP_MATCH_SEARCH_RADIUS_M = 50.0
+# 每个点最多保留的候选路段数（双向道路的两个方向各算一条）
+MAP_MATCH_MAX_CANDIDATES = 8
+# GPS 定位误差的标准差（米），决定发射概率
+MAP_MATCH_GPS_SIGMA_M = 20.0
+# 路网距离与直线距离之差的指数分布尺度（米），决定转移概率
+MAP_MATCH_BETA_M = 50.0
+# 转移时最短路的搜索上限：直线距离 × 系数 + 余量（米），超出视为不可达
+MAP_MATCH_ROUTE_FACTOR = 2.0
+MAP_MATCH_ROUTE_SLACK_M = 500.0
+# 相邻两点直线距离超过该值（米）时断开，前后两段分别解码
+MAP_MATCH_BREAK_DISTANCE_M = 2000.0
+# 网格编号中每个维度的偏移，使负的网格坐标也能编码为非负整数
+_GRID_KEY_OFFSET = 1 << 20
+
+
+@dataclass
+class RoadNetwork:
+    """
+    有向路网。节点坐标为 WGS84 经纬度及其局部平面投影（米）；
+    第 i 条边从 edge_from[i] 指向 edge_to[i]，长度为投影平面上的直线距离，属于 OSM way edge_way[i]。
+    路段网格索引：grid_keys 为升序的非空网格编号，grid_edges[grid_indptr[k]:grid_indptr[k + 1]]
+    为包围盒覆盖该网格的边。
+    """
+    origin_lat: float
+    origin_lon: float
+    node_lat: np.ndarray
+    node_lon: np.ndarray
+    node_x: np.ndarray
+    node_y: np.ndarray
+    edge_from: np.ndarray
+    edge_to: np.ndarray
+    edge_length: np.ndarray
+    edge_way: np.ndarray
+    way_names: dict[int, str]
+    cell_size: float
+    grid_keys: np.ndarray
+    grid_indptr: np.ndarray
+    grid_edges: np.ndarray
+    _neighbours: list[list[tuple[int, float]]] | None = field(default=None, repr=False)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # 传给工作进程时不序列化邻接表，由工作进程自行构建
+        return {**self.__dict__, "_neighbours": None}
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_from)
+
+    def neighbours(self) -> list[list[tuple[int, float]]]:
+        """每个节点的出边 (终点, 长度) 列表，供纯 Python 的 Dijkstra 使用，首次调用时构建"""
+        if self._neighbours is None:
+            neighbours: list[list[tuple[int, float]]] = [[] for _ in range(len(self.node_x))]
+            for source, target, length in zip(
+                self.edge_from.tolist(), self.edge_to.tolist(), self.edge_length.tolist()
+            ):
+                neighbours[source].append((target, length))
+            self._neighbours = neighbours
+        return self._neighbours
+
+    def project(self, lat, lon) -> tuple[np.ndarray, np.ndarray]:
+        """WGS84 经纬度投影到路网的局部平面坐标 (x 向东, y 向北)，单位米"""
+        metres_per_degree_lon = METRES_PER_DEGREE_LAT * np.cos(np.radians(self.origin_lat))
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        return (lon - self.origin_lon) * metres_per_degree_lon, (lat - self.origin_lat) * METRES_PER_DEGREE_LAT
+
+    def unproject(self, x, y) -> tuple[np.ndarray, np.ndarray]:
+        """局部平面坐标换回 WGS84 (纬度, 经度)"""
+        metres_per_degree_lon = METRES_PER_DEGREE_LAT * np.cos(np.radians(self.origin_lat))
+        return self.origin_lat + np.asarray(y) / METRES_PER_DEGREE_LAT, self.origin_lon + np.asarray(x) / metres_per_degree_lon
+
+
+def _grid_key(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    return (cx + _GRID_KEY_OFFSET) * (2 * _GRID_KEY_OFFSET) + (cy + _GRID_KEY_OFFSET)
+
+
+def _gather_ranges(starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """把若干区间 [starts[k], ends[k]) 展开为下标数组，同时返回每个下标所属的区间序号"""
+    counts = ends - starts
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    return starts[owner] + np.arange(counts.sum()) - first[owner], owner
+
+
+def build_road_network(
+    node_ids: np.ndarray,
+    node_lat: np.ndarray,
+    node_lon: np.ndarray,
+    edge_from_ids: np.ndarray,
+    edge_to_ids: np.ndarray,
+    edge_way: np.ndarray,
+    way_names: dict[int, str] | None = None,
+    cell_size: float = MAP_MATCH_SEARCH_RADIUS_M,
+) -> RoadNetwork:
+    """
+    由节点表和按 OSM 节点编号表示的有向边构建路网：剔除端点缺失的边和未被引用的节点，
+    投影坐标，计算边长并建立路段网格索引
+    """
+    order = np.argsort(node_ids, kind="stable")
+    node_ids, node_lat, node_lon = node_ids[order], node_lat[order], node_lon[order]
+
+    def lookup(ids: np.ndarray) -> np.ndarray:
+        index = np.minimum(np.searchsorted(node_ids, ids), max(len(node_ids) - 1, 0))
+        return np.where(node_ids[index] == ids, index, -1) if len(node_ids) else np.full(len(ids), -1)
+
+    source, target = lookup(edge_from_ids), lookup(edge_to_ids)
+    valid = (source >= 0) & (target >= 0) & (source != target)
+    source, target, edge_way = source[valid], target[valid], edge_way[valid]
+    if not len(source):
+        raise ValueError("路网中没有可用的道路")
+    used, inverse = np.unique(np.concatenate([source, target]), return_inverse=True)
+    edge_from, edge_to = inverse[:len(source)], inverse[len(source):]
+    node_lat, node_lon = node_lat[used], node_lon[used]
+
+    network = RoadNetwork(
+        origin_lat=float((node_lat.min() + node_lat.max()) / 2),
+        origin_lon=float((node_lon.min() + node_lon.max()) / 2),
+        node_lat=node_lat,
+        node_lon=node_lon,
+        node_x=np.empty(0),
+        node_y=np.empty(0),
+        edge_from=edge_from.astype(np.int64),
+        edge_to=edge_to.astype(np.int64),
+        edge_length=np.empty(0),
+        edge_way=edge_way.astype(np.int64),
+        way_names=way_names or {},
+        cell_size=float(cell_size),
+        grid_keys=np.empty(0, dtype=np.int64),
+        grid_indptr=np.zeros(1, dtype=np.int64),
+        grid_edges=np.empty(0, dtype=np.int64),
+    )
+    network.node_x, network.node_y = network.project(node_lat, node_lon)
+    ax, ay = network.node_x[edge_from], network.node_y[edge_from]
+    bx, by = network.node_x[edge_to], network.node_y[edge_to]
+    network.edge_length = np.hypot(bx - ax, by - ay)
+
+    # 每条边登记到其包围盒覆盖的所有网格
+    cx0 = np.floor(np.minimum(ax, bx) / cell_size).astype(np.int64)
+    cx1 = np.floor(np.maximum(ax, bx) / cell_size).astype(np.int64)
+    cy0 = np.floor(np.minimum(ay, by) / cell_size).astype(np.int64)
+    cy1 = np.floor(np.maximum(ay, by) / cell_size).astype(np.int64)
+    width = cx1 - cx0 + 1
+    counts = width * (cy1 - cy0 + 1)
+    local, edges = _gather_ranges(np.zeros_like(counts), counts)
+    keys = _grid_key(cx0[edges] + local % width[edges], cy0[edges] + local // width[edges])
+    order = np.argsort(keys, kind="stable")
+    keys, network.grid_edges = keys[order], edges[order]
+    network.grid_keys, first = np.unique(keys, return_index=True)
+    network.grid_indptr = np.append(first, len(keys)).astype(np.int64)
+    return network
+
+
+def _open_osm(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _way_directions(tags: dict[str, str]) -> tuple[bool, bool]:
+    """按 oneway / junction 标签判断 way 是否允许 (顺向, 逆向) 通行"""
+    oneway = tags.get("oneway", "")
+    if oneway in ("-1", "reverse"):
+        return False, True
+    if oneway in ("yes", "true", "1"):
+        return True, False
+    implied = tags.get("highway") == "motorway" or tags.get("junction") in ("roundabout", "circular")
+    return True, not (implied and oneway != "no")
+
+
+def parse_osm(path: str) -> RoadNetwork:
+    """
+    流式解析 OSM XML，保留 DRIVABLE_HIGHWAYS 中的 way。
+    节点坐标和 way 的节点序列先存入紧凑数组，每个顶层元素处理完即从树中清除，内存与文件大小无关。
+    """
+    node_ids, node_lat, node_lon = array("q"), array("d"), array("d")
+    refs, ref_way, forward, backward = array("q"), array("q"), array("b"), array("b")
+    way_names: dict[int, str] = {}
+    with _open_osm(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == "node":
+                node_ids.append(int(elem.get("id")))
+                node_lat.append(float(elem.get("lat")))
+                node_lon.append(float(elem.get("lon")))
+            elif elem.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                if tags.get("highway") in DRIVABLE_HIGHWAYS:
+                    way_id = int(elem.get("id"))
+                    way_refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    is_forward, is_backward = _way_directions(tags)
+                    refs.extend(way_refs)
+                    ref_way.extend([way_id] * len(way_refs))
+                    forward.extend([is_forward] * len(way_refs))
+                    backward.extend([is_backward] * len(way_refs))
+                    if tags.get("name"):
+                        way_names[way_id] = tags["name"]
+            elif elem.tag != "relation":
+                continue
+            root.clear()
+
+    refs_np, ref_way_np = np.frombuffer(refs, dtype=np.int64), np.frombuffer(ref_way, dtype=np.int64)
+    forward_np, backward_np = np.frombuffer(forward, dtype=np.int8), np.frombuffer(backward, dtype=np.int8)
+    # 同一 way 中相邻的两个节点构成一段
+    same_way = ref_way_np[:-1] == ref_way_np[1:]
+    a, b, way = refs_np[:-1][same_way], refs_np[1:][same_way], ref_way_np[:-1][same_way]
+    is_forward, is_backward = forward_np[:-1][same_way] == 1, backward_np[:-1][same_way] == 1
+    return build_road_network(
+        np.frombuffer(node_ids, dtype=np.int64),
+        np.frombuffer(node_lat, dtype=np.float64),
+        np.frombuffer(node_lon, dtype=np.float64),
+        np.concatenate([a[is_forward], b[is_backward]]),
+        np.concatenate([b[is_forward], a[is_backward]]),
+        np.concatenate([way[is_forward], way[is_backward]]),
+        way_names,
+    )
+
+
+_networks: dict[str, tuple[float, RoadNetwork]] = {}
+_networks_lock = threading.Lock()
+
+
+def load_road_network(path: str | None = None) -> RoadNetwork:
+    """加载路网文件（默认取配置 ANALYSIS_ROAD_NETWORK_FILE），按文件修改时间在进程内缓存"""
+    path = path or settings.ANALYSIS_ROAD_NETWORK_FILE
+    if not path:
+        raise RuntimeError("未配置路网文件 ANALYSIS_ROAD_NETWORK_FILE，无法进行地图匹配")
+    if not os.path.isfile(path):
+        raise RuntimeError(f"路网文件 {path} 不存在")
+    mtime = os.path.getmtime(path)
+    with _networks_lock:
+        cached = _networks.get(path)
+        if cached is None or cached[0] != mtime:
+            start = time.perf_counter()
+            network = parse_osm(path)
+            logger.info(
+                "加载路网 %s：%d 个节点，%d 条有向边，耗时 %.1fs",
+                path, len(network.node_x), network.edge_count, time.perf_counter() - start,
+            )
+            cached = _networks[path] = (mtime, network)
+        return cached[1]
+
+
+def find_candidates(
+    network: RoadNetwork,
+    x: np.ndarray,
+    y: np.ndarray,
+    radius_m: float = MAP_MATCH_SEARCH_RADIUS_M,
+    max_candidates: int = MAP_MATCH_MAX_CANDIDATES,
+) -> dict[str, np.ndarray]:
+    """
+    为每个投影后的点查找半径内最近的至多 max_candidates 条边，全部点一次性向量化计算。
+    返回按 (点, 距离) 排序的候选数组：point、edge、offset（投影点距边起点的长度）、distance、x、y。
+    radius_m 不能超过网格边长，否则 3×3 网格不能覆盖整个搜索范围。
+    """
+    if radius_m > network.cell_size:
+        raise ValueError(f"搜索半径不能超过路网网格边长 {network.cell_size}m")
+    cx = np.floor(x / network.cell_size).astype(np.int64)
+    cy = np.floor(y / network.cell_size).astype(np.int64)
+    offsets = np.array([-1, 0, 1])
+    keys = _grid_key(
+        (cx[:, None, None] + offsets[None, :, None]).repeat(3, axis=2),
+        (cy[:, None, None] + offsets[None, None, :]).repeat(3, axis=1),
+    ).reshape(-1)
+    slot = np.minimum(np.searchsorted(network.grid_keys, keys), len(network.grid_keys) - 1)
+    found = network.grid_keys[slot] == keys
+    starts = np.where(found, network.grid_indptr[slot], 0)
+    ends = np.where(found, network.grid_indptr[slot + 1], 0)
+    index, owner = _gather_ranges(starts, ends)
+    point, edge = owner // 9, network.grid_edges[index]
+    # 长路段会登记在多个网格中，去掉重复的 (点, 边)
+    pair = np.unique(point * network.edge_count + edge)
+    point, edge = pair // network.edge_count, pair % network.edge_count
+
+    ax, ay = network.node_x[network.edge_from[edge]], network.node_y[network.edge_from[edge]]
+    dx, dy = network.node_x[network.edge_to[edge]] - ax, network.node_y[network.edge_to[edge]] - ay
+    length = network.edge_length[edge]
+    t = np.clip(((x[point] - ax) * dx + (y[point] - ay) * dy) / np.maximum(length * length, 1e-12), 0.0, 1.0)
+    snapped_x, snapped_y = ax + t * dx, ay + t * dy
+    distance = np.hypot(x[point] - snapped_x, y[point] - snapped_y)
+
+    # 半径内的候选按 (点, 距离) 排序，每个点保留前 max_candidates 个
+    order = np.flatnonzero(distance <= radius_m)
+    order = order[np.lexsort((distance[order], point[order]))]
+    rank = np.arange(len(order)) - np.searchsorted(point[order], point[order])
+    keep = order[rank < max_candidates]
+    return {
+        "point": point[keep],
+        "edge": edge[keep],
+        "offset": t[keep] * length[keep],
+        "distance": distance[keep],
+        "x": snapped_x[keep],
+        "y": snapped_y[keep],
+    }
+
+
+def bounded_dijkstra(
+    neighbours: list[list[tuple[int, float]]], source: int, targets: set[int], limit: float
+) -> dict[int, float]:
+    """从 source 出发的最短路，只扩展距离不超过 limit 的节点，targets 全部到达后提前结束"""
+    best = {source: 0.0}
+    found: dict[int, float] = {}
+    remaining = set(targets)
+    heap = [(0.0, source)]
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if distance > best[node]:
+            continue
+        if node in remaining:
+            found[node] = distance
+            remaining.discard(node)
+            if not remaining:
+                break
+        for target, length in neighbours[node]:
+            candidate = distance + length
+            if candidate <= limit and candidate < best.get(target, np.inf):
+                best[target] = candidate
+                heapq.heappush(heap, (candidate, target))
+    return found
+
+
+def _route_lengths(
+    network: RoadNetwork,
+    previous_edges: list[int],
+    previous_offsets: list[float],
+    edges: list[int],
+    offsets: np.ndarray,
+    limit: float,
+) -> np.ndarray:
+    """
+    前一点各候选到当前点各候选沿路网行驶的长度矩阵，不可达或超过 limit 为 inf。
+    同一条边上向前行驶直接取偏移差，否则为 驶完前一条边 + 节点间最短路 + 当前边上的偏移。
+    """
+    neighbours = network.neighbours()
+    edge_from = network.edge_from
+    starts = [int(edge_from[edge]) for edge in edges]
+    targets = set(starts)
+    lengths = np.full((len(previous_edges), len(edges)), np.inf)
+    from_node: dict[int, dict[int, float]] = {}
+    for i, (previous_edge, previous_offset) in enumerate(zip(previous_edges, previous_offsets)):
+        rest = float(network.edge_length[previous_edge]) - previous_offset
+        if rest <= limit:
+            node = int(network.edge_to[previous_edge])
+            if node not in from_node:
+                from_node[node] = bounded_dijkstra(neighbours, node, targets, limit)
+            reached = from_node[node]
+            lengths[i] = rest + np.array([reached.get(start, np.inf) for start in starts]) + offsets
+        for j, edge in enumerate(edges):
+            if edge == previous_edge and offsets[j] >= previous_offset:
+                lengths[i, j] = offsets[j] - previous_offset
+    lengths[lengths > limit] = np.inf
+    return lengths
+
+
+def match_track(
+    network: RoadNetwork,
+    lat,
+    lon,
+    radius_m: float = MAP_MATCH_SEARCH_RADIUS_M,
+    max_candidates: int = MAP_MATCH_MAX_CANDIDATES,
+    sigma_m: float = MAP_MATCH_GPS_SIGMA_M,
+    beta_m: float = MAP_MATCH_BETA_M,
+) -> dict[str, np.ndarray]:
+    """
+    对一条按时间排序的轨迹做 HMM 地图匹配，返回与输入等长的数组：
+        edge        匹配到的有向边下标，未匹配为 -1
+        way_id      边所属的 OSM way 编号，未匹配为 -1
+        lat, lon    吸附到路段上的 WGS84 坐标，未匹配为 NaN
+        distance_m  原始点到吸附点的距离（米），未匹配为 NaN
+    搜索半径内没有道路的点不参与解码，其前后两点直接衔接。
+    """
+    x, y = network.project(lat, lon)
+    n = len(x)
+    candidates = find_candidates(network, x, y, radius_m, max_candidates)
+    bounds = np.searchsorted(candidates["point"], np.arange(n + 1))
+    emission = -0.5 * (candidates["distance"] / sigma_m) ** 2
+    candidate_edges = candidates["edge"].tolist()
+    candidate_offsets = candidates["offset"].tolist()
+    chosen = np.full(n, -1, dtype=np.int64)
+
+    def backtrack(chain: list[tuple[int, int, np.ndarray | None]], scores: np.ndarray) -> None:
+        best = int(np.argmax(scores))
+        for point, first, back in reversed(chain):
+            chosen[point] = first + best
+            if back is not None:
+                best = int(back[best])
+
+    chain: list[tuple[int, int, np.ndarray | None]] = []
+    scores = None
+    previous = -1
+    for point in range(n):
+        first, last = int(bounds[point]), int(bounds[point + 1])
+        if first == last:
+            continue
+        if scores is not None:
+            straight = float(np.hypot(x[point] - x[previous], y[point] - y[previous]))
+            if straight <= MAP_MATCH_BREAK_DISTANCE_M:
+                previous_first, previous_last = int(bounds[previous]), int(bounds[previous + 1])
+                lengths = _route_lengths(
+                    network,
+                    candidate_edges[previous_first:previous_last],
+                    candidate_offsets[previous_first:previous_last],
+                    candidate_edges[first:last],
+                    candidates["offset"][first:last],
+                    straight * MAP_MATCH_ROUTE_FACTOR + MAP_MATCH_ROUTE_SLACK_M,
+                )
+                total = scores[:, None] - np.abs(lengths - straight) / beta_m
+                back = np.argmax(total, axis=0)
+                best = total[back, np.arange(last - first)]
+                if np.isfinite(best).any():
+                    scores = best + emission[first:last]
+                    chain.append((point, first, back))
+                    previous = point
+                    continue
+            # 过远或不可达：已有部分单独解码，从当前点重新开始
+            backtrack(chain, scores)
+        chain = [(point, first, None)]
+        scores = emission[first:last].copy()
+        previous = point
+    if chain:
+        backtrack(chain, scores)
+
+    matched = chosen >= 0
+    picked = chosen[matched]
+    edge = np.full(n, -1, dtype=np.int64)
+    edge[matched] = candidates["edge"][picked]
+    way_id = np.full(n, -1, dtype=np.int64)
+    way_id[matched] = network.edge_way[edge[matched]]
+    matched_lat, matched_lon = np.full(n, np.nan), np.full(n, np.nan)
+    matched_lat[matched], matched_lon[matched] = network.unproject(candidates["x"][picked], candidates["y"][picked])
+    distance = np.full(n, np.nan)
+    distance[matched] = candidates["distance"][picked]
+    return {"edge": edge, "way_id": way_id, "lat": matched_lat, "lon": matched_lon, "distance_m": distance}
+
+
+def match_track_points(points: list[dict[str, Any]], network: RoadNetwork | None = None) -> dict[str, np.ndarray]:
+    """对 get_vehicle_track 返回的 WGS84 轨迹点做地图匹配，路网默认取配置"""
+    network = network or load_road_network()
+    lat = np.fromiter((point["lat"] for point in points), dtype=np.float64, count=len(points))
+    lon = np.fromiter((point["lon"] for point in points), dtype=np.float64, count=len(points))
+    return match_track(network, lat, lon)
+
+
+_worker_network: RoadNetwork | None = None
+
+
+def _init_worker(network: RoadNetwork) -> None:
+    global _worker_network
+    _worker_network = network
+    network.neighbours()
+
+
+def _match_in_worker(item: tuple[str, np.ndarray, np.ndarray]) -> tuple[str, dict[str, np.ndarray]]:
+    key, lat, lon = item
+    return key, match_track(_worker_network, lat, lon)
+
+
+def resolve_workers(workers: int | None = None) -> int:
+    workers = settings.ANALYSIS_MAP_MATCH_WORKERS if workers is None else workers
+    return (os.cpu_count() or 1) if workers < 1 else workers
+
+
+def create_match_executor(network: RoadNetwork, workers: int) -> ProcessPoolExecutor:
+    """
+    创建地图匹配进程池，每个进程初始化时载入 network。
+    用 spawn 方式启动，不继承 Web 服务进程中的线程和连接；调用方负责关闭（可用 with）。
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(network,),
+    )
+
+
+def match_track_batches(
+    batches: Iterable[dict[str, tuple[np.ndarray, np.ndarray]]],
+    network: RoadNetwork | None = None,
+    workers: int | None = None,
+    executor: ProcessPoolExecutor | None = None,
+) -> Iterator[dict[str, dict[str, np.ndarray]]]:
+    """
+    逐批匹配多辆车的轨迹，每批为 {车牌号: (纬度数组, 经度数组)}，依次产出 {车牌号: match_track 的结果}。
+    workers 默认取配置 ANALYSIS_MAP_MATCH_WORKERS，大于 1 时按车辆分发到进程池，进程池在各批之间复用。
+    传入 executor（create_match_executor 用同一 network 创建）时直接使用，不再新建和关闭进程池，
+    便于在多次调用之间复用。
+    """
+    network = network or load_road_network()
+    workers = resolve_workers(workers)
+    if workers <= 1:
+        for tracks in batches:
+            yield {key: match_track(network, lat, lon) for key, (lat, lon) in tracks.items()}
+        return
+    if executor is None:
+        with create_match_executor(network, workers) as executor:
+            yield from match_track_batches(batches, network, workers, executor)
+        return
+    for tracks in batches:
+        items = [
+            (key, np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+            for key, (lat, lon) in tracks.items()
+        ]
+        yield dict(executor.map(_match_in_worker, items, chunksize=max(1, len(items) // (workers * 4))))
+
+
+def match_tracks(
+    tracks: dict[str, tuple[np.ndarray, np.ndarray]],
+    network: RoadNetwork | None = None,
+    workers: int | None = None,
+) -> dict[str, dict[str, np.ndarray]]:
+    """批量匹配一批车辆的轨迹，见 match_track_batches"""
+    workers = max(1, min(resolve_workers(workers), len(tracks)))
+    return next(match_track_batches([tracks], network, workers))
+
+
+def way_segments(network: RoadNetwork, way_ids: Iterable[int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    给定 OSM way 包含的路段，双向道路只保留一个方向。
+    返回按 way 编号排序的 (way 编号 (m,), 端点纬度 (m, 2), 端点经度 (m, 2))
+    """
+    edges = np.flatnonzero(np.isin(network.edge_way, np.asarray(list(way_ids), dtype=np.int64)))
+    a, b = network.edge_from[edges], network.edge_to[edges]
+    _, first = np.unique(
+        np.stack([network.edge_way[edges], np.minimum(a, b), np.maximum(a, b)], axis=1), axis=0, return_index=True
+    )
+    edges = edges[first]
+    ends = np.stack([network.edge_from[edges], network.edge_to[edges]], axis=1)
+    return network.edge_way[edges], network.node_lat[ends], network.node_lon[ends]
+
+
+def main():
+    from app.data_analysis.trajectories import get_fleet_tracks
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="批量地图匹配")
+    parser.add_argument("--start-utc", required=True, help="起始时间，格式YYYYMMDDHHMMSS")
+    parser.add_argument("--end-utc", required=True, help="结束时间，格式YYYYMMDDHHMMSS")
+    parser.add_argument("--commaddr", nargs="*", help="车牌号，默认取时间范围内路网范围中出现过的车辆")
+    parser.add_argument("--max-vehicles", type=int, default=10_000, help="最多匹配的车辆数")
+    parser.add_argument("--network", help="OSM 路网文件，默认取配置 ANALYSIS_ROAD_NETWORK_FILE")
+    parser.add_argument("--workers", type=int, help="进程数，默认取配置 ANALYSIS_MAP_MATCH_WORKERS")
+    args = parser.parse_args()
+
+    network = load_road_network(args.network)
+    bbox = (
+        float(network.node_lat.min()), float(network.node_lon.min()),
+        float(network.node_lat.max()), float(network.node_lon.max()),
+    )
+    tracks = get_fleet_tracks(
+        args.start_utc, args.end_utc, commaddrs=args.commaddr,
+        bbox=None if args.commaddr else bbox, max_vehicles=args.max_vehicles,
+    )
+    arrays = {
+        vehicle: (
+            np.fromiter((point["lat"] for point in points), dtype=np.float64, count=len(points)),
+            np.fromiter((point["lon"] for point in points), dtype=np.float64, count=len(points)),
+        )
+        for vehicle, points in tracks.items()
+    }
+    start = time.perf_counter()
+    results = match_tracks(arrays, network, args.workers)
+    seconds = time.perf_counter() - start
+    total = sum(len(lat) for lat, _ in arrays.values())
+    matched = sum(int((result["edge"] >= 0).sum()) for result in results.values())
+    print(
+        f"{len(results)} 辆车 {total} 个点，匹配 {matched} 个（{matched / max(total, 1):.1%}），"
+        f"耗时 {seconds:.1f}s，{total / max(seconds, 1e-9) * 3600:,.0f} 点/小时"
+    )
+
+
+if __name__ == "__main__":
+    main()
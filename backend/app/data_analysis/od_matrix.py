@@ -0,0 +1,460 @@
+"""
+出租车订单的 OD（起点-终点）矩阵：把上车点和下车点划入区域，统计区域之间的订单流量。
+
+区域划分有两种：
+    grid       按 cell_size_m 米的网格划分，与 /analysis/grid-hotspots 的网格一致
+    <名称>     ANALYSIS_OD_ZONES_DIR 下的 GeoJSON 文件（<名称>.geojson 或 <名称>.json），
+               Polygon / MultiPolygon 要素各为一个区域，可通过 POST /analysis/od-zones 上传
+
+OD 矩阵是稀疏的，以 COO 三元组（起点区域、终点区域、订单数）表示。
+按 15 分钟时间桶计算并写入分析缓存，查询窗口的结果由各时间桶的三元组合并得到，
+重叠的查询窗口只需计算未缓存过的时间桶。
+"""
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.data_analysis.cache import get_cache_store, get_data_version
+from app.data_analysis.columnar import fetch_packed_float_array
+from app.data_analysis.coordinates import CoordinateSystem, transform_coordinates
+from app.data_analysis.geo import cell_size_degrees
+from app.data_analysis.rollups import ROLLUP_BUCKET, merge_bucket_ranges
+from app.data_analysis.timeutils import bucket_floor, format_utc, parse_utc
+
+GRID_ZONES = "grid"
+# 网格区域编号：(行号 + 偏移) * 步长 + (列号 + 偏移)，行列号为 floor(纬度 / 纬度跨度)、floor(经度 / 经度跨度)
+# 编号小于 2^53，前端 JavaScript 可以精确表示（网格边长不小于 1 米）
+_GRID_OFFSET = 1 << 24
+_GRID_STRIDE = 1 << 25
+# 区域集合名称只允许字母、数字、下划线和连字符，同时用作文件名
+ZONE_SET_NAME_PATTERN = re.compile(r"^[\w-]+$")
+ZONE_FILE_SUFFIXES = (".geojson", ".json")
+# 多边形按纬度切分的条带数上限，条带越窄每个点需要判断的边越少
+_MAX_STRIPS = 4096
+# 多边形外包矩形上查找表的行列数：不与任何边相交的格子整体属于同一区域，格内的点直接查表
+_RASTER_SIZE = 256
+_RASTER_BOUNDARY = -2
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """把若干区间 [starts[k], starts[k] + counts[k]) 展开为下标数组，同时返回每个下标所属的区间序号"""
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    return starts[owner] + np.arange(counts.sum()) - first[owner], owner
+
+
+class GridZones:
+    """边长 cell_size_m 米的规则网格，每个网格为一个区域"""
+
+    def __init__(self, cell_size_m: float):
+        self.cell_size_m = cell_size_m
+        self.dlat, self.dlon = cell_size_degrees(cell_size_m)
+        self.key = f"{GRID_ZONES}:{cell_size_m:g}"
+
+    def locate(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """WGS84 坐标所在的网格编号"""
+        row = np.floor(lat / self.dlat).astype(np.int64)
+        col = np.floor(lon / self.dlon).astype(np.int64)
+        return (row + _GRID_OFFSET) * _GRID_STRIDE + (col + _GRID_OFFSET)
+
+    def describe(self, codes: np.ndarray) -> tuple[list, list, np.ndarray, np.ndarray]:
+        """区域编号对应的 (id 列表, 名称列表, 中心纬度, 中心经度)，网格的 id 即编号、名称为空"""
+        row, col = codes // _GRID_STRIDE - _GRID_OFFSET, codes % _GRID_STRIDE - _GRID_OFFSET
+        return codes.tolist(), [None] * len(codes), (row + 0.5) * self.dlat, (col + 0.5) * self.dlon
+
+
+@dataclass
+class PolygonZones:
+    """
+    多边形区域集合（WGS84）及其两级空间索引：
+    raster 把外包矩形划分为网格查找表，值为格子所属的区域序号（-1 为不在任何区域内），
+    有边穿过的格子标记为 _RASTER_BOUNDARY，只有落在这些格子里的点需要精确判断；
+    精确判断时，纬度落在第 k 个条带 [strip_origin + k * strip_height, strip_origin + (k + 1) * strip_height) 的点，
+    只需与 strip_edges[strip_indptr[k]:strip_indptr[k + 1]] 中的边做射线相交判断。
+    """
+    name: str
+    key: str
+    ids: list
+    names: list
+    center_lat: np.ndarray
+    center_lon: np.ndarray
+    # 多边形各环的边（不含水平边），edge_zone 为边所属的区域序号
+    edge_lat1: np.ndarray
+    edge_lon1: np.ndarray
+    edge_lat2: np.ndarray
+    edge_lon2: np.ndarray
+    edge_zone: np.ndarray
+    strip_origin: float
+    strip_height: float
+    strip_indptr: np.ndarray
+    strip_edges: np.ndarray
+    raster_lat: float
+    raster_lon: float
+    raster_dlat: float
+    raster_dlon: float
+    raster: np.ndarray
+
+    def raster_cells(self, lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """点所在查找表格子的 (行, 列, 是否在外包矩形内)"""
+        row = np.floor((lat - self.raster_lat) / self.raster_dlat).astype(np.int64)
+        col = np.floor((lon - self.raster_lon) / self.raster_dlon).astype(np.int64)
+        inside = (row >= 0) & (row < self.raster.shape[0]) & (col >= 0) & (col < self.raster.shape[1])
+        return row, col, inside
+
+    def locate(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """点所在的区域序号，不在任何区域内为 -1"""
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        zone = np.full(len(lat), -1, dtype=np.int64)
+        row, col, inside = self.raster_cells(lat, lon)
+        zone[inside] = self.raster[row[inside], col[inside]]
+        boundary = np.flatnonzero(zone == _RASTER_BOUNDARY)
+        zone[boundary] = self.locate_exact(lat[boundary], lon[boundary])
+        return zone
+
+    def locate_exact(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """
+        不经查找表逐点判断所在的区域序号，不在任何区域内为 -1。
+        向东发射水平射线，对 (点, 同条带的边) 对一次性向量化求交，与同一区域的边相交奇数次即在区域内
+        （环内的洞和 MultiPolygon 的多个部分都按奇偶规则处理）。区域重叠时取序号较大者。
+        """
+        zone = np.full(len(lat), -1, dtype=np.int64)
+        strip = np.floor((lat - self.strip_origin) / self.strip_height).astype(np.int64)
+        points = np.flatnonzero((strip >= 0) & (strip < len(self.strip_indptr) - 1))
+        starts = self.strip_indptr[strip[points]]
+        counts = self.strip_indptr[strip[points] + 1] - starts
+        index, owner = _expand_ranges(starts, counts)
+        point, edge = points[owner], self.strip_edges[index]
+
+        y, x = lat[point], lon[point]
+        y1, x1, y2, x2 = self.edge_lat1[edge], self.edge_lon1[edge], self.edge_lat2[edge], self.edge_lon2[edge]
+        # 条带只保证边的纬度范围与条带重叠，仍需判断边是否跨过点所在的纬线
+        crosses = (y1 > y) != (y2 > y)
+        crosses[crosses] = x[crosses] < x1[crosses] + (y[crosses] - y1[crosses]) * (
+            (x2[crosses] - x1[crosses]) / (y2[crosses] - y1[crosses])
+        )
+        zone_count = len(self.ids)
+        hits, parity = np.unique(point[crosses] * zone_count + self.edge_zone[edge[crosses]], return_counts=True)
+        inside = hits[parity % 2 == 1]
+        zone[inside // zone_count] = inside % zone_count
+        return zone
+
+    def describe(self, codes: np.ndarray) -> tuple[list, list, np.ndarray, np.ndarray]:
+        """区域序号对应的 (id 列表, 名称列表, 中心纬度, 中心经度)"""
+        return [self.ids[i] for i in codes], [self.names[i] for i in codes], self.center_lat[codes], self.center_lon[codes]
+
+
+ZoneSet = GridZones | PolygonZones
+
+
+def _feature_polygons(geometry: dict[str, Any] | None) -> list:
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry.get("type") == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def build_polygon_zones(name: str, key: str, data: dict[str, Any]) -> PolygonZones:
+    """
+    从 GeoJSON（FeatureCollection 或单个 Feature）构建区域集合，忽略非多边形要素。
+    坐标系取 GeoJSON 顶层的 coordinate_system 成员，未声明时为 ANALYSIS_OD_ZONES_COORDINATE_SYSTEM，统一转换为 WGS84。
+    区域 id 依次取 properties.adcode、要素 id、要素序号；中心点优先取 properties.centroid / center，否则为外环顶点均值。
+    """
+    if data.get("type") == "Feature":
+        features = [data]
+    elif data.get("type") == "FeatureCollection":
+        features = data.get("features") or []
+    else:
+        raise ValueError("区域文件必须是 GeoJSON FeatureCollection 或 Feature")
+    source_system = data.get("coordinate_system") or settings.ANALYSIS_OD_ZONES_COORDINATE_SYSTEM
+
+    ids, names, centers, rings, ring_zone = [], [], [], [], []
+    for position, feature in enumerate(features):
+        polygons = _feature_polygons(feature.get("geometry"))
+        if not polygons:
+            continue
+        zone = len(ids)
+        properties = feature.get("properties") or {}
+        ids.append(properties.get("adcode", feature.get("id", position)))
+        names.append(properties.get("name"))
+        outer = []
+        for polygon in polygons:
+            for ring_index, ring in enumerate(polygon):
+                ring = np.asarray(ring, dtype=np.float64)
+                if ring.ndim != 2 or ring.shape[0] < 3 or ring.shape[1] < 2:
+                    raise ValueError(f"第 {position} 个要素的多边形坐标格式错误")
+                rings.append(ring[:, :2])
+                ring_zone.append(zone)
+                if ring_index == 0:
+                    outer.append(ring[:-1, :2] if np.array_equal(ring[0], ring[-1]) else ring[:, :2])
+        center = properties.get("centroid") or properties.get("center")
+        if isinstance(center, list) and len(center) >= 2:
+            centers.append((float(center[0]), float(center[1])))
+        else:
+            centers.append(tuple(np.concatenate(outer).mean(axis=0)))
+    if not ids:
+        raise ValueError("区域文件中没有 Polygon 或 MultiPolygon 要素")
+
+    center_lon, center_lat = np.asarray(centers).T
+    center_lat, center_lon = transform_coordinates(center_lat, center_lon, source_system, "WGS84")
+    # 每个环首尾相连成边（GeoJSON 的环首尾点相同，多出的零长度边是水平边）
+    vertices = np.concatenate(rings)
+    lengths = np.array([len(ring) for ring in rings])
+    next_vertex = np.arange(len(vertices)) + 1
+    next_vertex[np.cumsum(lengths) - 1] = np.cumsum(lengths) - lengths
+    lat, lon = transform_coordinates(vertices[:, 1], vertices[:, 0], source_system, "WGS84")
+    edge_zone = np.repeat(np.asarray(ring_zone, dtype=np.int64), lengths)
+    all_lat1, all_lon1, all_lat2, all_lon2 = lat, lon, lat[next_vertex], lon[next_vertex]
+    # 水平边不影响射线法的穿越计数，只从条带索引中去掉；栅格的边界格子仍按全部边标记
+    keep = all_lat1 != all_lat2
+    lat1, lon1, lat2, lon2 = all_lat1[keep], all_lon1[keep], all_lat2[keep], all_lon2[keep]
+    edge_zone = edge_zone[keep]
+
+    strip_count = int(np.clip(len(lat1), 1, _MAX_STRIPS))
+    origin = float(min(lat1.min(), lat2.min()))
+    height = (float(max(lat1.max(), lat2.max())) - origin) / strip_count
+    first = np.floor((np.minimum(lat1, lat2) - origin) / height).astype(np.int64)
+    last = np.minimum(np.floor((np.maximum(lat1, lat2) - origin) / height).astype(np.int64), strip_count - 1)
+    offset, edges = _expand_ranges(np.zeros(len(first), dtype=np.int64), last - first + 1)
+    strips = first[edges] + offset
+    order = np.argsort(strips, kind="stable")
+    indptr = np.zeros(strip_count + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(strips, minlength=strip_count))
+    zones = PolygonZones(
+        name=name, key=key, ids=ids, names=names, center_lat=center_lat, center_lon=center_lon,
+        edge_lat1=lat1, edge_lon1=lon1, edge_lat2=lat2, edge_lon2=lon2, edge_zone=edge_zone,
+        strip_origin=origin, strip_height=height, strip_indptr=indptr, strip_edges=edges[order],
+        raster_lat=float(lat.min()), raster_lon=float(lon.min()),
+        raster_dlat=(float(lat.max()) - float(lat.min())) / _RASTER_SIZE,
+        raster_dlon=(float(lon.max()) - float(lon.min())) / _RASTER_SIZE,
+        raster=np.zeros((_RASTER_SIZE, _RASTER_SIZE), dtype=np.int64),
+    )
+    # 边的外包矩形覆盖的格子都视为有边穿过（保守估计），其余格子取格子中心所在的区域
+    row_first, col_first, _ = zones.raster_cells(np.minimum(all_lat1, all_lat2), np.minimum(all_lon1, all_lon2))
+    row_last, col_last, _ = zones.raster_cells(np.maximum(all_lat1, all_lat2), np.maximum(all_lon1, all_lon2))
+    row_first, row_last = np.clip(row_first, 0, _RASTER_SIZE - 1), np.clip(row_last, 0, _RASTER_SIZE - 1)
+    col_first, col_last = np.clip(col_first, 0, _RASTER_SIZE - 1), np.clip(col_last, 0, _RASTER_SIZE - 1)
+    width = col_last - col_first + 1
+    local, edges = _expand_ranges(np.zeros(len(width), dtype=np.int64), (row_last - row_first + 1) * width)
+    boundary = np.zeros(zones.raster.shape, dtype=bool)
+    boundary[row_first[edges] + local // width[edges], col_first[edges] + local % width[edges]] = True
+    row, col = np.nonzero(~boundary)
+    zones.raster[row, col] = zones.locate_exact(
+        zones.raster_lat + (row + 0.5) * zones.raster_dlat, zones.raster_lon + (col + 0.5) * zones.raster_dlon
+    )
+    zones.raster[boundary] = _RASTER_BOUNDARY
+    return zones
+
+
+def zone_set_path(name: str) -> str | None:
+    """区域集合名称对应的文件路径，文件不存在时返回 None"""
+    if not ZONE_SET_NAME_PATTERN.match(name):
+        raise ValueError(f"区域集合名称不合法: {name}")
+    for suffix in ZONE_FILE_SUFFIXES:
+        path = os.path.join(settings.ANALYSIS_OD_ZONES_DIR, name + suffix)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def list_zone_sets() -> list[str]:
+    """可用的区域集合名称，grid 始终可用"""
+    names = set()
+    if os.path.isdir(settings.ANALYSIS_OD_ZONES_DIR):
+        for filename in os.listdir(settings.ANALYSIS_OD_ZONES_DIR):
+            stem, suffix = os.path.splitext(filename)
+            if suffix in ZONE_FILE_SUFFIXES and ZONE_SET_NAME_PATTERN.match(stem):
+                names.add(stem)
+    return [GRID_ZONES] + sorted(names)
+
+
+_zone_sets: dict[str, tuple[int, PolygonZones]] = {}
+_zone_sets_lock = threading.Lock()
+
+
+def load_zone_set(name: str, cell_size_m: float = 500) -> ZoneSet:
+    """按名称加载区域集合，GeoJSON 区域按文件修改时间在进程内缓存"""
+    if name == GRID_ZONES:
+        return GridZones(cell_size_m)
+    path = zone_set_path(name)
+    if path is None:
+        raise ValueError(f"区域集合 {name} 不存在")
+    mtime = os.stat(path).st_mtime_ns
+    with _zone_sets_lock:
+        cached = _zone_sets.get(name)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            cached = _zone_sets[name] = (mtime, build_polygon_zones(name, f"{name}:{mtime}", data))
+        return cached[1]
+
+
+def save_zone_set(name: str, data: dict[str, Any], coordinate_system: CoordinateSystem) -> PolygonZones:
+    """校验并保存上传的 GeoJSON 区域文件，同名文件被覆盖；坐标系记录在文件顶层的 coordinate_system 成员中"""
+    if name == GRID_ZONES:
+        raise ValueError(f"区域集合名称 {GRID_ZONES} 为保留名称")
+    path = zone_set_path(name) or os.path.join(settings.ANALYSIS_OD_ZONES_DIR, name + ZONE_FILE_SUFFIXES[0])
+    data = {**data, "coordinate_system": coordinate_system}
+    zones = build_polygon_zones(name, name, data)
+    os.makedirs(settings.ANALYSIS_OD_ZONES_DIR, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return zones
+
+
+def _count_pairs(
+    origin: np.ndarray, destination: np.ndarray, group: np.ndarray | None = None, weights: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按 (分组, 起点, 终点) 累加计数，区域编号先映射为稠密序号再编码为单个 int64 键，一次排序完成。
+    weights 为空时每行计 1。返回按 (分组, 起点, 终点) 排序的 (分组, 起点编号, 终点编号, 计数)。
+    """
+    zones, inverse = np.unique(np.concatenate([origin, destination]), return_inverse=True)
+    zone_count = max(len(zones), 1)
+    keys = inverse[: len(origin)] * zone_count + inverse[len(origin):]
+    if group is not None:
+        keys = keys + group * (zone_count * zone_count)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+    pair = keys % (zone_count * zone_count)
+    return keys // (zone_count * zone_count), zones[pair // zone_count], zones[pair % zone_count], counts
+
+
+def compute_bucket_flows(zone_set: ZoneSet, start: datetime, end: datetime) -> dict[datetime, np.ndarray]:
+    """
+    查询 [start, end) 内的订单（start 为时间桶起点），按上车时间所在的 15 分钟时间桶分别统计 OD 流量。
+    返回 时间桶起点 -> (k, 3) 的 int64 数组 [起点区域, 终点区域, 订单数]，没有订单的时间桶为空数组；
+    上车点或下车点不在任何区域内的订单以区域 -1 计入。
+    """
+    rows = fetch_packed_float_array(
+        "SELECT extract(epoch FROM ontime), onlat, onlon, offlat, offlon FROM taxiorder "
+        "WHERE ontime >= %(start)s AND ontime < %(end)s "
+        "AND onlat IS NOT NULL AND onlon IS NOT NULL AND offlat IS NOT NULL AND offlon IS NOT NULL",
+        {"start": start, "end": end},
+        width=5,
+    )
+    bucket_seconds = ROLLUP_BUCKET.total_seconds()
+    bucket_count = int(-(-(end - start).total_seconds() // bucket_seconds))
+    group = np.floor((rows[:, 0] - start.timestamp()) / bucket_seconds).astype(np.int64)
+    origin = zone_set.locate(rows[:, 1], rows[:, 2])
+    destination = zone_set.locate(rows[:, 3], rows[:, 4])
+    group, origin, destination, counts = _count_pairs(origin, destination, group)
+    triples = np.column_stack([origin, destination, counts])
+    bounds = np.searchsorted(group, np.arange(bucket_count + 1))
+    return {
+        start + ROLLUP_BUCKET * i: triples[bounds[i]:bounds[i + 1]]
+        for i in range(bucket_count)
+    }
+
+
+def get_bucket_flows(zone_set: ZoneSet, bucket_starts: list[datetime]) -> list[np.ndarray]:
+    """
+    读取各时间桶的 OD 三元组：优先取分析缓存（按区域集合、时间桶和 taxiorder 数据版本），
+    未命中的时间桶合并为连续区间查询计算后写回缓存。
+    """
+    flows: dict[datetime, np.ndarray] = {}
+    store = get_cache_store() if settings.ANALYSIS_CACHE_ENABLED else None
+    keys = {}
+    if store is not None:
+        version = get_data_version("taxiorder")
+        for bucket in bucket_starts:
+            keys[bucket] = f"od-matrix:{zone_set.key}:{format_utc(bucket)}#taxiorder={version}"
+            cached = store.get(keys[bucket])
+            if cached is not None:
+                flows[bucket] = np.frombuffer(cached, dtype=np.int64).reshape(-1, 3)
+    missing = [bucket for bucket in bucket_starts if bucket not in flows]
+    for start, end in merge_bucket_ranges(missing):
+        for bucket, triples in compute_bucket_flows(zone_set, start, end).items():
+            flows[bucket] = triples
+            if store is not None:
+                store.set(keys[bucket], triples.tobytes())
+    return [flows[bucket] for bucket in bucket_starts]
+
+
+def window_buckets(start_utc: str, end_utc: str) -> list[datetime]:
+    """查询窗口覆盖的时间桶：起点向下对齐到 15 分钟，终点不含"""
+    start, end = parse_utc(start_utc), parse_utc(end_utc)
+    bucket = bucket_floor(start, int(ROLLUP_BUCKET.total_seconds() // 60))
+    buckets = []
+    while bucket < end:
+        buckets.append(bucket)
+        bucket += ROLLUP_BUCKET
+    return buckets
+
+
+def query_od_matrix(
+    zone_set: ZoneSet,
+    start_utc: str,
+    end_utc: str,
+    min_count: int = 1,
+    top_n: int | None = None,
+    coordinate_system: CoordinateSystem = "BD09",
+) -> dict[str, Any]:
+    """
+    合并查询窗口内各时间桶的 OD 三元组，返回：
+        total_orders     窗口内的订单数
+        matched_orders   上下车点都落在区域内的订单数
+        zones            出现在返回流量中的区域：zone（编号）、id、name、lat、lon（中心点）、outflow、inflow
+        flows            订单数不少于 min_count 的 OD 流量（按订单数降序，最多 top_n 条），
+                         含起终点区域编号和中心点坐标，同一区域内的出行也会返回（origin == destination）
+    zones 的 outflow / inflow 按全部匹配订单统计，不受 min_count、top_n 影响。坐标转换到 coordinate_system。
+    """
+    triples = np.concatenate(get_bucket_flows(zone_set, window_buckets(start_utc, end_utc)))
+    _, origin, destination, counts = _count_pairs(triples[:, 0], triples[:, 1], weights=triples[:, 2])
+    total_orders = int(counts.sum())
+    matched = (origin >= 0) & (destination >= 0)
+    origin, destination, counts = origin[matched], destination[matched], counts[matched]
+
+    zone_codes, zone_index = np.unique(np.concatenate([origin, destination]), return_inverse=True)
+    outflow = np.bincount(zone_index[: len(origin)], weights=counts, minlength=len(zone_codes))
+    inflow = np.bincount(zone_index[len(origin):], weights=counts, minlength=len(zone_codes))
+    keep = np.flatnonzero(counts >= min_count)
+    keep = keep[np.argsort(-counts[keep], kind="stable")][:top_n]
+    origin_index, destination_index = zone_index[: len(origin)][keep], zone_index[len(origin):][keep]
+    used = np.unique(np.concatenate([origin_index, destination_index]))
+
+    ids, names, lat, lon = zone_set.describe(zone_codes[used])
+    lat, lon = transform_coordinates(lat, lon, "WGS84", coordinate_system)
+    zones = [
+        {
+            "zone": int(zone_codes[i]),
+            "id": ids[k],
+            "name": names[k],
+            "lat": float(lat[k]),
+            "lon": float(lon[k]),
+            "outflow": int(outflow[i]),
+            "inflow": int(inflow[i]),
+        }
+        for k, i in enumerate(used)
+    ]
+    position = np.searchsorted(used, np.concatenate([origin_index, destination_index]))
+    origin_position, destination_position = position[: len(keep)], position[len(keep):]
+    flows = [
+        {
+            "origin": int(zone_codes[o]),
+            "destination": int(zone_codes[d]),
+            "count": int(counts[i]),
+            "origin_lat": float(lat[op]),
+            "origin_lon": float(lon[op]),
+            "destination_lat": float(lat[dp]),
+            "destination_lon": float(lon[dp]),
+        }
+        for i, o, d, op, dp in zip(keep, origin_index, destination_index, origin_position, destination_position)
+    ]
+    return {
+        "total_orders": total_orders,
+        "matched_orders": int(counts.sum()),
+        "zones": zones,
+        "flows": flows,
+    }
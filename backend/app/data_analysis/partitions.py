@@ -0,0 +1,107 @@
+import logging
+import re
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.data_analysis.cache import bump_data_version
+from app.data_analysis.timeutils import UTC_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# 按天（UTC）做范围分区的表及其分区键
+PARTITIONED_TABLES = {"taxiorder": "ontime", "gpsrecord": "time"}
+
+_PARTITION_NAME_RE = re.compile(r"_p(\d{8})$")
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> date | None:
+    """从分区表名中解析出日期，不是按天命名的分区返回 None"""
+    match = _PARTITION_NAME_RE.search(name)
+    return datetime.strptime(match.group(1), "%Y%m%d").date() if match else None
+
+
+def day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def ensure_partitions(cursor_or_session, table: str, days: Iterable[date]) -> None:
+    """
+    为指定日期创建分区（已存在则跳过），写入前调用。
+    cursor_or_session 可以是 SQLModel Session 或原生 DB-API 游标（COPY 导入使用）。
+    """
+    for day in sorted(set(days)):
+        start, end = day_start(day), day_start(day + timedelta(days=1))
+        statement = (
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table, day)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        if isinstance(cursor_or_session, Session):
+            cursor_or_session.execute(text(statement))
+        else:
+            cursor_or_session.execute(statement)
+
+
+def list_partitions(session: Session, table: str) -> list[tuple[str, date]]:
+    """返回表的全部按天分区 [(分区名, 日期)]，按日期升序"""
+    rows = session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    ).fetchall()
+    partitions = [(row[0], partition_day(row[0])) for row in rows]
+    return sorted((name, day) for name, day in partitions if day is not None)
+
+
+def drop_old_partitions(session: Session, table: str, retention_days: int, today: date | None = None) -> list[str]:
+    """删除早于保留期限的分区（DROP TABLE，瞬间完成），返回被删除的分区名，调用方负责提交"""
+    cutoff = (today or datetime.now(timezone.utc).date()) - timedelta(days=retention_days)
+    dropped = []
+    for name, day in list_partitions(session, table):
+        if day < cutoff:
+            session.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def maintain_partitions(today: date | None = None) -> dict[str, list[str]]:
+    """
+    分区维护：为今天起 PARTITION_PRECREATE_DAYS 天预建分区；配置了 ANALYSIS_RETENTION_DAYS 时
+    删除过期分区，并同步清理过期的订单统计汇总、热点预计算结果和速度汇总。返回每张表删除的分区。
+    """
+    today = today or datetime.now(timezone.utc).date()
+    upcoming = [today + timedelta(days=i) for i in range(settings.PARTITION_PRECREATE_DAYS)]
+    dropped: dict[str, list[str]] = {}
+    with Session(engine) as session:
+        for table in PARTITIONED_TABLES:
+            ensure_partitions(session, table, upcoming)
+            if settings.ANALYSIS_RETENTION_DAYS is not None:
+                dropped[table] = drop_old_partitions(session, table, settings.ANALYSIS_RETENTION_DAYS, today)
+        if settings.ANALYSIS_RETENTION_DAYS is not None:
+            cutoff = day_start(today - timedelta(days=settings.ANALYSIS_RETENTION_DAYS))
+        if dropped.get("taxiorder"):
+            session.execute(text("DELETE FROM taxiorder_rollup WHERE bucket_start < :cutoff"), {"cutoff": cutoff})
+            session.execute(
+                text("DELETE FROM hotspot_tile WHERE bucket_start < :cutoff"),
+                {"cutoff": cutoff.strftime(UTC_FORMAT)},
+            )
+        if dropped.get("gpsrecord"):
+            session.execute(text("DELETE FROM gpsrecord_speed_rollup WHERE bucket_start < :cutoff"), {"cutoff": cutoff})
+        session.commit()
+    for table, names in dropped.items():
+        if names:
+            logger.info("已删除 %s 的过期分区: %s", table, ", ".join(names))
+            bump_data_version(table)
+    return dropped
@@ -0,0 +1,194 @@
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.data_analysis.timeutils import bucket_floor, day_range
+
+# 汇总表的时间桶长度，1 小时等更粗的粒度由 15 分钟桶汇总得到
+ROLLUP_BUCKET = timedelta(minutes=15)
+# 所有时间桶都以该 UTC 时刻为对齐原点
+BUCKET_ORIGIN_SQL = "TIMESTAMPTZ '2000-01-01 00:00:00+00'"
+# 合理速度上限（m/s），超过视为异常数据，约 80 km/h
+MAX_VALID_SPEED_MPS = 22.22
+
+_DELETE_ROLLUP_SQL = text("""
+    DELETE FROM taxiorder_rollup WHERE bucket_start >= :start AND bucket_start < :end
+""")
+
+_INSERT_ROLLUP_SQL = text(f"""
+    INSERT INTO taxiorder_rollup (
+        bucket_start, order_count, taxi_ids, distance_count, short_count, medium_count, long_count,
+        trip_count, speed_sum, speed_count, refreshed_at
+    )
+    SELECT bucket_start,
+           COUNT(*),
+           COALESCE(array_agg(DISTINCT commaddr) FILTER (WHERE commaddr IS NOT NULL), '{{}}'),
+           COUNT(distance),
+           COUNT(*) FILTER (WHERE distance < 4000),
+           COUNT(*) FILTER (WHERE distance >= 4000 AND distance <= 8000),
+           COUNT(*) FILTER (WHERE distance > 8000),
+           COUNT(*) FILTER (WHERE duration IS NOT NULL AND distance IS NOT NULL),
+           COALESCE(SUM(speed), 0),
+           COUNT(speed),
+           now()
+    FROM (
+        SELECT date_bin(INTERVAL '15 minutes', ontime, {BUCKET_ORIGIN_SQL}) AS bucket_start,
+               commaddr,
+               distance,
+               duration,
+               CASE WHEN avg_speed <= {MAX_VALID_SPEED_MPS} THEN avg_speed END AS speed
+        FROM taxiorder
+        WHERE ontime >= :start AND ontime < :end
+    ) AS orders
+    GROUP BY bucket_start
+""")
+
+
+def merge_bucket_ranges(bucket_starts: Iterable[datetime]) -> list[tuple[datetime, datetime]]:
+    """把一组 15 分钟时间桶合并为若干连续的 [起始, 结束) 区间"""
+    ranges: list[tuple[datetime, datetime]] = []
+    for start in sorted(set(bucket_starts)):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + ROLLUP_BUCKET)
+        else:
+            ranges.append((start, start + ROLLUP_BUCKET))
+    return ranges
+
+
+def refresh_taxi_rollups(session: Session, start: datetime, end: datetime) -> None:
+    """重新计算 [start, end) 内的 15 分钟汇总行（start/end 需对齐到时间桶），调用方负责提交"""
+    params = {"start": start, "end": end}
+    session.execute(_DELETE_ROLLUP_SQL, params)
+    session.execute(_INSERT_ROLLUP_SQL, params)
+
+
+def refresh_taxi_rollups_for_buckets(bucket_starts: Iterable[datetime]) -> int:
+    """只刷新给定时间桶所在的连续区间，返回刷新的区间个数"""
+    ranges = merge_bucket_ranges(bucket_starts)
+    with Session(engine) as session:
+        for start, end in ranges:
+            refresh_taxi_rollups(session, start, end)
+        session.commit()
+    return len(ranges)
+
+
+def refresh_taxi_rollups_for_date(date: str | None = None) -> None:
+    """刷新某天（YYYYMMDD，UTC）的汇总；不指定日期时按订单表的时间范围全部重建"""
+    with Session(engine) as session:
+        if date:
+            start, end = day_range(date)
+        else:
+            bounds = session.execute(text("SELECT MIN(ontime), MAX(ontime) FROM taxiorder")).first()
+            if bounds is None or bounds[0] is None:
+                session.execute(text("DELETE FROM taxiorder_rollup"))
+                session.commit()
+                return
+            start, end = bucket_floor(bounds[0]), bucket_floor(bounds[1]) + ROLLUP_BUCKET
+            session.execute(text("DELETE FROM taxiorder_rollup WHERE bucket_start < :start OR bucket_start >= :end"),
+                            {"start": start, "end": end})
+        refresh_taxi_rollups(session, start, end)
+        session.commit()
+
+
+def query_rollup_buckets(session: Session, interval: str, date: str | None = None) -> list[dict[str, Any]]:
+    """
+    从汇总表读取每个时间桶的全部指标，interval 为 PostgreSQL interval（如 '15 minutes'、'1 hour'），
+    粗粒度的桶由 15 分钟桶汇总，载客车辆数对车辆集合去重后计数。
+    """
+    params: dict[str, Any] = {"bucket": interval}
+    where_clause = ""
+    if date:
+        params["day_start"], params["day_end"] = day_range(date)
+        where_clause = "WHERE bucket_start >= :day_start AND bucket_start < :day_end"
+    sql = text(f"""
+        WITH buckets AS (
+            SELECT date_bin(CAST(:bucket AS interval), bucket_start, {BUCKET_ORIGIN_SQL}) AS interval_start, *
+            FROM taxiorder_rollup
+            {where_clause}
+        ),
+        taxis AS (
+            SELECT interval_start, COUNT(DISTINCT taxi) AS occupied_taxi_count
+            FROM buckets, unnest(buckets.taxi_ids) AS taxi
+            GROUP BY interval_start
+        )
+        SELECT buckets.interval_start,
+               SUM(order_count),
+               COALESCE(MAX(taxis.occupied_taxi_count), 0),
+               SUM(distance_count),
+               SUM(short_count),
+               SUM(medium_count),
+               SUM(long_count),
+               SUM(trip_count),
+               SUM(speed_sum),
+               SUM(speed_count)
+        FROM buckets
+        LEFT JOIN taxis ON taxis.interval_start = buckets.interval_start
+        GROUP BY buckets.interval_start
+        ORDER BY buckets.interval_start
+    """)
+    return [
+        {
+            "interval_start": row[0],
+            "order_count": int(row[1]),
+            "occupied_taxi_count": int(row[2]),
+            "distance_count": int(row[3]),
+            "short_count": int(row[4]),
+            "medium_count": int(row[5]),
+            "long_count": int(row[6]),
+            "trip_count": int(row[7]),
+            "avg_speed_mps": float(row[8]) / int(row[9]) if row[9] else None,
+        }
+        for row in session.execute(sql, params).fetchall()
+    ]
+
+
+def query_taxiorder_buckets(session: Session, interval: str, date: str | None = None) -> list[dict[str, Any]]:
+    """
+    不经汇总表，直接在 taxiorder 上用一次分组查询算出与 query_rollup_buckets 相同的全部指标，
+    用于汇总表尚未刷新时的实时统计和结果核对。
+    """
+    params: dict[str, Any] = {"bucket": interval}
+    where_clause = "WHERE ontime IS NOT NULL"
+    if date:
+        params["day_start"], params["day_end"] = day_range(date)
+        where_clause += " AND ontime >= :day_start AND ontime < :day_end"
+    sql = text(f"""
+        SELECT interval_start,
+               COUNT(*),
+               COUNT(DISTINCT commaddr),
+               COUNT(distance),
+               COUNT(*) FILTER (WHERE distance < 4000),
+               COUNT(*) FILTER (WHERE distance >= 4000 AND distance <= 8000),
+               COUNT(*) FILTER (WHERE distance > 8000),
+               COUNT(*) FILTER (WHERE duration IS NOT NULL AND distance IS NOT NULL),
+               AVG(speed)
+        FROM (
+            SELECT date_bin(CAST(:bucket AS interval), ontime, {BUCKET_ORIGIN_SQL}) AS interval_start,
+                   commaddr,
+                   distance,
+                   duration,
+                   CASE WHEN avg_speed <= {MAX_VALID_SPEED_MPS} THEN avg_speed END AS speed
+            FROM taxiorder
+            {where_clause}
+        ) AS orders
+        GROUP BY interval_start
+        ORDER BY interval_start
+    """)
+    return [
+        {
+            "interval_start": row[0],
+            "order_count": int(row[1]),
+            "occupied_taxi_count": int(row[2]),
+            "distance_count": int(row[3]),
+            "short_count": int(row[4]),
+            "medium_count": int(row[5]),
+            "long_count": int(row[6]),
+            "trip_count": int(row[7]),
+            "avg_speed_mps": float(row[8]) if row[8] is not None else None,
+        }
+        for row in session.execute(sql, params).fetchall()
+    ]
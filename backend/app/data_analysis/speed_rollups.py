@@ -0,0 +1,345 @@
+import logging
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Any, Literal
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.data_analysis.coordinates import CoordinateSystem, transform_coordinates
+from app.data_analysis.geo import grid_cell_center
+from app.data_analysis.map_matching import (
+    RoadNetwork,
+    create_match_executor,
+    load_road_network,
+    match_track_batches,
+    resolve_workers,
+    way_segments,
+)
+from app.data_analysis.rollups import (
+    BUCKET_ORIGIN_SQL,
+    ROLLUP_BUCKET,
+    merge_bucket_ranges,
+)
+from app.data_analysis.timeutils import bucket_floor, day_range, parse_utc
+
+logger = logging.getLogger(__name__)
+
+# 汇总粒度：cell 为 0.01° 网格（gpsrecord.cell），road 为地图匹配到的 OSM way（需配置路网文件）
+SpeedLevel = Literal["cell", "road"]
+# 速度分布的区间边界（km/h），共 len + 1 个区间，最后一个区间上限为 GPS_MAX_VALID_SPEED_MPS
+SPEED_BIN_EDGES_KMH = (5, 10, 20, 30, 40, 60, 80)
+# GPS 点的 speed 字段单位为 cm/s（与 GPSRecord.speed 及前端轨迹页 speed / 100 = m/s 的换算一致）
+GPS_SPEED_UNITS_PER_MPS = 100.0
+# 合理的瞬时速度上限（m/s），约 120 km/h，超过视为异常数据
+GPS_MAX_VALID_SPEED_MPS = 33.33
+# 拥堵等级按平均速度（km/h）划分：不低于各阈值依次为 畅通、缓行、拥堵，低于最后一个阈值为严重拥堵
+CONGESTION_THRESHOLDS_KMH = (30, 20, 10)
+CONGESTION_LEVELS = ("畅通", "缓行", "拥堵", "严重拥堵")
+# 道路粒度汇总时每批送去地图匹配的车辆数
+ROAD_ROLLUP_BATCH_VEHICLES = 2000
+
+_BIN_COUNT = len(SPEED_BIN_EDGES_KMH) + 1
+_EDGES_SQL = f"ARRAY[{', '.join(str(edge) for edge in SPEED_BIN_EDGES_KMH)}]::double precision[]"
+_HISTOGRAM_SQL = "ARRAY[" + ", ".join(f"COUNT(*) FILTER (WHERE bin = {i})" for i in range(_BIN_COUNT)) + "]"
+
+_DELETE_SPEED_ROLLUP_SQL = text("""
+    DELETE FROM gpsrecord_speed_rollup WHERE level = :level AND bucket_start >= :start AND bucket_start < :end
+""")
+
+_INSERT_CELL_SPEED_ROLLUP_SQL = text(f"""
+    INSERT INTO gpsrecord_speed_rollup (level, bucket_start, segment, point_count, speed_sum, speed_histogram, refreshed_at)
+    SELECT 'cell', bucket_start, cell, COUNT(*), SUM(speed_mps), {_HISTOGRAM_SQL}, now()
+    FROM (
+        SELECT date_bin(INTERVAL '15 minutes', time, {BUCKET_ORIGIN_SQL}) AS bucket_start,
+               cell,
+               speed / {GPS_SPEED_UNITS_PER_MPS} AS speed_mps,
+               width_bucket(speed / {GPS_SPEED_UNITS_PER_MPS} * 3.6, {_EDGES_SQL}) AS bin
+        FROM gpsrecord
+        WHERE time >= :start AND time < :end
+          AND speed >= 0 AND speed / {GPS_SPEED_UNITS_PER_MPS} <= {GPS_MAX_VALID_SPEED_MPS}
+    ) AS points
+    GROUP BY bucket_start, cell
+""")
+
+# 道路粒度按车辆读取完整轨迹用于地图匹配，速度异常的点也参与匹配，只在汇总时剔除
+_ROAD_POINTS_QUERY = """
+    SELECT commaddr, EXTRACT(EPOCH FROM time)::float8, lat, lon, speed
+    FROM gpsrecord
+    WHERE time >= %(start)s AND time < %(end)s
+    ORDER BY commaddr, time
+"""
+
+
+def speed_bins(speed_mps: np.ndarray) -> np.ndarray:
+    """速度（m/s）所在的分布区间下标，与 SQL 中 width_bucket 的结果一致"""
+    return np.searchsorted(np.asarray(SPEED_BIN_EDGES_KMH, dtype=np.float64), speed_mps * 3.6, side="right")
+
+
+def refresh_cell_speed_rollups(session: Session, start: datetime, end: datetime) -> None:
+    """重新计算 [start, end) 内网格粒度的汇总行（start/end 需对齐到时间桶），调用方负责提交"""
+    params = {"level": "cell", "start": start, "end": end}
+    session.execute(_DELETE_SPEED_ROLLUP_SQL, params)
+    session.execute(_INSERT_CELL_SPEED_ROLLUP_SQL, params)
+
+
+def _vehicle_batches(cursor, batch_vehicles: int) -> Iterator[dict[str, np.ndarray]]:
+    """把按 (车牌号, 时间) 排序的查询结果按车辆分组，每 batch_vehicles 辆车产出一批 {车牌号: 行数组}"""
+    batch: dict[str, np.ndarray] = {}
+    for commaddr, rows in groupby(cursor, key=lambda row: row[0]):
+        batch[commaddr] = np.array([row[1:] for row in rows], dtype=np.float64)
+        if len(batch) >= batch_vehicles:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+
+def road_speed_rollup_rows(
+    cursor,
+    start: datetime,
+    end: datetime,
+    network: RoadNetwork,
+    workers: int | None = None,
+    executor: ProcessPoolExecutor | None = None,
+) -> list[tuple]:
+    """
+    读取 [start, end) 内的轨迹点，按车辆分批做地图匹配（executor 见 match_track_batches），
+    再按 (时间桶, OSM way) 汇总匹配成功且速度有效的点，返回待写入的汇总行
+    """
+    cursor.itersize = settings.ANALYSIS_EXPORT_BATCH_ROWS
+    cursor.execute(_ROAD_POINTS_QUERY, {"start": start, "end": end})
+    bucket_seconds = ROLLUP_BUCKET.total_seconds()
+    totals: dict[tuple[int, int], np.ndarray] = {}
+    batches = _vehicle_batches(cursor, ROAD_ROLLUP_BATCH_VEHICLES)
+    # 匹配结果与批次一一对应，批次同时保存原始行，便于按结果取时间和速度
+    pending: list[dict[str, np.ndarray]] = []
+
+    def track_batches() -> Iterator[dict[str, tuple[np.ndarray, np.ndarray]]]:
+        for batch in batches:
+            pending.append(batch)
+            yield {vehicle: (rows[:, 1], rows[:, 2]) for vehicle, rows in batch.items()}
+
+    for results in match_track_batches(track_batches(), network, workers, executor):
+        batch = pending.pop(0)
+        rows = np.concatenate([batch[vehicle] for vehicle in results])
+        way = np.concatenate([results[vehicle]["way_id"] for vehicle in results])
+        speed = rows[:, 3] / GPS_SPEED_UNITS_PER_MPS
+        valid = (way >= 0) & (speed >= 0) & (speed <= GPS_MAX_VALID_SPEED_MPS)
+        # date_bin 的原点是 15 分钟的整数倍，直接按 epoch 秒对齐
+        bucket = (np.floor(rows[valid, 0] / bucket_seconds) * bucket_seconds).astype(np.int64)
+        way, speed = way[valid], speed[valid]
+        keys, inverse = np.unique(np.stack([bucket, way], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        # 每个 (时间桶, way) 一行：点数、速度和、各区间点数
+        sums = np.zeros((len(keys), _BIN_COUNT + 2))
+        np.add.at(sums, (inverse, 0), 1)
+        np.add.at(sums, (inverse, 1), speed)
+        np.add.at(sums, (inverse, 2 + speed_bins(speed)), 1)
+        for key, values in zip(map(tuple, keys.tolist()), sums):
+            if key in totals:
+                totals[key] += values
+            else:
+                totals[key] = values
+    return [
+        (
+            "road", datetime.fromtimestamp(bucket, tz=timezone.utc), way,
+            int(values[0]), float(values[1]), [int(count) for count in values[2:]],
+        )
+        for (bucket, way), values in sorted(totals.items())
+    ]
+
+
+def refresh_road_speed_rollups(
+    start: datetime,
+    end: datetime,
+    network: RoadNetwork | None = None,
+    workers: int | None = None,
+    executor: ProcessPoolExecutor | None = None,
+) -> int:
+    """重新计算 [start, end) 内道路粒度的汇总行并提交，返回写入的行数"""
+    network = network or load_road_network()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor(name="speed_rollup_points") as cursor:
+            rows = road_speed_rollup_rows(cursor, start, end, network, workers, executor)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM gpsrecord_speed_rollup WHERE level = 'road' AND bucket_start >= %(start)s AND bucket_start < %(end)s",
+                {"start": start, "end": end},
+            )
+            with cursor.copy(
+                "COPY gpsrecord_speed_rollup (level, bucket_start, segment, point_count, speed_sum, speed_histogram, refreshed_at) "
+                "FROM STDIN"
+            ) as copy:
+                refreshed_at = datetime.now(timezone.utc)
+                for row in rows:
+                    copy.write_row((*row, refreshed_at))
+        connection.commit()
+        return len(rows)
+    finally:
+        connection.close()
+
+
+def refresh_speed_rollup_ranges(ranges: list[tuple[datetime, datetime]], workers: int | None = None) -> None:
+    """
+    刷新各 [start, end) 区间的速度汇总：网格粒度总是刷新，配置了路网文件时同时刷新道路粒度。
+    路网只加载一次，所有区间的地图匹配共用一个进程池；workers 默认取配置 ANALYSIS_MAP_MATCH_WORKERS
+    """
+    for start, end in ranges:
+        with Session(engine) as session:
+            refresh_cell_speed_rollups(session, start, end)
+            session.commit()
+    if not ranges or not settings.ANALYSIS_ROAD_NETWORK_FILE:
+        return
+    network = load_road_network()
+    workers = resolve_workers(workers)
+    with create_match_executor(network, workers) if workers > 1 else nullcontext() as executor:
+        for start, end in ranges:
+            rows = refresh_road_speed_rollups(start, end, network, workers, executor)
+            logger.info("道路速度汇总 %s ~ %s：写入 %d 行", start, end, rows)
+
+
+def refresh_speed_rollups(start: datetime, end: datetime) -> None:
+    """刷新 [start, end) 内的速度汇总，见 refresh_speed_rollup_ranges"""
+    refresh_speed_rollup_ranges([(start, end)])
+
+
+def refresh_speed_rollups_for_buckets(bucket_starts: Iterable[datetime], workers: int | None = None) -> int:
+    """只刷新给定时间桶所在的连续区间，返回刷新的区间个数"""
+    ranges = merge_bucket_ranges(bucket_starts)
+    refresh_speed_rollup_ranges(ranges, workers)
+    return len(ranges)
+
+
+def refresh_speed_rollups_for_date(date: str | None = None) -> None:
+    """刷新某天（YYYYMMDD，UTC）的速度汇总；不指定日期时按轨迹表的时间范围逐天全部重建"""
+    if date:
+        refresh_speed_rollups(*day_range(date))
+        return
+    with Session(engine) as session:
+        bounds = session.execute(text("SELECT MIN(time), MAX(time) FROM gpsrecord")).first()
+        if bounds is None or bounds[0] is None:
+            session.execute(text("DELETE FROM gpsrecord_speed_rollup"))
+            session.commit()
+            return
+        start, end = bucket_floor(bounds[0]), bucket_floor(bounds[1]) + ROLLUP_BUCKET
+        session.execute(
+            text("DELETE FROM gpsrecord_speed_rollup WHERE bucket_start < :start OR bucket_start >= :end"),
+            {"start": start, "end": end},
+        )
+        session.commit()
+    # 逐天刷新，道路粒度匹配时只需在内存中保留一天的汇总结果
+    days, day = [], start
+    while day < end:
+        days.append((day, min(day + timedelta(days=1), end)))
+        day += timedelta(days=1)
+    refresh_speed_rollup_ranges(days)
+
+
+def histogram_percentiles(histograms: np.ndarray, quantiles: Iterable[float]) -> np.ndarray:
+    """
+    由各行的速度区间点数估计分位数（km/h），区间内按均匀分布线性插值，
+    返回形状为 (行数, 分位数个数) 的数组
+    """
+    upper = np.append(SPEED_BIN_EDGES_KMH, GPS_MAX_VALID_SPEED_MPS * 3.6).astype(np.float64)
+    lower = np.concatenate([[0.0], upper[:-1]])
+    cumulative = np.cumsum(histograms, axis=1)
+    totals = np.maximum(cumulative[:, -1:], 1)
+    result = []
+    for quantile in quantiles:
+        target = quantile * totals
+        index = np.minimum((cumulative < target).sum(axis=1), len(upper) - 1)
+        rows = np.arange(len(histograms))
+        before = np.where(index > 0, cumulative[rows, index - 1], 0)
+        inside = np.maximum(histograms[rows, index], 1)
+        fraction = np.clip((target[:, 0] - before) / inside, 0.0, 1.0)
+        result.append(lower[index] + fraction * (upper[index] - lower[index]))
+    return np.stack(result, axis=1) if result else np.zeros((len(histograms), 0))
+
+
+def congestion_levels(avg_speed_kmh: np.ndarray) -> np.ndarray:
+    """平均速度对应的拥堵等级下标（见 CONGESTION_LEVELS）"""
+    return (avg_speed_kmh[:, None] < np.asarray(CONGESTION_THRESHOLDS_KMH)[None, :]).sum(axis=1)
+
+
+def query_speed_heatmap(
+    session: Session,
+    level: SpeedLevel,
+    start_utc: str,
+    end_utc: str,
+    min_points: int = 1,
+    coordinate_system: CoordinateSystem = "WGS84",
+) -> list[dict[str, Any]]:
+    """
+    从汇总表读取时间范围内各路段的速度分布，起始时间向下对齐到 15 分钟时间桶，结束时间不含。
+    每个路段返回点数、平均速度、中位数和 85 分位速度（km/h，由分布估计）和拥堵等级，
+    网格给出中心坐标；道路给出名称、各段几何 path 和几何中心坐标（需加载路网）。
+    """
+    params = {
+        "level": level,
+        "start": bucket_floor(parse_utc(start_utc)),
+        "end": parse_utc(end_utc),
+        "min_points": min_points,
+    }
+    histogram_sql = ", ".join(f"SUM(speed_histogram[{i + 1}])" for i in range(_BIN_COUNT))
+    rows = session.execute(text(f"""
+        SELECT segment, SUM(point_count), SUM(speed_sum), {histogram_sql}
+        FROM gpsrecord_speed_rollup
+        WHERE level = :level AND bucket_start >= :start AND bucket_start < :end
+        GROUP BY segment
+        HAVING SUM(point_count) >= :min_points
+        ORDER BY segment
+    """), params).fetchall()
+    if not rows:
+        return []
+    segments = np.array([row[0] for row in rows], dtype=np.int64)
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+    paths = None
+    if level == "cell":
+        lat, lon = transform_coordinates(*grid_cell_center(segments), "WGS84", coordinate_system)
+    else:
+        network = load_road_network()
+        ways, path_lat, path_lon = way_segments(network, segments.tolist())
+        path_lat, path_lon = transform_coordinates(path_lat, path_lon, "WGS84", coordinate_system)
+        first, last = np.searchsorted(ways, segments), np.searchsorted(ways, segments, side="right")
+        # 更换路网文件后已不存在的 way 无法绘制，直接跳过
+        present = last > first
+        segments, values, first, last = segments[present], values[present], first[present], last[present]
+        # 几何中心取各段中点按段数的平均
+        midpoint_lat = np.concatenate([[0.0], np.cumsum(path_lat.mean(axis=1))])
+        midpoint_lon = np.concatenate([[0.0], np.cumsum(path_lon.mean(axis=1))])
+        lat = (midpoint_lat[last] - midpoint_lat[first]) / (last - first)
+        lon = (midpoint_lon[last] - midpoint_lon[first]) / (last - first)
+        paths = np.stack([path_lat, path_lon], axis=2)
+    avg_speed = values[:, 1] / values[:, 0] * 3.6
+    percentiles = histogram_percentiles(values[:, 2:], (0.5, 0.85))
+    levels = congestion_levels(avg_speed)
+    items = [
+        {
+            "segment": segment,
+            "lat": row_lat,
+            "lon": row_lon,
+            "point_count": int(row[0]),
+            "avg_speed_kmh": speed,
+            "median_speed_kmh": median,
+            "p85_speed_kmh": p85,
+            "congestion_level": congestion,
+            "congestion": CONGESTION_LEVELS[congestion],
+        }
+        for segment, row_lat, row_lon, row, speed, (median, p85), congestion in zip(
+            segments.tolist(), lat.tolist(), lon.tolist(), values, avg_speed.tolist(),
+            percentiles.tolist(), levels.tolist()
+        )
+    ]
+    if paths is not None:
+        for item, start, stop in zip(items, first.tolist(), last.tolist()):
+            item["road_name"] = network.way_names.get(item["segment"])
+            item["path"] = paths[start:stop].tolist()
+    return items
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+# 数据中 UTC 时间字符串的格式
+UTC_FORMAT = "%Y%m%d%H%M%S"
+
+
+def parse_utc(utc_str: str) -> datetime:
+    """把 YYYYMMDDHHMMSS 字符串解析为带 UTC 时区的 datetime，用于查询 timestamptz 列"""
+    return datetime.strptime(utc_str, UTC_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def format_utc(dt: datetime) -> str:
+    """把 datetime 格式化为 UTC 的 YYYYMMDDHHMMSS 字符串"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime(UTC_FORMAT)
+
+
+def bucket_floor(dt: datetime, minutes: int = 15) -> datetime:
+    """把时间向下对齐到 minutes 分钟的时间桶起点"""
+    return dt.replace(minute=dt.minute - dt.minute % minutes, second=0, microsecond=0)
+
+
+def day_range(date: str) -> tuple[datetime, datetime]:
+    """返回某天（YYYYMMDD，UTC）的 [起始, 结束) 时间"""
+    day_start = datetime.strptime(date, "%Y%m%d").replace(tzinfo=timezone.utc)
+    return day_start, day_start + timedelta(days=1)
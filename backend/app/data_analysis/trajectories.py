@@ -0,0 +1,427 @@
+import heapq
+from itertools import groupby
+from typing import Any, Literal
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.data_analysis.coordinates import CoordinateSystem, transform_coordinates
+from app.data_analysis.geo import METRES_PER_DEGREE_LAT, haversine_m
+from app.data_analysis.timeutils import parse_utc
+from app.models import GPSRecord
+
+# 轨迹平滑方式：不平滑、居中滑动平均、匀速模型卡尔曼滤波
+SmoothMethod = Literal["none", "moving_average", "kalman"]
+# 去噪时计算两点距离使用的地球半径（米），与原逐点实现一致
+NOISE_EARTH_RADIUS_M = 6371000
+# 卡尔曼滤波的定位误差标准差（米）与加速度扰动标准差（m/s²）
+KALMAN_MEASUREMENT_NOISE_M = 15.0
+KALMAN_ACCELERATION_NOISE = 2.0
+# 轨迹抽稀算法：不抽稀、Douglas–Peucker（按偏离距离）、Visvalingam–Whyatt（按三角形面积）
+SimplifyMethod = Literal["none", "douglas_peucker", "visvalingam"]
+# 未指定容差和缩放级别时的抽稀容差（米）
+SIMPLIFY_DEFAULT_TOLERANCE_M = 10.0
+# 按缩放级别换算容差时允许的偏差（像素），百度地图 18 级下 1 像素约 1 米，每升一级分辨率减半
+SIMPLIFY_PIXEL_TOLERANCE = 2.0
+# 停留：某点之后 STOP_MIN_SECONDS 秒的位置与该点相距不超过 STOP_RADIUS_M，重叠的停留窗口合并为一个停留区段
+STOP_RADIUS_M = 30.0
+STOP_MIN_SECONDS = 120.0
+
+# 批量轨迹查询一次最多返回的车辆数
+FLEET_MAX_VEHICLES = 500
+
+# 轨迹接口返回的列，均在 uq_gpsrecord_commaddr_time 索引中（键列或 INCLUDE 列）
+TRACK_COLUMNS = (
+    GPSRecord.id,
+    GPSRecord.commaddr,
+    GPSRecord.utc,
+    GPSRecord.lat,
+    GPSRecord.lon,
+    GPSRecord.head,
+    GPSRecord.speed,
+    GPSRecord.tflag,
+)
+
+
+def get_vehicle_track(commaddr: str, start_utc: str, end_utc: str) -> list[dict[str, Any]]:
+    """
+    查询车辆在 [start_utc, end_utc] 内的轨迹点，按时间升序。
+    按分区键 time 过滤以裁剪分区，只选取需要的列，走覆盖索引的仅索引扫描，不构造 ORM 对象。
+    """
+    statement = (
+        select(*TRACK_COLUMNS)
+        .where(
+            GPSRecord.commaddr == commaddr,
+            GPSRecord.time >= parse_utc(start_utc),
+            GPSRecord.time <= parse_utc(end_utc),
+        )
+        .order_by(GPSRecord.time)
+    )
+    with Session(engine) as session:
+        return [dict(row) for row in session.execute(statement).mappings()]
+
+
+def get_fleet_tracks(
+    start_utc: str,
+    end_utc: str,
+    commaddrs: list[str] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+    max_vehicles: int = FLEET_MAX_VEHICLES,
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    一次查询多辆车在 [start_utc, end_utc] 内的轨迹，返回 {车牌号: 按时间升序的轨迹点}。
+    车辆由 commaddrs 指定，或取时间范围内在 bbox=(最小纬度, 最小经度, 最大纬度, 最大经度) 中出现过的车辆
+    （返回其完整轨迹），均按车牌号排序取前 max_vehicles 辆。
+    结果行数较多，直接用驱动游标读取元组，不经过 ORM 结果处理。
+    """
+    params: dict[str, Any] = {"start": parse_utc(start_utc), "end": parse_utc(end_utc), "limit": max_vehicles}
+    if commaddrs is not None:
+        vehicles = "%(commaddrs)s::varchar[]"
+        params["commaddrs"] = sorted(set(commaddrs))[:max_vehicles]
+    elif bbox is not None:
+        vehicles = (
+            "ARRAY(SELECT DISTINCT commaddr FROM gpsrecord "
+            "WHERE time >= %(start)s AND time <= %(end)s "
+            "AND lat BETWEEN %(min_lat)s AND %(max_lat)s AND lon BETWEEN %(min_lon)s AND %(max_lon)s "
+            "ORDER BY commaddr LIMIT %(limit)s)"
+        )
+        params.update(zip(("min_lat", "min_lon", "max_lat", "max_lon"), bbox))
+    else:
+        raise ValueError("需要指定车牌号列表或经纬度范围")
+    names = [column.key for column in TRACK_COLUMNS]
+    query = (
+        f"SELECT {', '.join(names)} FROM gpsrecord "
+        f"WHERE commaddr = ANY({vehicles}) AND time >= %(start)s AND time <= %(end)s "
+        "ORDER BY commaddr, time"
+    )
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            points = (dict(zip(names, row)) for row in cursor)
+            return {
+                commaddr: list(vehicle_points)
+                for commaddr, vehicle_points in groupby(points, key=lambda point: point["commaddr"])
+            }
+    finally:
+        connection.close()
+
+
+def transform_points(points: list[dict[str, Any]], to_system: CoordinateSystem) -> list[dict[str, Any]]:
+    """把 WGS84 轨迹点的 lat/lon 原地转换到 to_system，所有点一次性向量化转换"""
+    if to_system == "WGS84" or not points:
+        return points
+    lats, lons = transform_coordinates(
+        np.fromiter((point["lat"] for point in points), dtype=np.float64, count=len(points)),
+        np.fromiter((point["lon"] for point in points), dtype=np.float64, count=len(points)),
+        from_system="WGS84",
+        to_system=to_system,
+    )
+    for point, lat, lon in zip(points, lats.tolist(), lons.tolist()):
+        point["lat"], point["lon"] = lat, lon
+    return points
+
+
+def track_columns(points: list[dict[str, Any]]) -> dict[str, np.ndarray]:
+    """
+    把轨迹点转换为按列编码响应使用的数值列：utc 换成 epoch 秒 time（float64，无法解析为 NaN），
+    车牌号对整条轨迹相同，由调用方放入元数据
+    """
+    count = len(points)
+    columns = {"id": np.fromiter((point["id"] for point in points), dtype=np.int64, count=count)}
+    columns["time"] = track_seconds(points) if count else np.zeros(0)
+    for name in ("lat", "lon", "head", "speed"):
+        columns[name] = np.fromiter((point[name] for point in points), dtype=np.float64, count=count)
+    columns["tflag"] = np.fromiter((point["tflag"] for point in points), dtype=np.int32, count=count)
+    return columns
+
+
+def track_seconds(points: list[dict[str, Any]]) -> np.ndarray:
+    """
+    把轨迹点的 utc 字符串（YYYYMMDDHHMMSS）解析为 epoch 秒数组，格式或取值非法的为 NaN。
+    按定宽数字串整体解析，不逐个调用 strptime。
+    """
+    utc = np.array([point["utc"] for point in points], dtype="U15")
+    codes = utc.view(np.uint32).reshape(len(utc), 15).astype(np.int64) - ord("0")
+    valid = (np.char.str_len(utc) == 14) & ((codes[:, :14] >= 0) & (codes[:, :14] <= 9)).all(axis=1)
+    digits = np.where(valid[:, None], codes[:, :14], 0)
+
+    def field(start: int, width: int) -> np.ndarray:
+        return digits[:, start:start + width] @ (10 ** np.arange(width - 1, -1, -1))
+
+    year, month, day = field(0, 4), field(4, 2), field(6, 2)
+    hour, minute, second = field(8, 2), field(10, 2), field(12, 2)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (hour <= 23) & (minute <= 59) & (second <= 59)
+    months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (np.maximum(day, 1) - 1)
+    # 日期超出当月天数（如 0230）时会进位到下个月
+    valid &= days.astype("datetime64[M]") == months
+    seconds = days.astype(np.int64) * 86400 + hour * 3600 + minute * 60 + second
+    return np.where(valid, seconds.astype(np.float64), np.nan)
+
+
+def noise_mask(
+    seconds: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    speed: np.ndarray,
+    max_speed: float = 50.0,
+    max_acceleration: float = 10.0,
+) -> np.ndarray:
+    """
+    返回保留轨迹点的布尔掩码。每个点与原始序列中的前一个点比较：
+    时间不递增、折算速度超过 max_speed（km/h）或加速度超过 max_acceleration（m/s²）的点被剔除，
+    第一个点总是保留。加速度检查从第二个被保留的点之后才生效，与逐点实现的结果一致。
+    """
+    keep = np.ones(len(lat), dtype=bool)
+    if len(lat) < 2:
+        return keep
+    # 时间无法解析时按间隔 1 秒处理
+    time_diff = np.nan_to_num(np.diff(seconds), nan=1.0)
+    positive = time_diff > 0
+    safe_diff = np.where(positive, time_diff, 1.0)
+    actual_speed = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:], NOISE_EARTH_RADIUS_M) / safe_diff
+    base_ok = positive & (actual_speed * 3.6 <= max_speed)
+    acceleration_ok = np.abs(actual_speed - speed[:-1] / 100) / safe_diff <= max_acceleration
+    kept = np.flatnonzero(base_ok)
+    if len(kept):
+        # 在第一个被保留的点（不含）之前只有首点，不检查加速度
+        acceleration_ok[: kept[0] + 1] = True
+    keep[1:] = base_ok & acceleration_ok
+    return keep
+
+
+def moving_average(values: np.ndarray, window_size: int = 3) -> np.ndarray:
+    """居中滑动平均，边缘处窗口截断；基于累积和，O(n) 与窗口大小无关"""
+    n = len(values)
+    half = window_size // 2
+    cumsum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    index = np.arange(n)
+    lo = np.maximum(index - half, 0)
+    hi = np.minimum(index + half + 1, n)
+    return (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def local_metres(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """以首点为原点把经纬度投影到局部平面坐标（东, 北），单位米，城市范围内误差可忽略"""
+    metres_per_degree_lon = METRES_PER_DEGREE_LAT * np.cos(np.radians(lat[0]))
+    return (lon - lon[0]) * metres_per_degree_lon, (lat - lat[0]) * METRES_PER_DEGREE_LAT
+
+
+def kalman_smooth(
+    seconds: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    measurement_noise_m: float = KALMAN_MEASUREMENT_NOISE_M,
+    acceleration_noise: float = KALMAN_ACCELERATION_NOISE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    匀速模型卡尔曼滤波，在以首点为原点的局部平面坐标（米）上进行。
+    东、北两个方向的协方差只取决于时间间隔，二者共用一套增益，逐点递推一次。
+    """
+    n = len(lat)
+    if n < 2:
+        return lat.copy(), lon.copy()
+    metres_per_degree_lon = METRES_PER_DEGREE_LAT * np.cos(np.radians(lat[0]))
+    east, north = (values.tolist() for values in local_metres(lat, lon))
+    time_diff = np.nan_to_num(np.diff(seconds), nan=1.0).clip(min=0.0).tolist()
+    r = measurement_noise_m ** 2
+    q = acceleration_noise ** 2
+    x_e, x_n, v_e, v_n = east[0], north[0], 0.0, 0.0
+    p00, p01, p11 = r, 0.0, r
+    out_e, out_n = [x_e], [x_n]
+    for i in range(1, n):
+        dt = time_diff[i - 1]
+        # 预测
+        x_e += v_e * dt
+        x_n += v_n * dt
+        dt2 = dt * dt
+        p00 += 2 * dt * p01 + dt2 * p11 + q * dt2 * dt2 / 4
+        p01 += dt * p11 + q * dt2 * dt / 2
+        p11 += q * dt2
+        # 更新
+        s = p00 + r
+        k0, k1 = p00 / s, p01 / s
+        innovation_e, innovation_n = east[i] - x_e, north[i] - x_n
+        x_e += k0 * innovation_e
+        x_n += k0 * innovation_n
+        v_e += k1 * innovation_e
+        v_n += k1 * innovation_n
+        p00, p01, p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+        out_e.append(x_e)
+        out_n.append(x_n)
+    return (
+        lat[0] + np.asarray(out_n) / METRES_PER_DEGREE_LAT,
+        lon[0] + np.asarray(out_e) / metres_per_degree_lon,
+    )
+
+
+def zoom_tolerance_m(zoom: int) -> float:
+    """百度地图缩放级别对应的抽稀容差（米），使抽稀偏差在屏幕上不超过 SIMPLIFY_PIXEL_TOLERANCE 像素"""
+    return SIMPLIFY_PIXEL_TOLERANCE * 2.0 ** (18 - zoom)
+
+
+def simplify_tolerance_m(tolerance_m: float | None = None, zoom: int | None = None) -> float:
+    """确定抽稀容差：优先按地图缩放级别换算，其次使用显式容差，都未指定时取默认值"""
+    if zoom is not None:
+        return zoom_tolerance_m(zoom)
+    return tolerance_m if tolerance_m is not None else SIMPLIFY_DEFAULT_TOLERANCE_M
+
+
+def stop_point_mask(seconds: np.ndarray, east: np.ndarray, north: np.ndarray) -> np.ndarray:
+    """
+    标记停留区段的首末点。只比较窗口两端的位置，不受区段内定位漂移影响；
+    采样稀疏（间隔超过 STOP_MIN_SECONDS）时相邻两点几乎不动即视为停留。
+    """
+    n = len(east)
+    stops = np.zeros(n, dtype=bool)
+    if n < 2:
+        return stops
+    # 时间无法解析的点沿用前一个有效时间
+    filled = np.fmax.accumulate(np.nan_to_num(seconds, nan=-np.inf))
+    ends = np.searchsorted(filled, filled + STOP_MIN_SECONDS, side="left")
+    starts = np.flatnonzero(ends < n)
+    ends = ends[starts]
+    still = np.hypot(east[ends] - east[starts], north[ends] - north[starts]) <= STOP_RADIUS_M
+    starts, ends = starts[still], ends[still]
+    # 差分数组标记被停留窗口覆盖的点，连续覆盖的点构成一个停留区段
+    coverage = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(coverage, starts, 1)
+    np.add.at(coverage, ends + 1, -1)
+    covered = np.cumsum(coverage[:n]) > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], covered, [False])).astype(np.int8)))
+    stops[edges[0::2]] = True
+    stops[edges[1::2] - 1] = True
+    return stops
+
+
+def _segment_distances(east: np.ndarray, north: np.ndarray, start: int, end: int) -> np.ndarray:
+    """点 start+1..end-1 到线段 (start, end) 的距离"""
+    ax, ay = east[start], north[start]
+    dx, dy = east[end] - ax, north[end] - ay
+    px, py = east[start + 1:end] - ax, north[start + 1:end] - ay
+    length2 = dx * dx + dy * dy
+    t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0) if length2 > 0 else np.zeros(len(px))
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def douglas_peucker_mask(east: np.ndarray, north: np.ndarray, tolerance_m: float, fixed: np.ndarray) -> np.ndarray:
+    """
+    Douglas–Peucker 抽稀，用显式栈代替递归，每段内的点到线段距离一次性向量化计算。
+    fixed 为必须保留的点（首末点、停留点），其间的各段分别抽稀。
+    """
+    keep = fixed.copy()
+    anchors = np.flatnonzero(fixed).tolist()
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(east, north, start, end)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+
+def _triangle_areas(east: np.ndarray, north: np.ndarray, prev: np.ndarray, curr: np.ndarray, nxt: np.ndarray) -> np.ndarray:
+    """以 prev、curr、nxt 为顶点的三角形面积，逐元素计算"""
+    return np.abs(
+        (east[curr] - east[prev]) * (north[nxt] - north[prev]) - (east[nxt] - east[prev]) * (north[curr] - north[prev])
+    ) / 2
+
+
+def visvalingam_mask(east: np.ndarray, north: np.ndarray, tolerance_m: float, fixed: np.ndarray) -> np.ndarray:
+    """
+    Visvalingam–Whyatt 抽稀：反复删除与相邻点构成三角形面积最小的点，直到最小面积不小于 tolerance_m²。
+    初始面积向量化计算，删除过程用堆和前后指针，fixed 中的点不参与删除。
+    """
+    n = len(east)
+    keep = np.ones(n, dtype=bool)
+    if n < 3:
+        return keep
+    threshold = tolerance_m ** 2
+    prev = np.arange(-1, n - 1)
+    nxt = np.arange(1, n + 1)
+    index = np.arange(1, n - 1)
+    areas = np.full(n, np.inf)
+    areas[index] = _triangle_areas(east, north, index - 1, index, index + 1)
+    areas[fixed] = np.inf
+    heap = [(area, i) for i, area in zip(index.tolist(), areas[index].tolist()) if area < threshold]
+    heapq.heapify(heap)
+    prev_list, next_list, area_list = prev.tolist(), nxt.tolist(), areas.tolist()
+    xs, ys = east.tolist(), north.tolist()
+    while heap:
+        area, i = heapq.heappop(heap)
+        if not keep[i] or area != area_list[i]:
+            continue
+        keep[i] = False
+        before, after = prev_list[i], next_list[i]
+        next_list[before], prev_list[after] = after, before
+        for j in (before, after):
+            if area_list[j] == np.inf:
+                continue
+            a, c = prev_list[j], next_list[j]
+            new_area = abs((xs[j] - xs[a]) * (ys[c] - ys[a]) - (xs[c] - xs[a]) * (ys[j] - ys[a])) / 2
+            # 面积不小于刚删除点的面积，保证删除顺序单调
+            new_area = max(new_area, area)
+            area_list[j] = new_area
+            if new_area < threshold:
+                heapq.heappush(heap, (new_area, j))
+    return keep
+
+
+def simplify_mask(
+    seconds: np.ndarray, lat: np.ndarray, lon: np.ndarray, tolerance_m: float, method: SimplifyMethod
+) -> np.ndarray:
+    """返回抽稀后保留点的布尔掩码，始终保留首末点和停留区段的首末点"""
+    east, north = local_metres(lat, lon)
+    fixed = stop_point_mask(seconds, east, north)
+    fixed[[0, -1]] = True
+    if method == "douglas_peucker":
+        return douglas_peucker_mask(east, north, tolerance_m, fixed)
+    return visvalingam_mask(east, north, tolerance_m, fixed)
+
+
+def clean_track(
+    points: list[dict[str, Any]],
+    denoise: bool = False,
+    max_speed: float = 50.0,
+    max_acceleration: float = 10.0,
+    smooth: SmoothMethod = "none",
+    window_size: int = 3,
+    simplify: SimplifyMethod = "none",
+    tolerance_m: float = SIMPLIFY_DEFAULT_TOLERANCE_M,
+) -> list[dict[str, Any]]:
+    """对按时间排序的轨迹点依次做去噪、平滑和抽稀，返回新的点列表（平滑只改写 lat/lon）"""
+    if len(points) < 2 or (not denoise and smooth == "none" and simplify == "none"):
+        return points
+    lat = np.fromiter((point["lat"] for point in points), dtype=np.float64, count=len(points))
+    lon = np.fromiter((point["lon"] for point in points), dtype=np.float64, count=len(points))
+    seconds = track_seconds(points) if denoise or smooth == "kalman" or simplify != "none" else None
+    if denoise:
+        speed = np.fromiter((point["speed"] for point in points), dtype=np.float64, count=len(points))
+        keep = noise_mask(seconds, lat, lon, speed, max_speed, max_acceleration)
+        points = [point for point, kept in zip(points, keep.tolist()) if kept]
+        lat, lon, seconds = lat[keep], lon[keep], seconds[keep]
+    smoothed = True
+    if smooth == "moving_average" and len(points) >= window_size:
+        lat, lon = moving_average(lat, window_size), moving_average(lon, window_size)
+    elif smooth == "kalman":
+        lat, lon = kalman_smooth(seconds, lat, lon)
+    else:
+        smoothed = False
+    if simplify != "none" and len(points) > 2:
+        keep = simplify_mask(seconds, lat, lon, tolerance_m, simplify)
+        points = [point for point, kept in zip(points, keep.tolist()) if kept]
+        lat, lon = lat[keep], lon[keep]
+    if not smoothed:
+        return points
+    return [
+        {**point, "lat": new_lat, "lon": new_lon}
+        for point, new_lat, new_lon in zip(points, lat.tolist(), lon.tolist())
+    ]
@@ -0,0 +1,127 @@
+"""
+订单行程指标：
+    distance   行驶距离（米）。导入时按上下车点的球面距离计算；有该车行程时间内的 GPS 轨迹时，
+               回填任务改用 上车点 -> 轨迹点 -> 下车点 折线的长度（不小于直线距离，更接近实际里程）
+    duration   行程时长（秒），taxiorder 的数据库生成列
+    avg_speed  平均速度（m/s），distance / duration，taxiorder 的数据库生成列，随 distance 的更新自动重算
+统计汇总直接读取 duration 和 avg_speed，不再在每次查询时重新计算。
+"""
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.data_analysis.geo import haversine_sql
+from app.data_analysis.rollups import merge_bucket_ranges, refresh_taxi_rollups
+from app.data_analysis.timeutils import day_range, format_utc
+
+# 行程时间内至少有这么多个轨迹点时才用轨迹长度作为行驶距离
+TRACK_DISTANCE_MIN_POINTS = 3
+# 查找行程轨迹点时，轨迹时间范围比上车时间范围向后延长的时长，需覆盖最长的单次行程
+TRACK_MAX_TRIP_DURATION = timedelta(hours=6)
+
+_FILL_HAVERSINE_SQL = text(f"""
+    UPDATE taxiorder
+    SET distance = {haversine_sql("onlat", "onlon", "offlat", "offlon")}
+    WHERE ontime >= :start AND ontime < :end AND (distance IS NULL OR :overwrite)
+""")
+
+# 按行程时间把订单与同一车辆的轨迹点关联（走 gpsrecord (commaddr, time) 覆盖索引），
+# 每段距离为相邻轨迹点的球面距离，第一段从上车点起、最后一段到下车点止
+_FILL_TRACK_SQL = text(f"""
+    WITH points AS (
+        SELECT o.commaddr,
+               o.ontime,
+               o.offlat,
+               o.offlon,
+               g.time,
+               g.lat,
+               g.lon,
+               COALESCE(lag(g.lat) OVER trip, o.onlat) AS prev_lat,
+               COALESCE(lag(g.lon) OVER trip, o.onlon) AS prev_lon
+        FROM taxiorder o
+        JOIN gpsrecord g ON g.commaddr = o.commaddr AND g.time >= o.ontime AND g.time <= o.offtime
+        WHERE o.ontime >= :start AND o.ontime < :end AND o.offtime > o.ontime
+          AND g.time >= :start AND g.time < :track_end
+        WINDOW trip AS (PARTITION BY o.commaddr, o.ontime ORDER BY g.time)
+    ),
+    tracks AS (
+        SELECT commaddr,
+               ontime,
+               SUM({haversine_sql("prev_lat", "prev_lon", "lat", "lon")})
+                   + {haversine_sql("(array_agg(lat ORDER BY time DESC))[1]", "(array_agg(lon ORDER BY time DESC))[1]",
+                                    "offlat", "offlon")} AS length
+        FROM points
+        GROUP BY commaddr, ontime, offlat, offlon
+        HAVING COUNT(*) >= :min_points
+    )
+    UPDATE taxiorder
+    SET distance = tracks.length
+    FROM tracks
+    WHERE taxiorder.commaddr = tracks.commaddr AND taxiorder.ontime = tracks.ontime
+      AND taxiorder.ontime >= :start AND taxiorder.ontime < :end
+""")
+
+
+def fill_haversine_distances(session: Session, start: datetime, end: datetime, overwrite: bool = False) -> int:
+    """
+    把 [start, end) 内上车的订单的行驶距离设为上下车点的球面距离，默认只填充为空的距离。
+    调用方负责提交，返回更新的订单数。
+    """
+    result = session.execute(_FILL_HAVERSINE_SQL, {"start": start, "end": end, "overwrite": overwrite})
+    return result.rowcount
+
+
+def fill_track_distances(session: Session, start: datetime, end: datetime) -> int:
+    """
+    用行程时间内的 GPS 轨迹长度更新 [start, end) 内上车的订单的行驶距离，
+    轨迹点不足 TRACK_DISTANCE_MIN_POINTS 个的订单保持不变。调用方负责提交，返回更新的订单数。
+    """
+    params = {
+        "start": start,
+        "end": end,
+        "track_end": end + TRACK_MAX_TRIP_DURATION,
+        "min_points": TRACK_DISTANCE_MIN_POINTS,
+    }
+    return session.execute(_FILL_TRACK_SQL, params).rowcount
+
+
+def backfill_trip_distances(date: str | None = None, use_tracks: bool = True, overwrite: bool = False) -> dict[str, int]:
+    """
+    回填某天（YYYYMMDD，UTC）订单的行驶距离，不指定日期时按订单表的时间范围逐天回填：
+    先用球面距离填充（overwrite 为真时覆盖已有距离），use_tracks 为真时再用轨迹长度更新。
+    每天单独提交并重新计算该天的统计汇总。返回按球面距离和轨迹长度更新的订单数。
+    """
+    counts = {"haversine": 0, "track": 0}
+    if date:
+        days = [day_range(date)]
+    else:
+        with Session(engine) as session:
+            bounds = session.execute(text("SELECT MIN(ontime), MAX(ontime) FROM taxiorder")).first()
+        if bounds is None or bounds[0] is None:
+            return counts
+        first_day, last_day = format_utc(bounds[0])[:8], format_utc(bounds[1])[:8]
+        day, days = day_range(first_day)[0], []
+        while day <= day_range(last_day)[0]:
+            days.append((day, day + timedelta(days=1)))
+            day += timedelta(days=1)
+    for start, end in days:
+        with Session(engine) as session:
+            counts["haversine"] += fill_haversine_distances(session, start, end, overwrite)
+            if use_tracks:
+                counts["track"] += fill_track_distances(session, start, end)
+            refresh_taxi_rollups(session, start, end)
+            session.commit()
+    return counts
+
+
+def fill_track_distances_for_buckets(bucket_starts: Iterable[datetime]) -> int:
+    """导入订单后只对受影响的时间桶所在的连续区间用轨迹长度更新行驶距离，返回更新的订单数"""
+    updated = 0
+    with Session(engine) as session:
+        for start, end in merge_bucket_ranges(bucket_starts):
+            updated += fill_track_distances(session, start, end)
+        session.commit()
+    return updated
@@ -5,17 +5,25 @@ import cv2
 import numpy as np
 import psycopg2
 import requests
-from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
 from psycopg2 import sql
 from sympy import false
 from ultralytics import YOLO
 import os
 import face_recognition
-from face_recognition import compare_faces, face_distance
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
 
+from app.core.crypto import (
+    decrypt_data,
+    decrypt_many,
+    encrypt_data,
+    encrypt_image,
+    generate_aes_key,
+    image_payload_base64,
+    image_payload_bytes,
+)
+from app.faceRecognition.encoders import get_encoder
+
 # 人脸识别相关配置
 FACE_RECOGNITION_DB_NAME: str = "app"  # 人脸识别数据库名
 FACE_RECOGNITION_DB_USER: str = "postgres"  # 数据库用户名
@@ -24,33 +32,11 @@ FACE_RECOGNITION_DB_HOST: str = "113.47.146.57"  # 数据库主机地址
 FACE_RECOGNITION_DB_PORT: int = 5432  # 数据库端口
 FACE_RECOGNITION_BAIDU_API_AK: str = "ljtg9cD9vyKglyTstICBvkYd"
 FACE_RECOGNITION_BAIDU_API_SK: str = "hiIblcdunkv7e7fQeAf9V0LDXjTaDcWA"
+FACE_DETECTION_MAX_EDGE: int = int(os.getenv("FACE_DETECTION_MAX_EDGE", "1280"))  # 人脸检测时图像长边上限（像素），0 表示不缩放
 
-# 生成 AES 密钥
-def generate_aes_key():
-    return get_random_bytes(16)  # AES-128 使用 16 字节密钥
-
-# 加密数据
-def encrypt_data(data, key):
-    cipher = AES.new(key, AES.MODE_EAX)
-    nonce = cipher.nonce
-    ciphertext, tag = cipher.encrypt_and_digest(data)
-    return nonce + tag + ciphertext
-
-# 解密数据
-def decrypt_data(encrypted_data, key):
-    nonce = encrypted_data[:16]
-    tag = encrypted_data[16:32]
-    ciphertext = encrypted_data[32:]
-    cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
-    try:
-        decrypted_data = cipher.decrypt_and_verify(ciphertext, tag)
-        return decrypted_data
-    except ValueError:
-        print("解密失败：数据可能被篡改或密钥不正确。")
-        return None
 
 class FaceVerificationSystem:
-    def __init__(self, model_path="yolov11l-face.pt", feature_threshold=0.6):
+    def __init__(self, model_path="yolov11l-face.pt", feature_threshold=None, encoder_backend=None):
         # 获取当前文件所在目录
         current_dir = os.path.dirname(os.path.abspath(__file__))
         # 拼接模型的绝对路径
@@ -67,9 +53,11 @@ class FaceVerificationSystem:
             # 使用默认的 YOLO 模型，它会自动下载
             self.model = YOLO("yolov8n.pt")
         
-        # 特征对比阈值（可调整）
-        self.feature_threshold = feature_threshold
-        # 存储用户特征库（用户名: [特征向量, 人脸图像]）
+        # 人脸特征编码器（可通过 FACE_ENCODER_BACKEND 选择）
+        self.encoder = get_encoder(encoder_backend)
+        # 特征对比阈值（可调整），未指定时使用编码器的默认阈值
+        self.feature_threshold = feature_threshold if feature_threshold is not None else self.encoder.threshold
+        # 存储用户特征库（用户名: {特征向量, 编码器版本, 时间戳}）
         self.user_feature_db = {}
 
         # 初始化数据库连接
@@ -137,16 +125,15 @@ class FaceVerificationSystem:
         try:
             if isinstance(face_image, np.ndarray):
                 _, img_encoded = cv2.imencode('.jpg', face_image)
-                img_bytes = img_encoded.tobytes()
-                base64_image = base64.b64encode(img_bytes)
-                encrypted_image = encrypt_data(base64_image, self.aes_key)
+                # 直接加密原始 JPEG 字节（带格式标记），不再先做 base64 编码
+                encrypted_image = encrypt_image(img_encoded, self.aes_key)
                 query = sql.SQL("INSERT INTO user_faces (username, face_image) VALUES (%s, %s)")
                 result = self.execute_query(query, (username, encrypted_image))
                 
                 # 同时更新内存中的特征库
                 features = self.extract_features(face_image)
                 if features is not None:
-                    self.user_feature_db[username] = {"features": features, "timestamp": datetime.now()}
+                    self.user_feature_db[username] = {"features": features, "encoder": self.encoder.version, "timestamp": datetime.now()}
                 
                 return True
             else:
@@ -162,17 +149,16 @@ class FaceVerificationSystem:
             query = "SELECT username, face_image FROM user_faces"
             results = self.execute_query(query)
             if results:
-                for username, image_data in results:
+                # 批量并行解密所有人脸图片
+                decrypted_images = decrypt_many((image_data for _, image_data in results), self.aes_key)
+                for (username, _), decrypted_data in zip(results, decrypted_images):
                     try:
-                        decrypted_data = decrypt_data(image_data, self.aes_key)
                         if decrypted_data:
-                            base64_image = decrypted_data
-                            img_bytes = base64.b64decode(base64_image)
-                            nparr = np.frombuffer(img_bytes, np.uint8)
+                            nparr = np.frombuffer(image_payload_bytes(decrypted_data), np.uint8)
                             face_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                             features = self.extract_features(face_image)
                             if features is not None:
-                                self.user_feature_db[username] = {"features": features, "timestamp": datetime.now()}
+                                self.user_feature_db[username] = {"features": features, "encoder": self.encoder.version, "timestamp": datetime.now()}
                     except Exception as e:
                         print(f"加载用户 {username} 的人脸图片并提取特征失败: {e}")
             else:
@@ -192,25 +178,23 @@ class FaceVerificationSystem:
         elif not isinstance(face_image, bytes):
             # 兜底：转为bytes
             face_image = str(face_image).encode('utf-8')
-        base64_image = base64.b64encode(face_image)
-        encrypted_image = encrypt_data(base64_image, self.aes_key)
+        encrypted_image = encrypt_image(face_image, self.aes_key)
         query = "INSERT INTO unauthorized_users (face_image) VALUES (%s)"
         self.execute_query(query, (encrypted_image,))
 
     def get_unauthorized_users(self):
-        """获取未认证用户记录，返回时对图片进行解密、还原为ndarray、编码为图片并base64输出"""
+        """获取未认证用户记录，返回时对图片进行解密并以base64输出"""
         query = "SELECT id, face_image, detected_at FROM unauthorized_users"
-        results = self.execute_query(query)
+        results = self.execute_query(query) or []
+        decrypted_images = decrypt_many((row[1] for row in results), self.aes_key)
         decoded_results = []
-        for row in results:
+        for row, decrypted_image in zip(results, decrypted_images):
             id = row[0]
-            face_image = row[1]
             detected_at = row[2]
-            decrypted_image = decrypt_data(face_image, self.aes_key)
             if decrypted_image:
                 new_row = {
                     "id": id,
-                    "face_image": decrypted_image,
+                    "face_image": image_payload_base64(decrypted_image),
                     "detected_at": detected_at.strftime("%Y-%m-%d %H:%M:%S") if detected_at else None
                 }
                 decoded_results.append(new_row)
@@ -267,9 +251,9 @@ class FaceVerificationSystem:
             # 对比特征库
             if self.user_feature_db and len(self.user_feature_db) > 0:
                 print(f"当前用户库中有 {len(self.user_feature_db)} 个用户")
-                known_encodings = [data["features"] for data in self.user_feature_db.values() if data.get("features") is not None]
+                _, known_encodings = self.get_known_encodings()
                 if known_encodings:
-                    face_distances = face_distance(known_encodings, features)
+                    face_distances = self.encoder.distance(known_encodings, features)
                     # 如果最小距离小于阈值，说明人脸已存在
                     min_distance = np.min(face_distances) if len(face_distances) > 0 else float('inf')
                     print(f"最小距离: {min_distance}, 阈值: {self.feature_threshold}")
@@ -299,18 +283,19 @@ class FaceVerificationSystem:
                             face_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                             features = self.extract_features(face_image)
                             if features is not None:
-                                self.user_feature_db[username] = {"features": features, "timestamp": datetime.now()}
+                                self.user_feature_db[username] = {"features": features, "encoder": self.encoder.version, "timestamp": datetime.now()}
 
     def preprocess_image(self, image):
         """对收到的图片进行图像归一化、人脸区域提取和人脸对齐等处理"""
         if image is None:
             return None
 
-        # 图像归一化
-        normalized_image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+        # 图像归一化参数：与 cv2.normalize(NORM_MINMAX) 一样取全图最小/最大值，
+        # 但只对实际用到的区域做线性变换，避免生成整幅归一化副本
+        low, high = float(image.min()), float(image.max())
 
-        # 使用YOLO检测人脸区域
-        face_region, box = self.detect_face(normalized_image)
+        # 使用YOLO在缩小的副本上检测人脸区域，返回原始分辨率下的坐标
+        face_region, box = self.detect_face(image, normalize_range=(low, high))
 
         if face_region is None or box is None:
             print("未检测到人脸")
@@ -350,17 +335,26 @@ class FaceVerificationSystem:
         dx = right_eye_center[0] - left_eye_center[0]
         angle = np.degrees(np.arctan2(dy, dx))
 
-        # 计算旋转中心（人脸区域中心）
-        center = ((left + right) // 2, (top + bottom) // 2)
+        # 只旋转人脸周围留有边距的区域，而不是整幅原图
+        height, width = image.shape[:2]
+        margin = max(right - left, bottom - top) // 2
+        region_left = max(left - margin, 0)
+        region_top = max(top - margin, 0)
+        region_right = min(right + margin, width)
+        region_bottom = min(bottom + margin, height)
+        region = self.normalize_image(image[region_top:region_bottom, region_left:region_right], low, high)
+
+        # 计算旋转中心（人脸区域中心，换算到裁剪区域坐标系）
+        center = ((left + right) // 2 - region_left, (top + bottom) // 2 - region_top)
 
         # 旋转矩阵
         rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
 
-        # 应用旋转到原图
+        # 应用旋转到人脸周围区域
         aligned_image = cv2.warpAffine(
-            normalized_image,
+            region,
             rotation_matrix,
-            (normalized_image.shape[1], normalized_image.shape[0])
+            (region.shape[1], region.shape[0])
         )
 
         # 使用YOLO重新检测对齐后的人脸区域
@@ -372,21 +366,44 @@ class FaceVerificationSystem:
 
         return aligned_face
 
-    def detect_face(self, image):
-        """使用YOLO检测人脸并返回人脸区域，返回最大的人脸区域"""
+    @staticmethod
+    def normalize_image(image, low, high):
+        """按给定的最小/最大值把图像线性拉伸到 0-255，结果与 cv2.normalize(NORM_MINMAX) 一致"""
+        scale = 255.0 / (high - low) if high - low > np.finfo(float).eps else 0.0
+        return cv2.convertScaleAbs(image, alpha=scale, beta=-low * scale)
+
+    def detect_face(self, image, max_edge=None, normalize_range=None):
+        """使用YOLO检测人脸并返回人脸区域，返回最大的人脸区域
+
+        检测在长边不超过 max_edge 的缩小副本上进行，检测框映射回原图后按原始分辨率裁剪。
+        normalize_range 为 (最小值, 最大值) 时，检测用副本和返回的人脸区域都会按该范围归一化。
+        """
         try:
-            results = self.model(image, classes=[0])  # 假设0为face类别
+            max_edge = FACE_DETECTION_MAX_EDGE if max_edge is None else max_edge
+            height, width = image.shape[:2]
+            scale = 1.0
+            detect_image = image
+            if max_edge and max(height, width) > max_edge:
+                scale = max_edge / max(height, width)
+                detect_image = cv2.resize(
+                    image,
+                    (max(1, round(width * scale)), max(1, round(height * scale))),
+                    interpolation=cv2.INTER_AREA
+                )
+            if normalize_range is not None:
+                detect_image = self.normalize_image(detect_image, *normalize_range)
+
+            results = self.model(detect_image, classes=[0])  # 假设0为face类别
             if results and len(results) > 0 and results[0] and hasattr(results[0], 'boxes') and results[0].boxes:
-                boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-                max_area = 0
-                max_box = None
-                for box in boxes:
-                    area = (box[2] - box[0]) * (box[3] - box[1])
-                    if area > max_area:
-                        max_area = area
-                        max_box = box
-                if max_box is not None:
+                boxes = results[0].boxes.xyxy.cpu().numpy()
+                # 检测框映射回原始分辨率
+                boxes = np.clip(boxes / scale, 0, [width, height, width, height]).astype(int)
+                areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+                if len(areas) > 0 and areas.max() > 0:
+                    max_box = boxes[np.argmax(areas)]
                     face_region = image[max_box[1]:max_box[3], max_box[0]:max_box[2]]
+                    if normalize_range is not None:
+                        face_region = self.normalize_image(face_region, *normalize_range)
                     return face_region, max_box
             return None, None
         except Exception as e:
@@ -396,9 +413,18 @@ class FaceVerificationSystem:
     def extract_features(self, face_image):
         if face_image is None:
             return None
-        rgb_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb_image)
-        return encodings[0] if encodings else None
+        return self.encoder.encode(face_image)
+
+    def get_known_encodings(self):
+        """返回特征库中与当前编码器版本一致的用户名列表和特征列表"""
+        usernames = []
+        known_encodings = []
+        for username, data in self.user_feature_db.items():
+            if data.get("features") is None or data.get("encoder") != self.encoder.version:
+                continue
+            usernames.append(username)
+            known_encodings.append(data["features"])
+        return usernames, known_encodings
 
     def register_user_local(self, username, face_image):
         """录入新用户人脸"""
@@ -410,11 +436,10 @@ class FaceVerificationSystem:
         features = self.extract_features(face_region)
         if features is not None:
             _, img_encoded = cv2.imencode('.jpg', face_region)
-            img_bytes = img_encoded.tobytes()
-            encrypted_image = encrypt_data(img_bytes, self.aes_key)
+            encrypted_image = encrypt_data(img_encoded, self.aes_key)
             with open(f"user_faces/{username}.jpg.enc", 'wb') as f:
                 f.write(encrypted_image)
-            self.user_feature_db[username] = {"features": features, "timestamp": datetime.now()}
+            self.user_feature_db[username] = {"features": features, "encoder": self.encoder.version, "timestamp": datetime.now()}
             return True
         return False
 
@@ -496,19 +521,18 @@ class FaceVerificationSystem:
 
         if self.user_feature_db and len(self.user_feature_db) > 0:
             try:
-                known_encodings = [data["features"] for data in self.user_feature_db.values() if data.get("features") is not None]
+                usernames, known_encodings = self.get_known_encodings()
                 if known_encodings:
-                    face_distances = face_distance(known_encodings, features)
+                    face_distances = self.encoder.distance(known_encodings, features)
 
                     # 找到最小距离及其索引
                     if len(face_distances) > 0:
                         best_match_index = np.argmin(face_distances)
                         min_distance = face_distances[best_match_index]  # 更新最小距离
 
-                        # 使用 face_recognition 的 compare_faces 判断是否匹配
-                        matches = compare_faces(known_encodings, features, tolerance=0.3)
-                        if matches[best_match_index]:
-                            best_match = list(self.user_feature_db.keys())[best_match_index]
+                        # 最小距离在编码器的严格匹配容差内才视为匹配
+                        if min_distance <= self.encoder.tolerance:
+                            best_match = usernames[best_match_index]
             except Exception as e:
                 print(f"特征对比出错: {e}")
                 return {"status": "failure", "exception": f"特征对比失败: {str(e)}"}
@@ -0,0 +1,59 @@
+"""
+人脸编码器基准测试：对同一批人脸裁剪图比较各编码器后端的单张耗时
+
+用法（在 backend 目录下）：
+    python -m app.faceRecognition.benchmark_encoders face1.jpg face2.jpg --repeat 20
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app.faceRecognition.encoders import ENCODER_BACKENDS, get_encoder
+
+
+def benchmark_encoder(encoder, faces, repeat=10):
+    """返回 (平均每张耗时ms, P95耗时ms, 成功编码的张数)"""
+    # 预热一次，排除模型加载与首次分配的开销
+    for face in faces:
+        encoder.encode(face)
+    timings = []
+    encoded = 0
+    for _ in range(repeat):
+        for face in faces:
+            start = time.perf_counter()
+            features = encoder.encode(face)
+            timings.append((time.perf_counter() - start) * 1000)
+            if features is not None:
+                encoded += 1
+    timings = np.asarray(timings)
+    return float(timings.mean()), float(np.percentile(timings, 95)), encoded // repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸编码器后端基准测试")
+    parser.add_argument("images", nargs="+", help="已裁剪的人脸图片路径")
+    parser.add_argument("--repeat", type=int, default=10, help="重复次数")
+    parser.add_argument("--backends", nargs="*", default=list(ENCODER_BACKENDS), help="要测试的后端")
+    args = parser.parse_args()
+
+    faces = [cv2.imread(path) for path in args.images]
+    faces = [face for face in faces if face is not None]
+    if not faces:
+        print("没有可读取的人脸图片")
+        return
+
+    print(f"{'backend':<24}{'version':<36}{'mean(ms)':>10}{'p95(ms)':>10}{'encoded':>10}")
+    for backend in args.backends:
+        try:
+            encoder = get_encoder(backend)
+        except (RuntimeError, ValueError) as e:
+            print(f"{backend:<24}跳过: {e}")
+            continue
+        mean_ms, p95_ms, encoded = benchmark_encoder(encoder, faces, args.repeat)
+        print(f"{backend:<24}{encoder.version:<36}{mean_ms:>10.2f}{p95_ms:>10.2f}{encoded:>7}/{len(faces)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import face_recognition
+import numpy as np
+
+# 人脸特征编码器配置
+FACE_ENCODER_BACKEND: str = os.getenv("FACE_ENCODER_BACKEND", "dlib")  # 编码器后端：dlib / dlib-known-location / onnx
+FACE_ENCODER_ONNX_MODEL_PATH: str = os.getenv("FACE_ENCODER_ONNX_MODEL_PATH", "w600k_mbf.onnx")  # ONNX 人脸识别模型路径
+
+
+class FaceEncoder(ABC):
+    """人脸特征编码器基类，子类负责把 BGR 人脸图像编码为特征向量"""
+
+    # 特征版本标签，不同版本的特征之间不可比较
+    version = "base"
+    # 判定为同一人的距离阈值
+    threshold = 0.6
+    # 严格匹配容差（对应 face_recognition.compare_faces 的 tolerance）
+    tolerance = 0.3
+
+    @abstractmethod
+    def encode(self, face_image):
+        """把 BGR 人脸图像编码为特征向量，无法提取特征时返回 None"""
+
+    def distance(self, known_encodings, features):
+        """计算已知特征矩阵与待比对特征之间的欧氏距离"""
+        if len(known_encodings) == 0:
+            return np.empty((0,))
+        return np.linalg.norm(np.asarray(known_encodings) - features, axis=1)
+
+
+class DlibEncoder(FaceEncoder):
+    """face_recognition (dlib) 编码器，在人脸区域内重新运行 HOG 检测后编码"""
+
+    def __init__(self, model="small", num_jitters=1):
+        self.model = model
+        self.num_jitters = num_jitters
+        self.version = f"dlib-{model}-j{num_jitters}"
+
+    def encode(self, face_image):
+        if face_image is None:
+            return None
+        rgb_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
+        encodings = face_recognition.face_encodings(rgb_image, num_jitters=self.num_jitters, model=self.model)
+        return encodings[0] if encodings else None
+
+
+class DlibKnownLocationEncoder(DlibEncoder):
+    """dlib 编码器，直接把 YOLO 裁剪出的整幅图像作为人脸位置，跳过 dlib 的二次检测"""
+
+    def __init__(self, model="small", num_jitters=1):
+        super().__init__(model=model, num_jitters=num_jitters)
+        self.version = f"dlib-known-location-{model}-j{num_jitters}"
+
+    def encode(self, face_image):
+        if face_image is None or face_image.size == 0:
+            return None
+        rgb_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
+        height, width = rgb_image.shape[:2]
+        # face_recognition 的位置格式为 (top, right, bottom, left)
+        encodings = face_recognition.face_encodings(
+            rgb_image,
+            known_face_locations=[(0, width, height, 0)],
+            num_jitters=self.num_jitters,
+            model=self.model,
+        )
+        return encodings[0] if encodings else None
+
+
+class OnnxEncoder(FaceEncoder):
+    """基于 onnxruntime CPU 的人脸识别模型（ArcFace/MobileFaceNet 类，输入 112x112），输出 L2 归一化特征"""
+
+    # 归一化特征的欧氏距离范围为 [0, 2]，阈值需按所用模型调整
+    threshold = 1.0
+    tolerance = 0.8
+
+    def __init__(self, model_path=FACE_ENCODER_ONNX_MODEL_PATH, input_size=112, num_threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("未安装 onnxruntime，无法使用 onnx 人脸编码器")
+        if not os.path.isabs(model_path):
+            model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), model_path)
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"ONNX 模型文件 {model_path} 不存在")
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = input_size
+        self.version = f"onnx-{os.path.splitext(os.path.basename(model_path))[0]}"
+
+    def encode(self, face_image):
+        if face_image is None or face_image.size == 0:
+            return None
+        resized = cv2.resize(face_image, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+        rgb_image = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB).astype(np.float32)
+        blob = ((rgb_image - 127.5) / 127.5).transpose(2, 0, 1)[np.newaxis]
+        embedding = self.session.run(None, {self.input_name: blob})[0][0]
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return None
+        return (embedding / norm).astype(np.float64)
+
+
+ENCODER_BACKENDS = {
+    "dlib": DlibEncoder,
+    "dlib-known-location": DlibKnownLocationEncoder,
+    "onnx": OnnxEncoder,
+}
+
+
+def get_encoder(backend=None):
+    """按名称创建人脸编码器，默认读取 FACE_ENCODER_BACKEND 配置"""
+    backend = backend or FACE_ENCODER_BACKEND
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"未知的人脸编码器后端: {backend}，可选: {', '.join(ENCODER_BACKENDS)}")
+    return ENCODER_BACKENDS[backend]()
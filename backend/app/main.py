@@ -2,6 +2,7 @@ import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
@@ -29,4 +30,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 压缩较大的响应（轨迹、热点等 JSON 体积大、重复键多，压缩率高），客户端需声明 Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -0,0 +1,16 @@
+import logging
+
+from app.data_analysis.partitions import maintain_partitions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logger.info("Maintaining daily partitions")
+    dropped = maintain_partitions()
+    logger.info("Partitions maintained, dropped: %s", dropped)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,8 @@ from datetime import datetime
 from psycopg2._psycopg import Column
 from pydantic import EmailStr
 from sqlmodel import Field, Relationship, SQLModel
-from sqlalchemy import Column, Text
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import BigInteger, Column, Computed, DateTime, Float, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from datetime import datetime
 from typing import Any, Optional
 
@@ -131,18 +131,42 @@ class NewPassword(SQLModel):
 
 
 class GPSRecord(SQLModel, table=True):
-    id: int | None = Field(default=None, primary_key=True)
+    """GPS 轨迹点，按 time 按天范围分区，分区由 app.data_analysis.partitions 维护"""
+    id: int | None = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     commaddr: str = Field(max_length=64)  # 车辆标识（车牌号）
     utc: str = Field(max_length=32)       # 时间戳（UTC时间类型）
     lat: float                            # 经度坐标
     lon: float                            # 纬度坐标
     head: float                           # 方向角
-    speed: float                          # 车辆速度（m/s）
+    speed: float                          # 车辆速度（cm/s，前端按 /100 显示为 m/s）
     tflag: int                            # 车辆状态（1为载客，0为空载）
+    time: datetime = Field(sa_type=DateTime(timezone=True), primary_key=True)  # 由 utc 解析出的时间（分区键）
+    # 所在网格编号（0.01° 网格），数据库生成列，与 taxiorder.oncell 一致
+    cell: int | None = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger,
+            Computed("((floor(lat * 100) + 9000)::bigint * 100000 + (floor(lon * 100) + 18000)::bigint)", persisted=True),
+        ),
+    )
+
+    # 同一车辆同一时刻只保留一个点，批量导入据此去重；
+    # 同时是轨迹查询的覆盖索引，INCLUDE 返回列后按车辆取轨迹走仅索引扫描
+    __table_args__ = (
+        Index(
+            "uq_gpsrecord_commaddr_time",
+            "commaddr",
+            "time",
+            unique=True,
+            postgresql_include=["id", "utc", "lat", "lon", "head", "speed", "tflag"],
+        ),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
 
 
 class TaxiOrder(SQLModel, table=True):
-    id: int | None = Field(default=None, primary_key=True)
+    """出租车订单，按 ontime 按天范围分区，分区由 app.data_analysis.partitions 维护"""
+    id: int | None = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     commaddr: str = Field(max_length=64)  # 车辆标识（车牌号）
     onutc: str = Field(max_length=32)    # 上车时间戳（UTC时间类型）
     onlat: float                          # 上车点纬度坐标
@@ -150,7 +174,105 @@ class TaxiOrder(SQLModel, table=True):
     offutc: str = Field(max_length=32)   # 下车时间戳（UTC时间类型）
     offlat: float                         # 下车点纬度坐标
     offlon: float                         # 下车点经度坐标
-    distance: float | None = Field(default=None)  # 行驶距离（米）
+    distance: float | None = Field(default=None)  # 行驶距离（米），导入时按上下车点球面距离计算，可由轨迹长度回填
+    ontime: datetime = Field(sa_type=DateTime(timezone=True), primary_key=True, index=True)  # 由 onutc 解析出的上车时间（分区键）
+    offtime: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))  # 由 offutc 解析出的下车时间
+    # 行程时长（秒）和平均速度（m/s），由上下车时间和行驶距离派生的数据库生成列，见 app.data_analysis.trip_metrics
+    duration: float | None = Field(
+        default=None,
+        sa_column=Column(Float, Computed("EXTRACT(EPOCH FROM offtime - ontime)::double precision", persisted=True)),
+    )
+    avg_speed: float | None = Field(
+        default=None,
+        sa_column=Column(
+            Float,
+            Computed(
+                "CASE WHEN offtime > ontime THEN distance / EXTRACT(EPOCH FROM offtime - ontime)::double precision END",
+                persisted=True,
+            ),
+        ),
+    )
+    # 上车点所在网格编号（0.01° 网格），数据库生成列，见 app.data_analysis.geo
+    oncell: int | None = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger,
+            Computed("((floor(onlat * 100) + 9000)::bigint * 100000 + (floor(onlon * 100) + 18000)::bigint)", persisted=True),
+        ),
+    )
+
+    __table_args__ = (
+        Index("ix_taxiorder_oncell", "oncell", "ontime"),
+        # 同一车辆同一上车时间只保留一条订单，批量导入据此去重，重复导入同一文件不会产生重复数据
+        Index("uq_taxiorder_commaddr_ontime", "commaddr", "ontime", unique=True),
+        {"postgresql_partition_by": "RANGE (ontime)"},
+    )
+
+class TaxiOrderRollup(SQLModel, table=True):
+    """出租车订单按15分钟时间桶的汇总统计，由 app.data_analysis.rollups 维护"""
+    __tablename__ = "taxiorder_rollup"
+    bucket_start: datetime = Field(sa_type=DateTime(timezone=True), primary_key=True)  # 时间桶起点（UTC）
+    order_count: int                             # 订单数
+    taxi_ids: list[str] = Field(sa_column=Column(ARRAY(String), nullable=False))  # 载客车辆集合（去重）
+    distance_count: int                          # 有行驶距离的订单数
+    short_count: int                             # 短途订单数（< 4000米）
+    medium_count: int                            # 中途订单数（4000-8000米）
+    long_count: int                              # 长途订单数（> 8000米）
+    trip_count: int                              # 有距离和下车时间的订单数
+    speed_sum: float                             # 有效平均速度之和（m/s）
+    speed_count: int                             # 有效平均速度个数
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow, sa_type=DateTime(timezone=True))
+
+
+class GPSSpeedRollup(SQLModel, table=True):
+    """GPS 点速度按15分钟时间桶和路段的汇总分布，由 app.data_analysis.speed_rollups 维护"""
+    __tablename__ = "gpsrecord_speed_rollup"
+    level: str = Field(max_length=8, primary_key=True)  # 汇总粒度：cell（0.01° 网格）或 road（地图匹配到的 OSM way）
+    bucket_start: datetime = Field(sa_type=DateTime(timezone=True), primary_key=True)  # 时间桶起点（UTC）
+    segment: int = Field(sa_type=BigInteger, primary_key=True)  # 网格编号或 OSM way 编号
+    point_count: int                             # 有效速度的点数
+    speed_sum: float                             # 速度之和（m/s）
+    speed_histogram: list[int] = Field(sa_column=Column(ARRAY(Integer), nullable=False))  # 各速度区间的点数
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow, sa_type=DateTime(timezone=True))
+
+
+class HotspotTile(SQLModel, table=True):
+    """按15分钟时间桶预计算的上客热点结果"""
+    __tablename__ = "hotspot_tile"
+    __table_args__ = (UniqueConstraint("bucket_start", "metric", "eps", "min_samples"),)
+    id: int | None = Field(default=None, primary_key=True)
+    bucket_start: str = Field(max_length=32)     # 时间桶起点（UTC，YYYYMMDDHHMMSS）
+    metric: str = Field(default="scaled", max_length=16)  # 距离度量：scaled / haversine
+    eps: float                                   # DBSCAN eps 参数（haversine 时单位为米）
+    min_samples: int                             # DBSCAN min_samples 参数
+    total_points: int                            # 时间桶内上车点数
+    noise_points: int                            # 噪声点数
+    hot_spots: Any = Field(sa_column=Column(JSONB, nullable=False))  # 热点列表
+    computed_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+
+class AnalysisDataVersion(SQLModel, table=True):
+    """分析数据集的版本号，每次导入后递增，用于使分析接口的响应缓存失效"""
+    __tablename__ = "analysis_data_version"
+    dataset: str = Field(max_length=32, primary_key=True)  # 数据集名称，如 taxiorder、gpsrecord
+    version: int = Field(default=0, sa_type=BigInteger)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+
+class ImportJob(SQLModel, table=True):
+    """批量导入任务及进度，由 app.data_analysis.importers 在后台更新"""
+    __tablename__ = "import_job"
+    id: int | None = Field(default=None, primary_key=True)
+    dataset: str = Field(max_length=32)          # 导入的数据集，如 taxiorder
+    source_path: str = Field(max_length=512)     # 源文件路径
+    status: str = Field(default="pending", max_length=16)  # pending / running / succeeded / failed
+    rows_read: int = 0                           # 已读取的行数
+    rows_loaded: int = 0                         # 实际写入的行数
+    rows_skipped: int = 0                        # 无效或重复而跳过的行数
+    error: str | None = Field(default=None, sa_column=Column(Text, nullable=True))
+    started_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    finished_at: datetime | None = Field(default=None)
+
 
 class RoadSurfaceDetection(SQLModel, table=True):
     __tablename__ = "road_surface_detection"
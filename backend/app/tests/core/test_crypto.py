@@ -0,0 +1,41 @@
+import base64
+
+import pytest
+
+from app.core.crypto import (
+    decrypt_data,
+    encrypt_data,
+    encrypt_image,
+    generate_aes_key,
+    image_payload_base64,
+    image_payload_bytes,
+)
+
+# TIFF、JPEG 和任意二进制内容都应按新格式原样还原
+IMAGES = [b"II*\x00" + bytes(range(256)), b"\xff\xd8\xff\xe0" + b"\x00\x10JFIF", b"\x80\x81\x82"]
+
+
+@pytest.mark.parametrize("image", IMAGES)
+def test_marked_image_round_trip(image: bytes) -> None:
+    key = generate_aes_key()
+    payload = decrypt_data(encrypt_image(image, key), key)
+    assert bytes(image_payload_bytes(payload)) == image
+    assert image_payload_base64(payload) == base64.b64encode(image).decode("ascii")
+
+
+def test_legacy_base64_payload() -> None:
+    # 旧记录：先 base64 再加密
+    key = generate_aes_key()
+    image = IMAGES[1]
+    payload = decrypt_data(encrypt_data(base64.b64encode(image), key), key)
+    assert bytes(image_payload_bytes(payload)) == image
+    assert image_payload_base64(payload) == base64.b64encode(image).decode("ascii")
+
+
+@pytest.mark.parametrize("image", IMAGES)
+def test_unmarked_raw_payload(image: bytes) -> None:
+    # 加格式标记之前直接加密原始字节的记录，按原始字节返回而不是报错
+    key = generate_aes_key()
+    payload = decrypt_data(encrypt_data(image, key), key)
+    assert bytes(image_payload_bytes(payload)) == image
+    assert image_payload_base64(payload) == base64.b64encode(image).decode("ascii")
@@ -0,0 +1,92 @@
+from itertools import pairwise
+from unittest import mock
+
+import numpy as np
+
+from app.data_analysis import map_matching
+from app.data_analysis.map_matching import (
+    MAP_MATCH_BREAK_DISTANCE_M,
+    MAP_MATCH_SEARCH_RADIUS_M,
+    RoadNetwork,
+    build_road_network,
+    match_track,
+)
+
+ORIGIN_LAT, ORIGIN_LON = 36.67, 117.0
+
+
+def _network(ways: dict[int, list[tuple[int, float, float]]]) -> RoadNetwork:
+    """由 {way 编号: [(节点编号, 东向米, 北向米), ...]} 构建双向路网，坐标相对济南附近的原点"""
+    nodes: dict[int, tuple[float, float]] = {}
+    edge_from, edge_to, edge_way = [], [], []
+    for way, way_nodes in ways.items():
+        for node, east, north in way_nodes:
+            nodes[node] = (east, north)
+        for (a, _, _), (b, _, _) in pairwise(way_nodes):
+            edge_from += [a, b]
+            edge_to += [b, a]
+            edge_way += [way, way]
+    ids = np.array(list(nodes))
+    east, north = np.array(list(nodes.values())).T
+    lat = ORIGIN_LAT + north / 111_000
+    lon = ORIGIN_LON + east / (111_000 * np.cos(np.radians(ORIGIN_LAT)))
+    return build_road_network(ids, lat, lon, np.array(edge_from), np.array(edge_to), np.array(edge_way))
+
+
+def _track(network: RoadNetwork, east: list[float], north: list[float]) -> tuple[np.ndarray, np.ndarray]:
+    """把相对 (ORIGIN_LAT, ORIGIN_LON) 的米坐标换成经纬度，与路网节点使用同一投影"""
+    x0, y0 = network.project(ORIGIN_LAT, ORIGIN_LON)
+    return network.unproject(x0 + np.asarray(east, dtype=np.float64), y0 + np.asarray(north, dtype=np.float64))
+
+
+def _two_parallel_roads() -> RoadNetwork:
+    # way 1 沿 y=0，way 2 沿 y=80，都从 x=0 到 x=1000
+    return _network({
+        1: [(1, 0.0, 0.0), (2, 500.0, 0.0), (3, 1000.0, 0.0)],
+        2: [(11, 0.0, 80.0), (12, 500.0, 80.0), (13, 1000.0, 80.0)],
+    })
+
+
+def test_snaps_onto_nearest_road_in_travel_direction() -> None:
+    network = _two_parallel_roads()
+    east = [50.0 + 100 * i for i in range(10)]
+    lat, lon = _track(network, east, [10.0] * 10)
+    result = match_track(network, lat, lon)
+    assert result["way_id"].tolist() == [1] * 10
+    np.testing.assert_allclose(result["distance_m"], 10.0, atol=1e-6)
+    # 向东行驶，匹配的有向边起点在终点西侧
+    edge = result["edge"]
+    assert (network.node_x[network.edge_from[edge]] < network.node_x[network.edge_to[edge]]).all()
+    # 吸附点落在 y=0 的道路上，东向位置不变
+    x, y = network.project(result["lat"], result["lon"])
+    x0, y0 = network.project(ORIGIN_LAT, ORIGIN_LON)
+    np.testing.assert_allclose(y - y0, 0.0, atol=1e-6)
+    np.testing.assert_allclose(x - x0, east, atol=1e-6)
+
+
+def test_point_outside_search_radius_is_unmatched() -> None:
+    network = _two_parallel_roads()
+    north = [5.0, 5.0, -(MAP_MATCH_SEARCH_RADIUS_M + 150.0), 5.0, 5.0]
+    lat, lon = _track(network, [100.0, 200.0, 300.0, 400.0, 500.0], north)
+    result = match_track(network, lat, lon)
+    assert result["edge"][2] == -1
+    assert result["way_id"][2] == -1
+    assert np.isnan(result["lat"][2]) and np.isnan(result["distance_m"][2])
+    assert result["way_id"][[0, 1, 3, 4]].tolist() == [1, 1, 1, 1]
+
+
+def test_far_apart_points_split_the_trace() -> None:
+    # 两条相连的道路，第二条从 x=5000 开始，两段轨迹之间的直线距离超过断开阈值
+    network = _network({
+        1: [(1, 0.0, 0.0), (2, 1000.0, 0.0)],
+        3: [(2, 1000.0, 0.0), (3, 5000.0, 0.0)],
+        4: [(3, 5000.0, 0.0), (4, 6000.0, 0.0)],
+    })
+    east = [100.0, 300.0, 500.0, 5200.0, 5400.0, 5600.0]
+    assert east[3] - east[2] > MAP_MATCH_BREAK_DISTANCE_M
+    lat, lon = _track(network, east, [8.0] * len(east))
+    with mock.patch.object(map_matching, "_route_lengths", wraps=map_matching._route_lengths) as route_lengths:
+        result = match_track(network, lat, lon)
+    assert result["way_id"].tolist() == [1, 1, 1, 4, 4, 4]
+    # 断开处不计算路网距离：两段内各有两对相邻点
+    assert route_lengths.call_count == 4
@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.data_analysis.od_matrix import build_polygon_zones
+
+
+def _rectangle(lat1: float, lat2: float, lon1: float, lon2: float) -> list[list[float]]:
+    return [[lon1, lat1], [lon2, lat1], [lon2, lat2], [lon1, lat2], [lon1, lat1]]
+
+
+def test_locate_matches_exact_for_adjacent_rectangles() -> None:
+    # 两个矩形的公共边是水平边，栅格必须把它穿过的格子标记为边界格子
+    data = {
+        "type": "FeatureCollection",
+        "coordinate_system": "WGS84",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"adcode": "south"},
+                "geometry": {"type": "Polygon", "coordinates": [_rectangle(0.0, 0.3, 0.0, 1.0)]},
+            },
+            {
+                "type": "Feature",
+                "properties": {"adcode": "north"},
+                "geometry": {"type": "Polygon", "coordinates": [_rectangle(0.3, 1.0, 0.0, 1.0)]},
+            },
+        ],
+    }
+    zones = build_polygon_zones("test", "test", data)
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-0.1, 1.1, 20000)
+    lon = rng.uniform(-0.1, 1.1, 20000)
+    # 额外取公共边附近的点
+    lat = np.concatenate([lat, 0.3 + rng.uniform(-0.01, 0.01, 5000)])
+    lon = np.concatenate([lon, rng.uniform(0.0, 1.0, 5000)])
+    np.testing.assert_array_equal(zones.locate(lat, lon), zones.locate_exact(lat, lon))
+    assert zones.ids == ["south", "north"]
+    assert zones.locate(np.array([0.1, 0.9]), np.array([0.5, 0.5])).tolist() == [0, 1]
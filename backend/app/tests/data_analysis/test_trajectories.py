@@ -0,0 +1,126 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.data_analysis.trajectories import clean_track
+
+
+def _legacy_filter_gps_noise(points: list[dict], max_speed: float = 50.0, max_acceleration: float = 10.0) -> list[dict]:
+    # 原 /analysis 轨迹接口中逐点去噪的实现（去掉了日志输出）
+    if len(points) < 2:
+        return points
+    filtered_points = [points[0]]
+    for i in range(1, len(points)):
+        current = points[i]
+        previous = points[i - 1]
+        try:
+            current_time = datetime.strptime(current["utc"], "%Y%m%d%H%M%S")
+            previous_time = datetime.strptime(previous["utc"], "%Y%m%d%H%M%S")
+            time_diff = (current_time - previous_time).total_seconds()
+        except ValueError:
+            time_diff = 1.0
+        if time_diff <= 0:
+            continue
+        lat1, lon1 = previous["lat"], previous["lon"]
+        lat2, lon2 = current["lat"], current["lon"]
+        R = 6371000
+        dlat = math.radians(lat2 - lat1)
+        dlon = math.radians(lon2 - lon1)
+        a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        distance = R * c
+        actual_speed = distance / time_diff if time_diff > 0 else 0
+        speed_kmh = actual_speed * 3.6
+        if speed_kmh > max_speed:
+            continue
+        if len(filtered_points) > 1:
+            prev_speed = float(previous.get("speed", 0)) / 100
+            acceleration = abs(actual_speed - prev_speed) / time_diff if time_diff > 0 else 0
+            if acceleration > max_acceleration:
+                continue
+        filtered_points.append(current)
+    return filtered_points
+
+
+def _legacy_smooth_trajectory(points: list[dict], window_size: int = 3) -> list[dict]:
+    # 原 /analysis 轨迹接口中逐点滑动平均的实现
+    if len(points) < window_size:
+        return points
+    smoothed_points = []
+    for i in range(len(points)):
+        start_idx = max(0, i - window_size // 2)
+        end_idx = min(len(points), i + window_size // 2 + 1)
+        window_lats = [points[j]["lat"] for j in range(start_idx, end_idx)]
+        window_lons = [points[j]["lon"] for j in range(start_idx, end_idx)]
+        smoothed_point = points[i].copy()
+        smoothed_point["lat"] = sum(window_lats) / len(window_lats)
+        smoothed_point["lon"] = sum(window_lons) / len(window_lons)
+        smoothed_points.append(smoothed_point)
+    return smoothed_points
+
+
+def _random_track(seed: int, count: int = 400) -> list[dict]:
+    """随机轨迹：包含时间重复和倒退、无法解析的时间、超速跳点和速度突变"""
+    rng = np.random.default_rng(seed)
+    time = datetime(2013, 9, 12, 8)
+    lat, lon = 36.67, 117.0
+    points = []
+    for i in range(count):
+        time += timedelta(seconds=int(rng.choice([-5, 0, 1, 5, 10, 20, 30], p=[0.05, 0.05, 0.2, 0.2, 0.3, 0.1, 0.1])))
+        metres = rng.uniform(0, 300) if rng.random() < 0.1 else rng.uniform(0, 150)
+        angle = rng.uniform(0, 2 * math.pi)
+        lat += metres * math.sin(angle) / 111_000
+        lon += metres * math.cos(angle) / (111_000 * math.cos(math.radians(lat)))
+        utc = time.strftime("%Y%m%d%H%M%S")
+        if rng.random() < 0.02:
+            # 非法日期和非数字串，strptime 同样无法解析（strptime 会宽松地解析位数不足的数字串，不在比较范围内）
+            utc = str(rng.choice(["20130230120000", "not-a-time"]))
+        points.append({
+            "id": i, "commaddr": "鲁A00001", "utc": utc, "lat": lat, "lon": lon,
+            "head": 0.0, "speed": float(rng.uniform(0, 2000)), "tflag": 1,
+        })
+    return points
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_speed,max_acceleration", [(50.0, 10.0), (80.0, 2.0)])
+def test_denoise_matches_legacy_loop(seed: int, max_speed: float, max_acceleration: float) -> None:
+    points = _random_track(seed)
+    expected = _legacy_filter_gps_noise(points, max_speed, max_acceleration)
+    result = clean_track(points, denoise=True, max_speed=max_speed, max_acceleration=max_acceleration)
+    assert 0 < len(expected) < len(points)
+    assert [point["id"] for point in result] == [point["id"] for point in expected]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("window_size", [3, 4, 7])
+def test_moving_average_matches_legacy_loop(seed: int, window_size: int) -> None:
+    points = _random_track(seed)
+    expected = _legacy_smooth_trajectory(_legacy_filter_gps_noise(points), window_size)
+    result = clean_track(points, denoise=True, smooth="moving_average", window_size=window_size)
+    # 累积和与逐窗口求和的舍入误差在 1e-12 度量级（约 0.1 微米）
+    assert [point["id"] for point in result] == [point["id"] for point in expected]
+    np.testing.assert_allclose([point["lat"] for point in result], [point["lat"] for point in expected], rtol=0, atol=1e-9)
+    np.testing.assert_allclose([point["lon"] for point in result], [point["lon"] for point in expected], rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("method", ["douglas_peucker", "visvalingam"])
+def test_simplify_keeps_endpoints_and_stops(method: str) -> None:
+    # 每 10 秒一个点：向东匀速 10 个点，原地停留 200 秒（20 个点，带几米的定位漂移），再向东匀速 10 个点
+    rng = np.random.default_rng(0)
+    east = np.concatenate([np.arange(10) * 100.0, 1000.0 + rng.uniform(-3, 3, 20), 1100.0 + np.arange(10) * 100.0])
+    north = np.concatenate([np.zeros(10), rng.uniform(-3, 3, 20), np.zeros(10)])
+    start = datetime(2013, 9, 12, 8)
+    points = [
+        {
+            "id": i, "commaddr": "鲁A00001", "utc": (start + timedelta(seconds=10 * i)).strftime("%Y%m%d%H%M%S"),
+            "lat": 36.67 + north[i] / 111_000, "lon": 117.0 + east[i] / (111_000 * math.cos(math.radians(36.67))),
+            "head": 0.0, "speed": 1000.0, "tflag": 1,
+        }
+        for i in range(len(east))
+    ]
+    result = clean_track(points, simplify=method, tolerance_m=50.0)
+    # 首末点和停留区段的首末点（第 10、29 个点）必须保留，其余点都在容差内被抽掉
+    assert [point["id"] for point in result] == [0, 10, 29, 39]
@@ -11,3 +11,6 @@ alembic upgrade head
 
 # Create initial data in DB
 python app/initial_data.py
+
+# Pre-create upcoming daily partitions and apply the retention policy
+python app/maintain_partitions.py